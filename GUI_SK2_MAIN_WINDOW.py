@@ -1164,6 +1164,13 @@ class Ui_MainWindow(object):
         self.lineEdit_max_lines.setMaximumSize(QtCore.QSize(100, 16777215))
         self.lineEdit_max_lines.setObjectName("lineEdit_max_lines")
         self.gridLayout_7.addWidget(self.lineEdit_max_lines, 2, 2, 1, 1)
+        self.label_spill_mb = QtWidgets.QLabel(parent=self.groupBox_settings_terminal)
+        self.label_spill_mb.setObjectName("label_spill_mb")
+        self.gridLayout_7.addWidget(self.label_spill_mb, 3, 0, 1, 1)
+        self.lineEdit_spill_mb = QtWidgets.QLineEdit(parent=self.groupBox_settings_terminal)
+        self.lineEdit_spill_mb.setMaximumSize(QtCore.QSize(100, 16777215))
+        self.lineEdit_spill_mb.setObjectName("lineEdit_spill_mb")
+        self.gridLayout_7.addWidget(self.lineEdit_spill_mb, 3, 2, 1, 1)
         spacerItem7 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Minimum)
         self.gridLayout_7.addItem(spacerItem7, 4, 4, 1, 1)
         self.label_29 = QtWidgets.QLabel(parent=self.groupBox_settings_terminal)
@@ -1632,6 +1639,9 @@ class Ui_MainWindow(object):
         self.comboBox_incoming_fmt.setItemText(7, _translate("MainWindow", "Bin+Newline"))
         self.pushButton_set_max_lines.setText(_translate("MainWindow", "Set"))
         self.lineEdit_max_lines.setPlaceholderText(_translate("MainWindow", "Infinite"))
+        self.label_spill_mb.setText(_translate("MainWindow", "Spill MB:"))
+        self.lineEdit_spill_mb.setToolTip(_translate("MainWindow", "Lines dropped by Max Lines are compressed to a temporary file of up to this size and read back when scrolled to"))
+        self.lineEdit_spill_mb.setPlaceholderText(_translate("MainWindow", "Off"))
         self.label_29.setText(_translate("MainWindow", "Incoming Fmt:"))
         self.label_37.setText(_translate("MainWindow", "Outgoing Int: 55,56"))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.settings), _translate("MainWindow", "Settings"))
@@ -45,6 +45,8 @@ OPTIONS:
     -u, --update                        Update UI files
     --update-debug                      Update UI files in debug mode
     --reset                             Reset to default settings
+    --engine [thread|asyncio]           thread: one reader thread per open port (default)
+                                        asyncio: one event loop thread for all ports (POSIX only)
 """ 
 
 def run():
@@ -53,6 +55,7 @@ def run():
     x_size = 700
     y_size = 800
     has_open_cmds = False 
+    engine = "thread"
     while input_args:
         arg = input_args.pop(0)
         if has_open_cmds:
@@ -87,6 +90,12 @@ def run():
             x_size = int(input_args.pop(0))
         elif arg in ['-y', '--ysize']:
             y_size = int(input_args.pop(0))
+        elif arg in ['--engine']:
+            engine = input_args.pop(0) if input_args else ""
+            if engine not in ("thread", "asyncio"):
+                print(f"ERROR: Invalid engine: {engine}")
+                print(CLI_HELP)
+                exit(0)
         elif arg in ['-c', '--commands']:
             has_open_cmds = True 
         elif arg in ['--reset']:
@@ -118,7 +127,7 @@ def run():
             exit(0)
     
     import SK_main_window
-    SK_main_window.run_app(x_size, y_size, open_commands)
+    SK_main_window.run_app(x_size, y_size, open_commands, engine)
 
 if __name__ == "__main__":
     run()
\ No newline at end of file
@@ -0,0 +1,199 @@
+import os
+import time
+import asyncio
+import threading
+import traceback
+import serial
+from PyQt6.QtCore import Qt
+
+from SK_common import *
+from SK_serial_worker import SerialWorker
+
+ENGINE_THREAD = "thread"  ## One QThread running SerialWorker.run() per port (default)
+ENGINE_ASYNCIO = "asyncio"  ## One asyncio loop thread servicing every port with loop.add_reader()
+ENGINES = (ENGINE_THREAD, ENGINE_ASYNCIO)
+
+
+class AsyncEngine:
+    """Runs the serial readers of every session on one asyncio event loop in one background thread.
+
+    Each SerialWorker keeps its framer, coalescing and RX queue. The loop calls worker.on_readable()
+    when the port fd is readable and runs the worker's frame/idle flush timers with call_later().
+    Batches reach the GUI the same way as with the thread engine: worker.ready -> queue.drain().
+    POSIX only. With the "block" queue policy a full queue pauses every port, not just one.
+    """
+
+    def __init__(self):
+        self.loop: asyncio.AbstractEventLoop = None
+        self.thread: threading.Thread = None
+        self.workers: dict[SerialWorker, int] = {}  ## worker -> fd
+        self.timers: dict[SerialWorker, asyncio.TimerHandle] = {}
+
+    def start(self):
+        if os.name == "nt":
+            raise RuntimeError("The asyncio engine needs select()-able ports (POSIX only)")
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.run, name="SK-asyncio-engine", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def stop(self):
+        if self.loop is None or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(1.0)
+
+    def call(self, func: callable, *args):
+        """Run func(*args) on the loop thread and wait for it"""
+        done = threading.Event()
+        result = []
+
+        def wrapper():
+            try:
+                result.append(func(*args))
+            finally:
+                done.set()
+
+        self.loop.call_soon_threadsafe(wrapper)
+        done.wait(1.0)
+        return result[0] if result else None
+
+    def add_worker(self, worker: SerialWorker):
+        self.call(self._add_worker, worker)
+
+    def remove_worker(self, worker: SerialWorker):
+        """Stop servicing a worker. Returns once the fd is out of the selector, so the port can be closed."""
+        worker.active = False
+        worker.queue.close()
+        self.call(self._remove_worker, worker)
+        worker.close_wake_pipe()
+
+    def _add_worker(self, worker: SerialWorker):
+        fd = worker.ser.fileno()
+        self.workers[worker] = fd
+        self.loop.add_reader(fd, self.on_readable, worker)
+
+    def _remove_worker(self, worker: SerialWorker):
+        fd = self.workers.pop(worker, None)
+        if fd is not None:
+            self.loop.remove_reader(fd)
+        timer = self.timers.pop(worker, None)
+        if timer is not None:
+            timer.cancel()
+        if worker.pending_raw or worker.pending_lines:
+            worker.flush_pending()
+
+    def on_readable(self, worker: SerialWorker):
+        try:
+            worker.on_readable()
+        except Exception as E:
+            eprint(f"Serial Worker Error: {traceback.format_exc()}\n", color="red")
+            self._remove_worker(worker)
+            worker.active = False
+            worker.error.emit(str(E))
+            return
+        if worker not in self.timers and worker.has_pending():
+            self.timers[worker] = self.loop.call_later(worker.check_timers(), self.on_timer, worker)
+
+    def on_timer(self, worker: SerialWorker):
+        self.timers.pop(worker, None)
+        if worker not in self.workers:
+            return
+        delay = worker.check_timers()
+        if worker.has_pending():
+            self.timers[worker] = self.loop.call_later(delay, self.on_timer, worker)
+
+
+###############################################################
+######################## BENCHMARKS ###########################
+###############################################################
+
+
+def benchmark_engines(ports: int = 16, duration: float = 3.0, interval: float = 0.005, message: bytes = b"T:12.345 V:3.300 I:0.125\r\n"):
+    """Thread count and CPU time of both engines reading `ports` simulated devices on pty pairs (POSIX only).
+
+    Every device writes `message` every `interval` seconds. CPU time includes the writer thread, which is the same for both.
+    Returns {engine: {"threads": ..., "cpu_s": ..., "cpu_pct": ..., "lines": ...}}
+    """
+    import pty
+
+    results = {}
+    for engine_name in ENGINES:
+        pairs = [pty.openpty() for i in range(ports)]
+        workers = []
+        received = [0]
+
+        def on_ready(worker: SerialWorker):
+            for raw, lines, display, raw_stamp, stamps in worker.queue.drain():
+                received[0] += len(lines)
+
+        for master, slave in pairs:
+            ser = serial.Serial()
+            ser.port = os.ttyname(slave)
+            ser.baudrate = 115200
+            ser.open()
+            worker = SerialWorker(ser)
+            worker.ready.connect(lambda worker=worker: on_ready(worker), Qt.ConnectionType.DirectConnection)
+            workers.append(worker)
+
+        engine = None
+        readers = []
+        if engine_name == ENGINE_ASYNCIO:
+            engine = AsyncEngine()
+            engine.start()
+            for worker in workers:
+                engine.add_worker(worker)
+        else:
+            for worker in workers:
+                reader = threading.Thread(target=worker.run, daemon=True)
+                reader.start()
+                readers.append(reader)
+        time.sleep(0.1)
+
+        threads = threading.active_count()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        while time.perf_counter() - wall_start < duration:
+            for master, slave in pairs:
+                os.write(master, message)
+            time.sleep(interval)
+        time.sleep(0.1)
+        cpu_s = time.process_time() - cpu_start
+        wall_s = time.perf_counter() - wall_start
+
+        for worker in workers:
+            if engine is not None:
+                engine.remove_worker(worker)
+            else:
+                worker.stop()
+        for reader in readers:
+            reader.join(1.0)
+        if engine is not None:
+            engine.stop()
+        for worker in workers:
+            worker.ser.close()
+        for master, slave in pairs:
+            os.close(master)
+            os.close(slave)
+
+        results[engine_name] = {
+            "threads": threads,
+            "cpu_s": round(cpu_s, 3),
+            "cpu_pct": round(100 * cpu_s / wall_s, 1),
+            "lines": received[0],
+        }
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--bench" in sys.argv:
+        for engine_name, result in benchmark_engines().items():
+            print(f"{engine_name:<8} {result}")
@@ -0,0 +1,216 @@
+import os
+import mmap
+import time
+import bisect
+import struct
+import threading
+
+from SK_common import *
+
+CAPTURE_MAGIC = b"SKCAP\x00\x01\x00"  ## File header, the last two bytes are the format version
+CAPTURE_EXT = ".skcap"
+INDEX_EXT = ".idx"  ## Sidecar next to the capture: <capture>.skcap.idx
+DIR_RX = 0
+DIR_TX = 1
+DIR_NAMES = {DIR_RX: "RX", DIR_TX: "TX"}
+RECORD = struct.Struct("<BqI")  ## direction, time_ns (wall clock), payload length. The payload follows
+INDEX_ENTRY = struct.Struct("<qQ")  ## time_ns, file offset of a record
+INDEX_INTERVAL = 64 << 10  ## Bytes of capture between index entries
+
+
+class CaptureWriter:
+    """Appends direction-tagged, time stamped chunks to a binary capture file, byte for byte.
+
+    Every INDEX_INTERVAL bytes the record offset goes to the .idx sidecar, so a reader can seek by time
+    without scanning the file. RX chunks come from the reader thread and TX chunks from the writer thread.
+    Records are in file order, their times can be a few ms out of order between RX and TX.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, "wb", buffering=1 << 16)
+        self.index = open(path + INDEX_EXT, "wb", buffering=1 << 12)
+        self.file.write(CAPTURE_MAGIC)
+        self.offset = len(CAPTURE_MAGIC)
+        self.next_index = self.offset
+        self.max_t = 0  ## Index times are kept in order for bisect
+        self.stats = {"records": 0, "rx_bytes": 0, "tx_bytes": 0}
+
+    def write(self, direction: int, t_ns: int, *chunks: bytes | memoryview):
+        """Append one record. The payload is the chunks joined (ie. the two segments of a ring buffer)."""
+        size = sum(map(len, chunks))
+        with self.lock:
+            if self.file is None:
+                return
+            self.max_t = max(self.max_t, t_ns)
+            if self.offset >= self.next_index:
+                self.index.write(INDEX_ENTRY.pack(self.max_t, self.offset))
+                self.next_index = self.offset + INDEX_INTERVAL
+            self.file.write(RECORD.pack(direction, t_ns, size))
+            for chunk in chunks:
+                self.file.write(chunk)
+            self.offset += RECORD.size + size
+            self.stats["records"] += 1
+            self.stats["tx_bytes" if direction == DIR_TX else "rx_bytes"] += size
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+                self.index.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.close()
+            self.index.close()
+            self.file = None
+
+    def summary(self) -> str:
+        return f"{self.path}: {self.stats['records']} records, RX {self.stats['rx_bytes']} bytes, TX {self.stats['tx_bytes']} bytes"
+
+
+class CaptureReader:
+    """Memory-mapped reader for captures. seek() bisects the sparse index and scans at most one interval.
+
+    A capture cut short by a crash reads up to its last complete record. If the .idx sidecar is missing
+    or behind the capture, the rest of the index is rebuilt by scanning.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        self.size = os.path.getsize(path)
+        if self.size < len(CAPTURE_MAGIC):
+            self.file.close()
+            raise ValueError(f"{path} is not a capture file")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[: len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a capture file (or a newer version)")
+        self.times: list[int] = []
+        self.offsets: list[int] = []
+        self.load_index()
+
+    def load_index(self):
+        index_path = self.path + INDEX_EXT
+        if os.path.isfile(index_path):
+            with open(index_path, "rb") as file:
+                data = file.read()
+            data = data[: len(data) - len(data) % INDEX_ENTRY.size]
+            for t_ns, offset in INDEX_ENTRY.iter_unpack(data):
+                if offset >= self.size:
+                    break
+                self.times.append(t_ns)
+                self.offsets.append(offset)
+        ## Index whatever the sidecar does not cover
+        start = self.offsets[-1] if self.offsets else len(CAPTURE_MAGIC)
+        next_index = start + INDEX_INTERVAL if self.offsets else start
+        max_t = self.times[-1] if self.times else 0
+        for direction, t_ns, payload, offset in self.records(start):
+            max_t = max(max_t, t_ns)
+            if offset >= next_index:
+                self.times.append(max_t)
+                self.offsets.append(offset)
+                next_index = offset + INDEX_INTERVAL
+
+    def records(self, offset: int = len(CAPTURE_MAGIC)):
+        """Yield (direction, t_ns, payload, offset) from offset to the last complete record"""
+        header = RECORD.size
+        while offset + header <= self.size:
+            direction, t_ns, length = RECORD.unpack_from(self.map, offset)
+            end = offset + header + length
+            if end > self.size:
+                break
+            yield direction, t_ns, self.map[offset + header : end], offset
+            offset = end
+
+    def seek(self, t_ns: int) -> int:
+        """Offset of the first record at or after t_ns (the end of the file if there is none)"""
+        index = bisect.bisect_right(self.times, t_ns) - 1
+        start = self.offsets[index] if index >= 0 else len(CAPTURE_MAGIC)
+        for direction, record_t, payload, offset in self.records(start):
+            if record_t >= t_ns:
+                return offset
+        return self.size
+
+    def read_from(self, t_ns: int):
+        """Yield records from t_ns on, as records() does"""
+        return self.records(self.seek(t_ns))
+
+    def first_time(self) -> int | None:
+        for direction, t_ns, payload, offset in self.records():
+            return t_ns
+        return None
+
+    def summary(self) -> dict:
+        """Full scan: record count, bytes per direction and time span"""
+        result = {"records": 0, "rx_bytes": 0, "tx_bytes": 0, "first_ns": None, "last_ns": None, "index_entries": len(self.offsets)}
+        for direction, t_ns, payload, offset in self.records():
+            result["records"] += 1
+            result["tx_bytes" if direction == DIR_TX else "rx_bytes"] += len(payload)
+            if result["first_ns"] is None:
+                result["first_ns"] = t_ns
+            result["last_ns"] = t_ns
+        return result
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+###############################################################
+######################## BENCHMARKS ###########################
+###############################################################
+
+
+def benchmark_capture(total_bytes: int = 256 << 20, chunk: bytes = b"T:12.345 V:3.300 I:0.125\r\n" * 40, seeks: int = 1000):
+    """Write throughput of CaptureWriter and seek time of CaptureReader on a capture of total_bytes.
+
+    Returns {"write_MB_per_s": ..., "open_ms": ..., "seek_us": ..., "scan_MB_per_s": ...}
+    """
+    import random
+    import tempfile
+
+    path = os.path.join(tempfile.mkdtemp(), "bench" + CAPTURE_EXT)
+    count = total_bytes // len(chunk)
+    start_ns = time.time_ns()
+    writer = CaptureWriter(path)
+    start_t = time.perf_counter()
+    for i in range(count):
+        writer.write(DIR_TX if i % 10 == 0 else DIR_RX, start_ns + i * 1000, chunk)
+    writer.close()
+    write_s = time.perf_counter() - start_t
+
+    start_t = time.perf_counter()
+    reader = CaptureReader(path)
+    open_s = time.perf_counter() - start_t
+    targets = [start_ns + random.randrange(count) * 1000 for i in range(seeks)]
+    start_t = time.perf_counter()
+    for target in targets:
+        reader.seek(target)
+    seek_s = time.perf_counter() - start_t
+    start_t = time.perf_counter()
+    summary = reader.summary()
+    scan_s = time.perf_counter() - start_t
+    reader.close()
+    os.remove(path)
+    os.remove(path + INDEX_EXT)
+    os.rmdir(os.path.dirname(path))
+
+    assert summary["records"] == count
+    return {
+        "write_MB_per_s": round(total_bytes / write_s / 1e6, 1),
+        "open_ms": round(open_s * 1000, 2),
+        "seek_us": round(seek_s / seeks * 1e6, 1),
+        "scan_MB_per_s": round(total_bytes / scan_s / 1e6, 1),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--bench" in sys.argv:
+        print(benchmark_capture())
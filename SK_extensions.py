@@ -2,10 +2,13 @@ from SK_common import *
 from PyQt6.QtCore import QObject, pyqtSignal, QTimer
 #from SK_main_window import MainWindow
 from SK_serial_worker import SK_Port
+from SK_metrics import METRICS
+from SK_profiler import PROFILER
 import time 
 
 EXTENSION_INTERNAL_DEBUG_COLOR = TYPE_INFO_PINK
 EXTENSION_INTERNAL_DEBUG_LEVEL = 3
+RECEIVE_LINES_NS = METRICS.histogram("ext.receive_lines_ns")
 
 class SK_Extension(QObject):
     
@@ -16,6 +19,7 @@ class SK_Extension(QObject):
     debug_level = 0 
     name = "EXT"
     is_ending = False 
+    rx_timestamps:list[tuple[int, int]] = None  ## (time.perf_counter_ns(), time.time_ns()) read time of each line passed to event_receive_lines 
 
     def __init__(self, main_window):
         super().__init__()
@@ -24,6 +28,7 @@ class SK_Extension(QObject):
 
 
     def start(self):
+        PROFILER.poll()
         self.started = True 
         if self.debug_level >= EXTENSION_INTERNAL_DEBUG_LEVEL:
             self.debug("Extension Started", debug_level = 0, type = EXTENSION_INTERNAL_DEBUG_COLOR)
@@ -35,13 +40,15 @@ class SK_Extension(QObject):
             self.debug("Serial Connected", debug_level = 0, type = EXTENSION_INTERNAL_DEBUG_COLOR)
         self.event_serial_connected(port)
     
-    def _receive_lines(self, lines:list[str]):
+    def _receive_lines(self, lines:list[str], stamps:list[tuple[int, int]] = None):
         if self.debug_level >= EXTENSION_INTERNAL_DEBUG_LEVEL:
             for line in lines: 
                 self.debug(f"receive line: {line}", debug_level = 0, type = EXTENSION_INTERNAL_DEBUG_COLOR)
+        self.rx_timestamps = stamps 
         start_t = time.perf_counter_ns() 
         r = self.event_receive_lines(lines) 
         end_t = time.perf_counter_ns() 
+        RECEIVE_LINES_NS.record(end_t - start_t)
         if self.debug_level >= EXTENSION_INTERNAL_DEBUG_LEVEL + 1:
             self.debug(f"receive lines took {(end_t - start_t) / 1000} uS", debug_level = 0, type = EXTENSION_INTERNAL_DEBUG_COLOR)
         return r 
@@ -0,0 +1,323 @@
+import io
+import time
+import codecs
+
+from SK_metrics import METRICS
+
+RX_RING_SIZE = 1 << 16  ## Bytes. Receive ring, also bounds how long a line without terminator can get
+DECODE_NS = METRICS.histogram("rx.decode_ns")
+
+
+class ByteRing:
+    """Preallocated receive ring. Reads land directly in the buffer, unread data is addressed by offsets.
+
+    head and tail are absolute byte counts, the buffer index is count % size.
+    Nothing is copied out of the ring until a consumer asks for bytes or str.
+    """
+
+    def __init__(self, size: int = RX_RING_SIZE):
+        self.size = size
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.head = 0  ## Absolute count of bytes written
+        self.tail = 0  ## Absolute count of bytes consumed
+
+    def __len__(self) -> int:
+        return self.head - self.tail
+
+    def free(self) -> int:
+        return self.size - (self.head - self.tail)
+
+    def write_view(self, limit: int = None) -> memoryview:
+        """Largest contiguous free region (optionally capped at limit bytes) to read into"""
+        start = self.head % self.size
+        length = min(self.free(), self.size - start)
+        if limit is not None:
+            length = min(length, limit)
+        return self.view[start : start + length]
+
+    def fill(self, readinto: callable, limit: int) -> int:
+        """Call readinto(view) until limit bytes are read, the ring is full or a read comes up short"""
+        total = 0
+        while total < limit:
+            view = self.write_view(limit - total)
+            if not len(view):
+                break
+            n = readinto(view) or 0
+            self.head += n
+            total += n
+            if n < len(view):
+                break
+        return total
+
+    def segments(self, start: int = None, end: int = None) -> list[tuple[int, int]]:
+        """Buffer index ranges covering absolute positions [start, end), at most two when the range wraps"""
+        start = self.tail if start is None else start
+        end = self.head if end is None else end
+        if start >= end:
+            return []
+        first = start % self.size
+        last = first + (end - start)
+        if last <= self.size:
+            return [(first, last)]
+        return [(first, self.size), (0, last - self.size)]
+
+    def rfind(self, chars: bytes, start: int = None, end: int = None) -> int:
+        """Absolute position of the last byte in [start, end) that is one of chars, or -1"""
+        start = self.tail if start is None else start
+        end = self.head if end is None else end
+        found = -1
+        offset = start
+        for seg_start, seg_end in self.segments(start, end):
+            for char in chars:
+                index = self.buffer.rfind(char, seg_start, seg_end)
+                if index >= 0:
+                    found = max(found, offset + index - seg_start)
+            offset += seg_end - seg_start
+        return found
+
+    def to_bytes(self, start: int = None, end: int = None) -> bytes:
+        segments = self.segments(start, end)
+        if len(segments) == 1:
+            return bytes(self.view[segments[0][0] : segments[0][1]])
+        return b"".join(self.view[a:b] for a, b in segments)
+
+    def decode(self, start: int = None, end: int = None, encoding: str = "utf-8") -> str:
+        segments = self.segments(start, end)
+        if len(segments) == 1:
+            return str(self.view[segments[0][0] : segments[0][1]], encoding, "replace")
+        return self.to_bytes(start, end).decode(encoding, errors="replace")
+
+    def byte_at(self, position: int) -> int:
+        return self.buffer[position % self.size]
+
+    def consume(self, end: int = None):
+        self.tail = self.head if end is None else end
+
+    def clear(self):
+        self.head = self.tail = 0
+
+
+TERMINATOR_AUTO = "auto"  ## Any of CR LF, LF or CR. A CR LF split across reads still counts once
+TERMINATOR_NAMES = {"lf": b"\n", "crlf": b"\r\n", "cr": b"\r", "nul": b"\x00"}
+DEFAULT_MAX_LINE_LENGTH = 4096  ## Bytes. Longer lines are passed on in pieces of this size
+
+
+def parse_terminator(spec: str | bytes | None) -> bytes | None:
+    """Turn a terminator setting into bytes. None means auto.
+
+    Accepts auto, lf, crlf, cr, nul, hex (0x03, 0x0d0a) or an escaped string (\\n, \\r\\n, ;)
+    """
+    if isinstance(spec, bytes):
+        return spec or None
+    if not spec or spec.lower() == TERMINATOR_AUTO:
+        return None
+    if spec.lower() in TERMINATOR_NAMES:
+        return TERMINATOR_NAMES[spec.lower()]
+    if spec.lower().startswith("0x"):
+        return bytes.fromhex(spec[2:])
+    terminator = codecs.escape_decode(spec.encode("utf-8"))[0]
+    if not terminator:
+        raise ValueError(f"Invalid line terminator: {spec}")
+    return terminator
+
+
+class LineFramer:
+    """Splits a byte stream into lines at the bytes level, then decodes each line once.
+
+    Incoming data lives in a ByteRing. Lines are decoded with a stateful incremental decoder, so a
+    multibyte character cut by a max_line_length split or a flush() is completed by the next piece.
+    """
+
+    def __init__(self, terminator: str | bytes = TERMINATOR_AUTO, max_line_length: int = DEFAULT_MAX_LINE_LENGTH, encoding: str = "utf-8", ring_size: int = RX_RING_SIZE):
+        self.terminator = parse_terminator(terminator)
+        if self.terminator is None:
+            self.str_terminator = "\n"  ## CR LF and CR are folded into LF before splitting
+            self.term_len = 1
+        else:
+            self.str_terminator = self.terminator.decode(encoding, errors="replace")
+            self.term_len = len(self.terminator)
+        self.ring = ByteRing(ring_size)
+        self.max_line_length = max(1, min(int(max_line_length), ring_size // 2))
+        self.encoding = encoding
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self.decoder_pending = False  ## The decoder may hold the start of a character cut by a split or flush
+        self.scan = 0  ## Absolute position the terminator search has covered
+        self.skip_lf = False  ## Last line ended in a CR that was the final byte read (auto mode)
+        self.split_lines = 0  ## Lines cut at max_line_length
+
+    def feed(self, data: bytes) -> list[str]:
+        """Copy data into the ring and frame it, for sources that cannot read into the ring directly"""
+        lines = []
+        view = memoryview(data)
+        while len(view):
+            target = self.ring.write_view(len(view))
+            n = len(target)
+            target[:] = view[:n]
+            self.ring.head += n
+            view = view[n:]
+            lines += self.frame()
+        return lines
+
+    def pending(self) -> int:
+        """Bytes of the current unterminated line"""
+        return len(self.ring)
+
+    def frame(self) -> list[str]:
+        """Return every complete line in the ring. The unterminated tail stays in the ring."""
+        ring = self.ring
+        lines = []
+        if self.skip_lf and ring.head > ring.tail:
+            if ring.byte_at(ring.tail) == 0x0A:
+                ring.tail += 1
+            self.skip_lf = False
+
+        ## Bytes before self.scan hold no terminator, so only the newly read ones are searched
+        end = self.find_last_terminator(self.scan if self.scan > ring.tail else ring.tail)
+        if end > ring.tail:
+            if end == ring.head and self.terminator is None and ring.byte_at(end - 1) == 0x0D:
+                self.skip_lf = True  ## Could be the first half of a CR LF split across reads
+            ## One decode for the whole complete region, then split the str at the same terminators
+            decode_t = time.perf_counter_ns()
+            text = self.decode(ring.tail, end, final=True)
+            DECODE_NS.record(time.perf_counter_ns() - decode_t)
+            if self.terminator is None:
+                text = text.replace("\r\n", "\n").replace("\r", "\n")
+            lines = text.split(self.str_terminator)
+            rest = lines.pop()  ## Empty after the last terminator, unless split() matched a terminator that overlaps it ("x;;;" at ";;")
+            ring.tail = end - len(rest.encode(self.encoding))  ## The rest starts the next line
+            if len(text) > self.max_line_length:
+                lines = self.split_long(lines)
+
+        while ring.head - ring.tail >= self.max_line_length:
+            cut = ring.tail + self.max_line_length
+            lines.append(self.decode(ring.tail, cut, final=False))
+            ring.tail = cut
+            self.split_lines += 1
+
+        ## The last term_len - 1 bytes may be the start of a multibyte terminator
+        self.scan = ring.head - self.term_len + 1
+        return lines
+
+    def find_last_terminator(self, start: int) -> int:
+        """Absolute position just past the last terminator in [start, head), or -1"""
+        ring = self.ring
+        if self.terminator is None:
+            a = start % ring.size
+            b = a + ring.head - start
+            if b <= ring.size:  ## No wrap, the common case
+                found = max(ring.buffer.rfind(b"\n", a, b), ring.buffer.rfind(b"\r", a, b))
+                return start + found - a + 1 if found >= 0 else -1
+            found = ring.rfind(b"\r\n", start)
+            return found + 1 if found >= 0 else -1
+        found = -1
+        offset = start
+        segments = ring.segments(start)
+        for index, (a, b) in enumerate(segments):
+            position = ring.buffer.rfind(self.terminator, a, b)
+            if position >= 0:
+                found = offset + position - a + self.term_len
+            offset += b - a
+            if index == 0 and len(segments) == 2 and self.term_len > 1:
+                ## A multibyte terminator can straddle the wrap point
+                window_start = max(start, offset - self.term_len + 1)
+                position = ring.to_bytes(window_start, min(ring.head, offset + self.term_len - 1)).rfind(self.terminator)
+                if position >= 0:
+                    found = max(found, window_start + position + self.term_len)
+        return found
+
+    def split_long(self, lines: list[str]) -> list[str]:
+        result = []
+        for line in lines:
+            while len(line) > self.max_line_length:
+                result.append(line[: self.max_line_length])
+                line = line[self.max_line_length :]
+                self.split_lines += 1
+            result.append(line)
+        return result
+
+    def flush(self) -> str | None:
+        """Return the unterminated tail as a line, or None if there is none"""
+        if not len(self.ring):
+            return None
+        text = self.decode(self.ring.tail, self.ring.head, final=False)
+        self.ring.consume()
+        self.scan = self.ring.tail
+        return text
+
+    def decode(self, start: int, end: int, final: bool = True) -> str:
+        first = start % self.ring.size
+        if final and not self.decoder_pending and first + end - start <= self.ring.size:
+            ## Nothing carried over from a cut line and no wrap, a plain decode of the view is enough
+            return str(self.ring.view[first : first + end - start], self.encoding, "replace")
+        segments = self.ring.segments(start, end)
+        self.decoder_pending = not final
+        if not segments:
+            return self.decoder.decode(b"", final=final)
+        text = ""
+        for index, (a, b) in enumerate(segments):
+            text += self.decoder.decode(self.ring.view[a:b], final=final and index == len(segments) - 1)
+        return text
+
+    def reset(self):
+        self.ring.clear()
+        self.decoder.reset()
+        self.decoder_pending = False
+        self.scan = 0
+        self.skip_lf = False
+
+
+###############################################################
+######################## BENCHMARKS ###########################
+###############################################################
+
+
+def legacy_split(source: io.BytesIO, chunk_size: int) -> int:
+    """The pre-LineFramer reader: read a new bytes object, decode it, prepend line_buffer, splitlines"""
+    line_buffer = ""
+    count = 0
+    while raw := source.read(chunk_size):
+        text = line_buffer + raw.decode("utf-8", errors="replace")
+        lines = text.splitlines()
+        if text.endswith("\n") or text.endswith("\r"):
+            line_buffer = ""
+        else:
+            line_buffer = lines.pop()
+        count += len(lines)
+    return count
+
+
+def framer_split(source: io.BytesIO, chunk_size: int, terminator: str) -> int:
+    """The SerialWorker reader: read straight into the framer's ring, frame"""
+    framer = LineFramer(terminator)
+    count = 0
+    while framer.ring.fill(source.readinto, chunk_size):
+        count += len(framer.frame())
+    return count
+
+
+def benchmark_framing(total_bytes: int = 16 << 20, chunk_size: int = 4096, line_length: int = 40, terminator: str = TERMINATOR_AUTO):
+    """Throughput of LineFramer against the legacy splitter on total_bytes of line_length-byte lines"""
+    line = ("x" * (line_length - 3) + "é").encode("utf-8")[: line_length - 2] + b"\r\n"
+    stream = line * (total_bytes // len(line))
+
+    results = {}
+    for name, split in (("LineFramer", lambda source: framer_split(source, chunk_size, terminator)), ("legacy", lambda source: legacy_split(source, chunk_size))):
+        source = io.BytesIO(stream)
+        start_t = time.perf_counter()
+        count = split(source)
+        results[name] = (time.perf_counter() - start_t, count)
+
+    for name, (elapsed, count) in results.items():
+        print(f"{name:<11} {terminator:<5} line {line_length:>5}B chunk {chunk_size:>5}B: {len(stream) / elapsed / 1e6:8.1f} MB/s {count / elapsed / 1e6:6.2f} Mlines/s ({count} lines)")
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--bench" in sys.argv:
+        for line_length in (16, 80, 1024, 16384):
+            for chunk_size in (64, 4096):
+                benchmark_framing(line_length=line_length, chunk_size=chunk_size)
+        benchmark_framing(terminator="crlf")
@@ -11,6 +11,7 @@ help                    Open help window
 clear                   Clear the terminal 
 con [port] [-b baud]    Make a serial connection (optional [port])
 dcon                    Disconnect from the device
+session [cmd] [port]    Open, show, plot or close more than one port (use -h for more info)
 alias [name]            Set the alias for the current serial port
 ports [-a]              List available ports. Use -a to show all available info
 script [args ...]       Run the script in the script tab (optional args)
@@ -21,6 +22,8 @@ log                     Open the current log file
 log -o [file]           Open any log file from the directory (optional [file].txt)
 log -s [file]           Save the current log file (optional [file].txt)
 log -n <file>           Start logging to a new file <file>.txt 
+capture [start|stop]    Record the exact bytes sent and received to a binary file
+replay <file> [-s N]    Play a log or capture back into the terminal, plot and extensions
 plot [cmd] [args]       Configure or control the plotting feature (use -h for more info)
 key [char] [value]      Set a new keyboard command 
 ext [filename] [args]   Load an extension with the name [filename].py
@@ -37,6 +40,13 @@ con [port] [OPTIONS]
 [port] only needs to match the end of the port name. 
 ie. if "/dev/ttyACM0" exists "con 0" is valid. 
 
+[port] can also be a URL for a device that is not a serial port (POSIX only): 
+    tcp://<host>:<port>             raw TCP stream, ie. ser2net or a simulator 
+    pty://[label]                   new pty pair, a simulator opens the printed path 
+    file://<path>[?speed=max][&loop=1]
+                                    replay a recorded file at the -b baud rate 
+                                    (or as fast as possible with speed=max)
+
 if no port or options are provided, the settings defined in the GUI are used 
 
 OPTIONS: 
@@ -52,6 +62,30 @@ connect to the port ending in "ACM0". Set baud to 115200, and enable xonxoff
 
 connect to the currently selected port at 9600
     con --baud 9600 
+
+connect to a device simulator listening on port 5000
+    con tcp://127.0.0.1:5000
+"""
+
+SESSION_HELP = """\
+USEAGE: 
+session                             List open sessions (* = shown in the terminal)
+session open <port> [con OPTIONS]   Open another port in the background
+session show <port>                 Show an open session in the terminal, the others keep running
+session close <port>                Close a session 
+session plot <port>                 Plot lines from <port> instead of the session in the terminal 
+session plot auto                   Plot the session shown in the terminal (default)
+
+Every session has its own reader thread and log file. Background sessions log to 
+the current log file name with the port name appended, ie. log-24-01-31-ttyUSB1.txt 
+The terminal and extensions only see the session that is shown. 
+"con" and "dcon" act on the session shown in the terminal. 
+
+EXAMPLES: 
+    con USB0 -b 115200
+    session open USB1 -b 9600
+    session plot USB1
+    session show USB1
 """
 
 SETTINGS_HELP = """\
@@ -62,6 +96,49 @@ settings -s [filename]          Save current settings to a file
 settings -l [filename]          Load settings from a file 
 settings -ls                    List all settings files 
 
+SERIAL SETTINGS (applied on the next connect): 
+    serial_read_mode=[block|poll]   block: sleep until the port has data (default)
+                                    poll: busy-poll the port (legacy)
+                                    Not used when started with --engine asyncio
+    rx_line_terminator=[auto|lf|crlf|cr|nul|0x..|\\n]
+                                    Where incoming data is split into lines
+                                    auto: any of CR LF, LF or CR (default)
+    rx_max_line_length=<bytes>      Longer lines are split into pieces (default 4096)
+    rx_idle_flush_ms=<millis>       Pass a partial line on (to log, plot, extensions) after
+                                    <millis> without new data, for prompts. 0 = off (default)
+    rx_coalesce_hz=<hz>             Most terminal/line updates per second, reads in between
+                                    are merged. 0 = update on every read (default 60)
+    rx_coalesce_bytes=<bytes>       Merged data that forces an update early (default 65536)
+    rx_queue_bytes=<bytes>          Most received data waiting for the GUI (default 8388608)
+    rx_queue_policy=[drop-oldest|drop-display|block]
+                                    What happens when the GUI falls behind and the queue is full
+                                    drop-oldest: drop the oldest terminal/plot data (default)
+                                    drop-display: drop new terminal/plot data until there is room
+                                    block: stop reading the port until there is room
+                                    Log and extensions always get every line
+    tx_queue_bytes=<bytes>          Most sent data waiting for the writer thread (default 1048576)
+                                    Sends are dropped with an error while the queue is full
+    tx_byte_delay_ms=<millis>       Pause after every sent byte, for devices without a FIFO (default 0)
+    tx_line_delay_ms=<millis>       Pause after every send / script line (default 0)
+                                    With a pause set, each write waits for CTS if rtscts is on
+
+GUI SETTINGS: 
+    gui_stall_ms=<millis>           Report event loop stalls longer than <millis> with the stack of
+                                    the GUI thread, see sk-watchdog. 0 = watchdog off (default 250)
+    terminal_frame_hz=<hz>          Most terminal redraws per second, received data is drawn in one
+                                    batch per frame. 0 = draw on every read (default 60)
+    terminal_frame_ms=<millis>      Most time one frame spends drawing, the rest is drawn in the next
+                                    frame. 0 = no limit (default 8)
+    terminal_compress=<true|false>  Compress the scrollback in blocks of 4096 lines, about 8 MB per
+                                    million lines of log instead of 5-10x that (default true)
+    terminal_cr=<newline|return>    What a CR that is not part of a CR LF does in the terminal 
+                                    newline: ends the line, for devices that end lines with CR (default) 
+                                    return: back to the start of the line, so progress bars and 
+                                    spinners redraw in place like in a terminal emulator 
+    terminal_spill_codec=<zlib|lzma>  How lines dropped by Max Lines are compressed when Spill MB is 
+                                    set. lzma files are about half the size, but slower to write and 
+                                    to scroll through (default zlib)
+
 """
 
 PLOT_HELP = """\
@@ -164,6 +241,121 @@ Save the current log to a new file called my_log.txt
 
 """
 
+CAPTURE_HELP = """\
+USEAGE: 
+capture                             List running captures
+capture start [file] [-p port]      Capture the session shown in the terminal (or <port>) to <file>.skcap 
+                                    in the log directory (default capture-<date>-<port>.skcap)
+capture stop [-p port]              Stop capturing 
+capture info <file> [--from sec]    Records, bytes and time span of a capture. With --from, print 
+                                    the records starting <sec> seconds into the capture
+capture -ls                         List capture files in the log directory 
+capture -h                          Print this help text 
+
+Captures hold every byte read (RX) and written (TX) with its read/write time, unlike the log, 
+which stores decoded lines. A .idx file next to the capture lets tools seek by time. 
+
+EXAMPLES: 
+    capture start flaky_fw
+    capture info flaky_fw --from 12.5
+    capture stop
+"""
+
+REPLAY_HELP = """\
+USEAGE: 
+replay <file> [-s speed]        Play a capture (.skcap) or a text log back as if the device sent it 
+replay                          Show the progress of the running replay 
+replay stop                     Stop the replay 
+replay -h                       Print this help text 
+
+OPTIONS: 
+    -s, --speed [N|max]         N times the recorded speed (default 1). max: as fast as possible 
+
+The data goes through the same path as a serial port: line framing, terminal, plot, extensions and 
+the log. Lines keep their recorded times. Captures replay RX bytes exactly. Text logs are read with 
+the log line and time formats of the Log tab. When the replay ends, the time spent and the MB/s 
+and lines/s sustained by each stage are printed, so "-s max" doubles as a throughput benchmark. 
+
+EXAMPLES: 
+    replay flaky_fw.skcap -s 10
+    replay log-24-01-31.txt -s max
+"""
+
+SK_STATS_HELP = """\
+USEAGE: 
+sk-stats                        Print every metric 
+sk-stats <prefix>               Print the metrics starting with <prefix>, ie. rx, tx, terminal, plot, log, ext, gui
+sk-stats reset                  Zero every metric 
+sk-stats -j [file]              Save the metrics as JSON (default sk-stats-<date>.json in the log directory)
+sk-stats -h                     Print this help text 
+
+Counters show the total and the rate, gauges the last value and the peak, and histograms 
+the count, rate, p50, p99 and max. Times are in us. The JSON also has p90, p99.9, min and mean. 
+Every session adds to the same metrics. 
+
+METRICS: 
+    rx.read_ns, rx.read_bytes       Time and size of each port read 
+    rx.frame_ns, rx.decode_ns       Line framing per read, and the decode part of it 
+    rx.queue_bytes                  Data waiting for the GUI 
+    gui.drain_ns                    Handling the queued data on the GUI thread 
+    terminal.put_chars_ns           Queueing received data for the next terminal frame 
+    terminal.frame_ns               Adding one frame to the scrollback, with terminal.parse_ns (escape 
+                                    sequence parsing) and terminal.insert_ns per slice and terminal.frame_bytes 
+    terminal.paint_ns, terminal.lines  Drawing the lines on screen, and the lines in the scrollback 
+    terminal.format_hits/misses     Text formats taken from the cache / built, one miss per new style 
+    plot.update_ns, log.write_ns    Per line 
+    ext.receive_lines_ns            Extension callback per batch 
+    tx.write_ns, tx.queue_ns        Port write time and time spent in the TX queue 
+"""
+
+SK_WATCHDOG_HELP = """\
+USEAGE: 
+sk-watchdog                     Show the event loop lag and the times of recent stalls 
+sk-watchdog stalls              Also show the GUI thread stack taken during each stall 
+sk-watchdog clear               Forget the recent stalls 
+sk-watchdog -h                  Print this help text 
+
+The GUI thread checks in every 50 ms. How late it is goes to the gui.loop_lag_ns metric (sk-stats gui), 
+when it is gui_stall_ms late the stack of the GUI thread is taken from a helper thread, so the 
+report shows the plot, terminal or extension code that froze the window. 
+The status bar shows the p99 lag and the stall count. 
+"""
+
+SK_PROFILE_HELP = """\
+USEAGE: 
+sk-profile                          Show what is being profiled 
+sk-profile start [file]             Profile every function call with cProfile (default 
+                                    sk-profile-<date>.pstats in the log directory)
+sk-profile start [file] -s [ms]     Sample the stacks of every thread every [ms] (default 5) instead 
+                                    (default sk-profile-<date>.folded in the log directory)
+sk-profile stop [file]              Stop, save the profile (to [file] if given) and print the top functions
+sk-profile report <file>            Print the top functions of a saved profile 
+sk-profile -h                       Print this help text 
+
+cProfile covers the GUI, port reader, TX writer, replay, script and extension threads. Before 
+Python 3.12 a worker thread joins at its next read, send or script line. The .pstats file opens in snakeviz, gprof2dot 
+or python -m pstats. 
+Sampling costs little enough to leave on during soak tests. The .folded file has one 
+"thread;outer;...;inner count" line per stack, for flamegraph.pl, speedscope or inferno. 
+"""
+
+SK_TRACE_HELP = """\
+USEAGE: 
+sk-trace                        Show the trace status 
+sk-trace start [file] [-s N]    Start tracing batches of received data (default sk-trace-<date>.json in the log directory)
+sk-trace stop [file]            Stop and save the trace, to [file] if given 
+sk-trace -h                     Print this help text 
+
+OPTIONS: 
+    -s, --sample N              Trace 1 in N batches (default 1). A large N keeps the overhead low 
+                                enough to leave tracing on 
+
+The trace is Chrome trace-event JSON, open it in ui.perfetto.dev or chrome://tracing. 
+Reader thread:  rx.read (port read), rx.split (line framing), rx.batch (first read to hand-off) 
+GUI thread:     rx.to_gui (first read to GUI pickup), terminal.put_chars, receive_lines, 
+                ext.receive_lines, plot.update and log.write_line 
+"""
+
 KEY_COMMAND_HELP = """\
 USEAGE: 
 key                     jump to key textedit
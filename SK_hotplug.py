@@ -0,0 +1,166 @@
+import os
+import sys
+import time
+import errno
+import struct
+import ctypes
+import ctypes.util
+import threading
+import serial.tools.list_ports
+import serial.tools.list_ports_linux
+
+from SK_common import *
+from SK_metrics import METRICS
+
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")  ## wd, mask, cookie, name length. The name follows
+HOTPLUG_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+
+DEV_DIR = "/dev"
+BY_ID_DIR = "/dev/serial/by-id"
+PORT_PREFIXES = ("ttyS", "ttyUSB", "ttyXRUSB", "ttyACM", "ttyAMA", "rfcomm", "ttyAP")  ## The nodes pyserial's Linux comports() lists
+HOTPLUG_SETTLE = 0.1  ## Seconds without events before rescanning. udev adds the by-id links and permissions after the node
+
+RESCAN_NS = METRICS.histogram("ports.rescan_ns")
+SYSFS_READS = METRICS.counter("ports.sysfs_reads")  ## Device nodes that were not in the cache
+
+
+class Inotify:
+    """Just enough inotify(7) through ctypes to watch directories. Raises OSError where there is no inotify."""
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is Linux only")
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches: dict[int, str] = {}  ## Watch descriptor -> directory
+
+    def add_watch(self, path: str, mask: int = HOTPLUG_MASK) -> bool:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            return False
+        self.watches[wd] = path
+        return True
+
+    def watching(self, path: str) -> bool:
+        return path in self.watches.values()
+
+    def read(self) -> list[tuple[str, int, str]]:
+        """(directory, mask, name) of every pending event, [] if there are none"""
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            wd, mask, cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset : offset + length].rstrip(b"\x00").decode(errors="replace")
+            offset += length
+            events.append((self.watches.get(wd, ""), mask, name))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PortScanner:
+    """comports() with a per device node cache.
+
+    On Linux the sysfs walk (SysFS()) only runs for nodes that are new or were re-created since the last
+    scan, the rest is one listdir of /dev. Elsewhere every scan is a plain comports().
+    Shared by the GUI thread and the rescan thread.
+    """
+
+    def __init__(self):
+        self.cache: dict[str, tuple[tuple[int, int], object]] = {}  ## Device -> ((inode, ctime), ListPortInfo)
+        self.lock = threading.Lock()
+        self.stats = {"scans": 0, "sysfs_reads": 0, "last_ms": 0.0, "total_ms": 0.0}
+
+    def scan(self) -> list:
+        start_t = time.perf_counter_ns()
+        with self.lock:
+            if sys.platform.startswith("linux"):
+                infos = self.scan_sysfs()
+            else:
+                infos = serial.tools.list_ports.comports()
+            elapsed = time.perf_counter_ns() - start_t
+            RESCAN_NS.record(elapsed)
+            self.stats["scans"] += 1
+            self.stats["last_ms"] = elapsed / 1e6
+            self.stats["total_ms"] += elapsed / 1e6
+        return infos
+
+    def scan_sysfs(self) -> list:
+        cache = {}
+        for name in sorted(os.listdir(DEV_DIR)):
+            if not name.startswith(PORT_PREFIXES):
+                continue
+            device = os.path.join(DEV_DIR, name)
+            try:
+                stat = os.stat(device)
+            except OSError:
+                continue
+            key = (stat.st_ino, stat.st_ctime_ns)
+            cached = self.cache.get(device)
+            if cached is None or cached[0] != key:
+                cached = (key, serial.tools.list_ports_linux.SysFS(device))
+                self.stats["sysfs_reads"] += 1
+                SYSFS_READS.inc()
+            cache[device] = cached
+        self.cache = cache
+        return [info for key, info in cache.values() if info.subsystem != "platform"]  ## Same filter as comports()
+
+    def summary(self) -> str:
+        scans = max(self.stats["scans"], 1)
+        return f"{self.stats['scans']} rescans, {self.stats['sysfs_reads']} sysfs reads, last {self.stats['last_ms']:.2f} ms, average {self.stats['total_ms'] / scans:.2f} ms"
+
+
+PORT_SCANNER = PortScanner()
+
+
+def is_port_event(directory: str, mask: int, name: str) -> bool:
+    if mask & IN_Q_OVERFLOW:
+        return True
+    if directory == BY_ID_DIR:
+        return True
+    return name.startswith(PORT_PREFIXES) or name == "serial"
+
+
+###############################################################
+######################## BENCHMARKS ###########################
+###############################################################
+
+
+def benchmark_rescan(rounds: int = 200):
+    """Time of a full comports() against a cached PortScanner.scan() with nothing plugged or unplugged.
+
+    Returns {"comports_ms": ..., "cached_ms": ..., "ports": ...}
+    """
+    start_t = time.perf_counter()
+    for i in range(rounds):
+        ports = serial.tools.list_ports.comports()
+    comports_s = (time.perf_counter() - start_t) / rounds
+    scanner = PortScanner()
+    scanner.scan()
+    start_t = time.perf_counter()
+    for i in range(rounds):
+        scanner.scan()
+    cached_s = (time.perf_counter() - start_t) / rounds
+    return {"comports_ms": round(comports_s * 1000, 3), "cached_ms": round(cached_s * 1000, 3), "ports": len(ports)}
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        print(benchmark_rescan())
@@ -0,0 +1,584 @@
+import os
+import sys
+import lzma
+import time
+import zlib
+import random
+import tempfile
+from array import array
+from collections import OrderedDict
+
+from SK_vt_parser import Style, DEFAULT_STYLE, palette_index, EV_TEXT, EV_STYLE, EV_CONTROL, EV_CSI
+
+BLOCK_LINES = 4096  ## Lines per block, the unit of trimming and compression
+CACHED_BLOCKS = 16  ## Decompressed blocks kept for drawing and copying
+MAX_LINE_CHARS = 16384  ## Longer lines are broken into several
+TAB_SIZE = 8
+CR_NEWLINE = "newline"  ## A lone CR ends the line, for devices that end lines with CR only
+CR_RETURN = "return"  ## A lone CR goes back to the start of the line, like a terminal. Progress bars redraw in place
+CR_MODES = (CR_NEWLINE, CR_RETURN)
+MAX_STYLES = 4096  ## Style table size. Once full new truecolour styles take the nearest palette colours, up to twice this
+COMPRESS_LEVEL = 1  ## zlib level for full blocks, log text still shrinks 5-10x
+SPILL_ZLIB_LEVEL = 6  ## Spilled blocks that were not compressed in memory
+SPILL_LZMA_PRESET = 1  ## About 2x smaller than zlib on logs, 10x slower to write
+SPILL_CODECS = ("zlib", "lzma")
+
+
+class LineBlock:
+    """Up to BLOCK_LINES lines: their text, where each line ends and the style runs.
+
+    runs is a flat array of (start, style id) pairs, starts in characters from the start of the block, and every
+    line starts with a run. While the block fills the lines are kept as a list. Once full they are joined into
+    one str, or the text and the arrays are zlib compressed together and unpack() gives them back.
+    """
+
+    __slots__ = ("pieces", "text", "packed", "ends", "runs", "line_runs", "chars", "lines")
+
+    def __init__(self):
+        self.pieces: list[str] = []  ## Lines while the block fills
+        self.text: str = None  ## All lines once full, unless compressed
+        self.packed: bytes = None  ## ends, line_runs, runs and the text (UTF-8) compressed
+        self.ends = array("I")  ## Character offset after each line
+        self.runs = array("I")
+        self.line_runs = array("I")  ## Index of the first run (pair) of each line
+        self.chars = 0
+        self.lines = 0
+
+    def __len__(self) -> int:
+        return self.lines
+
+    def append(self, text: str, runs: list[tuple[int, int]]):
+        self.line_runs.append(len(self.runs) // 2)
+        for start, style in runs:
+            self.runs.append(self.chars + start)
+            self.runs.append(style)
+        self.pieces.append(text)
+        self.chars += len(text)
+        self.ends.append(self.chars)
+        self.lines += 1
+
+    def seal(self, compress: bool):
+        self.text = "".join(self.pieces)
+        self.pieces = None
+        if compress:
+            self.packed = zlib.compress(self.payload(), COMPRESS_LEVEL)
+            self.text = self.ends = self.runs = self.line_runs = None
+
+    def payload(self) -> bytes:
+        """A full block as bytes: the run count, ends, line_runs and runs and the text (UTF-8)"""
+        if self.packed is not None:
+            return zlib.decompress(self.packed)
+        header = array("I", (len(self.runs),)).tobytes()
+        return header + self.ends.tobytes() + self.line_runs.tobytes() + self.runs.tobytes() + self.text.encode("utf-8", errors="surrogatepass")
+
+    def unpack(self) -> "LineBlock":
+        """The lines of a compressed block as an uncompressed one"""
+        return LineBlock.from_payload(zlib.decompress(self.packed), self.lines)
+
+    @staticmethod
+    def from_payload(data: bytes, lines: int) -> "LineBlock":
+        block = LineBlock()
+        block.pieces = None
+        block.lines = lines
+        item = array("I").itemsize
+        run_count = array("I", data[:item])[0]
+        offset = item
+        for name, count in (("ends", lines), ("line_runs", lines), ("runs", run_count)):
+            setattr(block, name, array("I", data[offset : offset + count * item]))
+            offset += count * item
+        block.text = data[offset:].decode("utf-8", errors="surrogatepass")
+        block.chars = len(block.text)
+        return block
+
+    def line(self, index: int) -> tuple[str, list[tuple[int, int]]]:
+        """Text and (start, style id) runs of a line, not for a compressed block"""
+        start = self.ends[index - 1] if index else 0
+        first = self.line_runs[index]
+        last = self.line_runs[index + 1] if index + 1 < self.lines else len(self.runs) // 2
+        runs = self.runs
+        line_runs = [(runs[2 * i] - start, runs[2 * i + 1]) for i in range(first, last)]
+        if self.pieces is not None:
+            return self.pieces[index], line_runs
+        return self.text[start : self.ends[index]], line_runs
+
+    def nbytes(self) -> int:
+        if self.packed is not None:
+            return len(self.packed)
+        size = self.ends.itemsize * (len(self.ends) + len(self.runs) + len(self.line_runs))
+        if self.text is not None:
+            return size + sys.getsizeof(self.text)
+        return size + sum(map(sys.getsizeof, self.pieces))
+
+
+class SpillFile:
+    """One temporary file of spilled blocks, each block one compressed chunk, and where each chunk is"""
+
+    def __init__(self, first_block: int, codec: str):
+        self.file = tempfile.TemporaryFile(prefix="sk_spill_")
+        self.first_block = first_block
+        self.codec = codec
+        self.offsets = array("Q")  ## Chunk of block first_block + i starts at offsets[i]
+        self.sizes = array("I")
+        self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def write(self, block: LineBlock):
+        if self.codec == "lzma":
+            data = lzma.compress(block.payload(), preset=SPILL_LZMA_PRESET)
+        elif block.packed is not None:
+            data = block.packed  ## Already zlib
+        else:
+            data = zlib.compress(block.payload(), SPILL_ZLIB_LEVEL)
+        os.write(self.file.fileno(), data)
+        self.offsets.append(self.nbytes)
+        self.sizes.append(len(data))
+        self.nbytes += len(data)
+
+    def read(self, number: int) -> LineBlock:
+        i = number - self.first_block
+        data = os.pread(self.file.fileno(), self.sizes[i], self.offsets[i])
+        data = lzma.decompress(data) if self.codec == "lzma" else zlib.decompress(data)
+        return LineBlock.from_payload(data, BLOCK_LINES)
+
+    def close(self):
+        self.file.close()
+
+
+class Spill:
+    """Blocks dropped from memory, kept on disk up to capacity bytes.
+
+    Blocks go to the newest of up to two SpillFiles. Once it holds half the capacity a new file is started and
+    the oldest is deleted, so the disk used stays under capacity and the spilled lines stay contiguous.
+    Only the offset index is in memory.
+    """
+
+    def __init__(self, capacity: int, codec: str = "zlib"):
+        self.capacity = capacity
+        self.codec = codec
+        self.files: list[SpillFile] = []
+
+    def __len__(self) -> int:
+        return sum(len(file) for file in self.files)
+
+    @property
+    def first_block(self) -> int:
+        return self.files[0].first_block
+
+    def write(self, number: int, block: LineBlock):
+        if not self.files or self.files[-1].nbytes >= self.capacity // 2:
+            self.files.append(SpillFile(number, self.codec))
+            while len(self.files) > 2:
+                self.files.pop(0).close()
+        self.files[-1].write(block)
+
+    def read(self, number: int) -> LineBlock:
+        for file in self.files:
+            if number < file.first_block + len(file):
+                return file.read(number)
+        raise IndexError(f"block {number} is not spilled")
+
+    def nbytes(self) -> int:
+        return sum(file.nbytes for file in self.files)
+
+    def clear(self):
+        for file in self.files:
+            file.close()
+        self.files = []
+
+
+class LineStore:
+    """Ring of styled lines in blocks of BLOCK_LINES.
+
+    Lines are numbered from the first line ever added, the store keeps [first, end). Appending, reading any line
+    and dropping the oldest lines are constant time whatever the number of lines. Styles are stored as ids into
+    styles, the same Style always gets the same id.
+    Past max_lines whole blocks leave memory. With a spill they are written to disk and read back when asked
+    for, the lines before start are then still there.
+    """
+
+    def __init__(self, max_lines: int = 0, compress: bool = True):
+        self.max_lines = max_lines  ## 0 = no limit
+        self.compress = compress
+        self.blocks: dict[int, LineBlock] = {}  ## Block number (line number // BLOCK_LINES) -> block
+        self.first_block = 0  ## Number of the oldest block
+        self.start = 0  ## Number of the oldest line kept in memory
+        self.end = 0  ## Number after the newest line
+        self.cache: OrderedDict[int, LineBlock] = OrderedDict()  ## Recently read compressed blocks, unpacked
+        self.styles: list[Style] = [DEFAULT_STYLE]
+        self.style_ids: dict[Style, int] = {DEFAULT_STYLE: 0}
+        self.spill: Spill = None
+
+    def __len__(self) -> int:
+        return self.end - self.first
+
+    @property
+    def first(self) -> int:
+        """Number of the oldest line that can be read, on disk or in memory"""
+        if self.spill is not None and self.spill.files:
+            return self.spill.first_block * BLOCK_LINES
+        return self.start
+
+    def style_id(self, style: Style) -> int:
+        id = self.style_ids.get(style)
+        if id is not None:
+            return id
+        if len(self.styles) >= MAX_STYLES:  ## Ids are stored in the blocks, so styles cannot be dropped until clear()
+            style = palette_style(style)
+            id = self.style_ids.get(style)
+            if id is not None or len(self.styles) >= 2 * MAX_STYLES:
+                return id or 0
+        id = self.style_ids[style] = len(self.styles)
+        self.styles.append(style)
+        return id
+
+    def append(self, text: str, runs: list[tuple[int, int]]):
+        number = self.end // BLOCK_LINES
+        block = self.blocks.get(number)
+        if block is None:
+            block = self.blocks[number] = LineBlock()
+        block.append(text, runs)
+        self.end += 1
+        if len(block) == BLOCK_LINES:
+            block.seal(self.compress)
+        if self.max_lines and self.end - self.start > self.max_lines:
+            self.trim()
+
+    def set_max_lines(self, max_lines: int):
+        self.max_lines = max_lines
+        if max_lines and len(self) > max_lines:
+            self.trim()
+
+    def trim(self):
+        """Forget lines past max_lines, whole blocks are dropped once none of their lines are kept"""
+        self.start = self.end - self.max_lines
+        while self.first_block < self.start // BLOCK_LINES:
+            self.evict(self.first_block)
+            self.first_block += 1
+
+    def evict(self, number: int):
+        block = self.blocks.pop(number, None)
+        self.cache.pop(number, None)
+        if block is not None and self.spill is not None:
+            self.spill.write(number, block)
+
+    def set_spill(self, capacity: int, codec: str = "zlib"):
+        """Keep blocks dropped from memory in up to capacity bytes on disk, 0 = drop them.
+        A new codec is used from the next spill file on."""
+        if capacity <= 0:
+            if self.spill is not None:
+                self.spill.clear()
+            self.spill = None
+        elif self.spill is None:
+            self.spill = Spill(capacity, codec)
+        else:
+            self.spill.capacity = capacity
+            self.spill.codec = codec
+
+    def line(self, index: int) -> tuple[str, list[tuple[int, int]]]:
+        """Text and (start, style id) runs of the index-th line, 0 is the oldest"""
+        number, offset = divmod(self.first + index, BLOCK_LINES)
+        block = self.blocks.get(number)
+        if block is None:
+            block = self.unpacked(number, self.spill.read)
+        elif block.packed is not None:
+            block = self.unpacked(number, lambda number: block.unpack())
+        return block.line(offset)
+
+    def unpacked(self, number: int, load) -> LineBlock:
+        """Block number uncompressed, from the cache or load(number)"""
+        unpacked = self.cache.get(number)
+        if unpacked is None:
+            unpacked = self.cache[number] = load(number)
+            if len(self.cache) > CACHED_BLOCKS:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(number)
+        return unpacked
+
+    def clear(self):
+        self.blocks.clear()
+        self.cache.clear()
+        if self.spill is not None:
+            self.spill.clear()
+        self.first_block = self.start = self.end = 0
+        self.styles = [DEFAULT_STYLE]
+        self.style_ids = {DEFAULT_STYLE: 0}
+
+    def nbytes(self) -> int:
+        return sum(block.nbytes() for block in self.blocks.values())
+
+    def summary(self) -> str:
+        packed = sum(1 for block in self.blocks.values() if block.packed is not None)
+        limit = f"{self.max_lines} max" if self.max_lines else "no limit"
+        text = f"{len(self)} lines ({limit}) in {len(self.blocks)} blocks, {packed} compressed, {self.nbytes() / 1e6:.1f} MB"
+        if self.spill is not None:
+            text += f", {len(self.spill)} blocks spilled ({self.spill.codec}), {self.spill.nbytes() / 1e6:.1f} of {self.spill.capacity / 1e6:.0f} MB on disk"
+        return text
+
+
+def palette_style(style: Style) -> Style:
+    """style with truecolour foreground and background replaced by the nearest palette colours"""
+    fg = palette_index(style.fg) if isinstance(style.fg, tuple) else style.fg
+    bg = palette_index(style.bg) if isinstance(style.bg, tuple) else style.bg
+    return style._replace(fg=fg, bg=bg)
+
+
+class TerminalBuffer:
+    """Everything the terminal shows: the store plus the line being written.
+
+    apply() takes VTParser events. Only the last line can change: BS and cursor left / right / column move
+    col within it and the text that follows overwrites, erase in line / below cut it. A lone CR does the same
+    with cr_mode CR_RETURN, with CR_NEWLINE it ends the line like LF and CR LF. Moves to other lines and
+    clearing the screen are ignored, they would rewrite the log.
+    """
+
+    def __init__(self, max_lines: int = 0, compress: bool = True):
+        self.store = LineStore(max_lines, compress)
+        self.text = ""  ## The line being written
+        self.runs: list[tuple[int, int]] = []  ## Its (start, style id) runs
+        self.col = 0  ## Where the next character goes
+        self.style = 0  ## Style id for new text
+        self.width = 0  ## Longest line seen, in characters
+        self.cr_mode = CR_NEWLINE
+        self.after_cr = False  ## The last thing written was a CR that ended the line, a LF right after it is part of it
+
+    def __len__(self) -> int:
+        return len(self.store) + 1
+
+    @property
+    def first_line(self) -> int:
+        """Number of line 0, lines keep their number while older ones are dropped"""
+        return self.store.first
+
+    def line(self, index: int) -> tuple[str, list[tuple[int, int]]]:
+        if index == len(self.store):
+            return self.text, self.runs
+        return self.store.line(index)
+
+    def set_style(self, style: Style):
+        self.style = self.store.style_id(style)
+
+    def apply(self, events: list[tuple]):
+        for event in events:
+            kind = event[0]
+            if kind == EV_TEXT:
+                self.write(event[1])
+            elif kind == EV_STYLE:
+                self.set_style(event[1])
+            elif kind == EV_CONTROL:  ## LF and TAB only come as controls inside an unfinished escape sequence
+                if event[1] == "\r":
+                    self.carriage_return()
+                elif event[1] == "\n":
+                    if not self.after_cr:
+                        self.newline()
+                    self.after_cr = False
+                elif event[1] == "\t":
+                    self.tab()
+                elif event[1] == "\b":
+                    self.col = max(0, self.col - 1)
+            elif kind == EV_CSI and not event[3]:
+                self.csi(event[1], event[2])
+
+    def csi(self, final: str, params: tuple):
+        n = max(params[0], 1)
+        if final == "D":  ## Cursor left
+            self.col = max(0, self.col - n)
+        elif final == "C":  ## Cursor right
+            self.col = min(len(self.text), self.col + n)
+        elif final == "G":  ## Cursor to column
+            self.col = min(len(self.text), n - 1)
+        elif final == "K" and params[0] == 1:  ## Erase to the left
+            self.overwrite(0, " " * self.col)
+        elif final == "K" and params[0] == 2:  ## Erase the line
+            self.text = ""
+            self.runs = []
+            self.col = 0
+        elif final in "KJ" and params[0] == 0:  ## Erase to the right, erase below
+            self.text = self.text[: self.col]
+            self.runs = [run for run in self.runs if run[0] < self.col]
+
+    def write(self, text: str):
+        """Text at the cursor, a LF (or CR LF) ends the line and a lone CR is a carriage_return(), as in apply()"""
+        if self.after_cr and text.startswith("\n"):
+            text = text[1:]
+        self.after_cr = False
+        pieces = text.split("\n")
+        last = len(pieces) - 1
+        for i, piece in enumerate(pieces):
+            if "\r" in piece:
+                parts = piece.split("\r")
+                if i < last and not parts[-1]:  ## The CR of a CR LF
+                    parts.pop()
+                for j, part in enumerate(parts):
+                    if j:
+                        self.carriage_return()
+                    if part:
+                        self.put(part)
+            elif piece:
+                self.put(piece)
+            if i < last:
+                self.newline()
+
+    def carriage_return(self):
+        if self.cr_mode == CR_NEWLINE:
+            self.newline()
+            self.after_cr = True
+        else:
+            self.col = 0
+
+    def put(self, text: str):
+        self.after_cr = False
+        if "\t" in text:
+            text = self.expand_tabs(text)
+        if self.col >= len(self.text):
+            if not self.runs or self.runs[-1][1] != self.style:
+                self.runs.append((len(self.text), self.style))
+            self.text += text
+            self.col = len(self.text)
+        else:
+            self.overwrite(self.col, text)
+            self.col += len(text)
+        if len(self.text) >= MAX_LINE_CHARS and self.col >= len(self.text):
+            self.newline()
+
+    def tab(self):
+        """Cursor to the next tab stop, padding the line with spaces if it is shorter"""
+        stop = self.col + TAB_SIZE - self.col % TAB_SIZE
+        if stop > len(self.text):
+            self.col = len(self.text)
+            self.put(" " * (stop - len(self.text)))
+        else:
+            self.col = stop
+
+    def expand_tabs(self, text: str) -> str:
+        out = []
+        col = self.col
+        for char in text:
+            if char == "\t":
+                spaces = TAB_SIZE - col % TAB_SIZE
+                out.append(" " * spaces)
+                col += spaces
+            else:
+                out.append(char)
+                col += 1
+        return "".join(out)
+
+    def overwrite(self, col: int, text: str):
+        styles = self.char_styles()
+        end = col + len(text)
+        self.text = self.text[:col] + text + self.text[end:]
+        styles[col:end] = [self.style] * len(text)
+        self.runs = []
+        previous = None
+        for i, style in enumerate(styles):
+            if style != previous:
+                self.runs.append((i, style))
+                previous = style
+
+    def char_styles(self) -> list[int]:
+        styles = []
+        for i, (start, style) in enumerate(self.runs):
+            end = self.runs[i + 1][0] if i + 1 < len(self.runs) else len(self.text)
+            styles.extend([style] * (end - start))
+        return styles
+
+    def newline(self):
+        self.store.append(self.text, self.runs)
+        self.width = max(self.width, len(self.text))
+        self.text = ""
+        self.runs = []
+        self.col = 0
+
+    def to_end(self):
+        self.col = len(self.text)
+
+    def clear(self):
+        self.store.clear()
+        self.text = ""
+        self.runs = []
+        self.col = 0
+        self.style = 0
+        self.width = 0
+        self.after_cr = False
+
+    def plain_text(self, first: tuple[int, int] = None, last: tuple[int, int] = None) -> str:
+        """Text from (line number, column) first up to last, everything by default"""
+        first = first or (self.first_line, 0)
+        last = last or (self.first_line + len(self) - 1, len(self.text))
+        lines = []
+        for number in range(max(first[0], self.first_line), min(last[0] + 1, self.first_line + len(self))):
+            text = self.line(number - self.first_line)[0]
+            if number == last[0]:
+                text = text[: last[1]]
+            if number == first[0]:
+                text = text[first[1] :]
+            lines.append(text)
+        return "\n".join(lines)
+
+
+###############################################################
+######################## BENCHMARKS ###########################
+###############################################################
+
+
+PAGE_LINES = 60  ## Lines of a screen, for the benchmark
+
+
+def benchmark_store(lines: int = 10_000_000, report_every: int = 1_000_000, compress: bool = True):
+    """Append lines styled like a colour tagged firmware log, timing each report_every lines and reading a screen
+    (PAGE_LINES) at random places, to show both stay flat as the store grows. Returns [(lines, append_us, page_us, MB)]"""
+    store = LineStore(compress=compress)
+    tag = store.style_id(Style(fg=2))
+    text = "I (123456) wifi: connected to ap, rssi -42, channel 6, phy bgn, 23.4 C"
+    runs = [(0, tag), (16, 0)]
+    results = []
+    start_t = time.perf_counter()
+    for n in range(1, lines + 1):
+        store.append(text, runs)
+        if n % report_every == 0:
+            append_us = (time.perf_counter() - start_t) / report_every * 1e6
+            pages = [random.randrange(len(store) - PAGE_LINES) for i in range(200)]
+            read_t = time.perf_counter()
+            for first in pages:
+                for index in range(first, first + PAGE_LINES):
+                    store.line(index)
+            read_us = (time.perf_counter() - read_t) / len(pages) * 1e6
+            results.append((n, round(append_us, 3), round(read_us, 2), round(store.nbytes() / 1e6, 1)))
+            print(f"{n:>10} lines: append {append_us:6.3f} us/line, random screen {read_us:8.1f} us, {store.nbytes() / 1e6:8.1f} MB")
+            start_t = time.perf_counter()
+    return results
+
+
+def benchmark_spill(lines: int = 2_000_000, max_lines: int = 100_000, capacity_mb: int = 256):
+    """The same log with max_lines in memory and the rest spilled, per codec. Returns
+    {codec: (append_us, spilled_page_us, memory MB, disk MB)}, spilled_page_us reads a screen from a spilled block"""
+    text = "I (123456) wifi: connected to ap, rssi -42, channel 6, phy bgn, 23.4 C"
+    results = {}
+    for codec in SPILL_CODECS:
+        store = LineStore(max_lines)
+        store.set_spill(capacity_mb * 1_000_000, codec)
+        runs = [(0, store.style_id(Style(fg=2))), (16, 0)]
+        start_t = time.perf_counter()
+        for n in range(lines):
+            store.append(text, runs)
+        append_us = (time.perf_counter() - start_t) / lines * 1e6
+        spilled = store.start - store.first - PAGE_LINES
+        pages = [random.randrange(spilled) for i in range(50)]
+        read_t = time.perf_counter()
+        for first in pages:
+            store.cache.clear()
+            for index in range(first, first + PAGE_LINES):
+                store.line(index)
+        page_us = (time.perf_counter() - read_t) / len(pages) * 1e6
+        results[codec] = (round(append_us, 3), round(page_us, 1), round(store.nbytes() / 1e6, 1), round(store.spill.nbytes() / 1e6, 1))
+        print(f"{codec}: append {append_us:6.3f} us/line, spilled screen {page_us:8.1f} us, {store.summary()}")
+        store.clear()
+    return results
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        benchmark_store()
+        benchmark_spill()
@@ -7,11 +7,13 @@ from io import StringIO
 
 from SK_common import *
 from SK_serial_worker import SK_Port
+from SK_metrics import METRICS
 import traceback
 
 DEFAULT_LOG_NAME = "log-%y-%m-%d.txt"
 DEFAULT_LOG_FORMAT = "%(Name)s\\t|%(asctime)s.%(msecs)03d|\\t%(message)s"
 DEFAULT_TIME_FORMAT = "%I:%M:%S"
+WRITE_NS = METRICS.histogram("log.write_ns")
 
 class SK_Logger(QObject):
     handler: logging.Handler = None
@@ -32,11 +34,13 @@ class SK_Logger(QObject):
 
     active: bool = False 
     enabled = False 
+    name: str = None  ## Set for per-session loggers so each one gets its own logging.Logger
 
 
     filename_changed = pyqtSignal(str)
 
-    def __init__(self, filepath:str = None, line_fmt:str = None, time_fmt:str = None, port:SK_Port = None):
+    def __init__(self, filepath:str = None, line_fmt:str = None, time_fmt:str = None, port:SK_Port = None, name:str = None):
+        self.name = name 
         if filepath is not None:
             self.filepath = filepath 
         if self.line_fmt is not None:
@@ -78,7 +82,11 @@ class SK_Logger(QObject):
         if self.active:
             self.stop()
 
-        self.logger = logging.getLogger(__name__)
+        if self.name:
+            self.logger = logging.getLogger(f"{__name__}.{self.name}")
+            self.logger.propagate = False  ## Keep session lines out of the main log 
+        else:
+            self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.DEBUG)
 
         self.formatter = logging.Formatter(fmt = self.line_fmt, datefmt = self.time_fmt, validate = True)
@@ -99,11 +107,20 @@ class SK_Logger(QObject):
         self.filename_changed.emit("Current Log: None")
         self.active = False 
 
-    def write_line(self, text:str):
+    def write_line(self, text:str, stamp:tuple[int, int] = None):
+        """stamp: (perf_counter_ns, time_ns) read time of the line. The log time is the read time instead of now."""
         if not self.enabled:
             return 
+        start_t = time.perf_counter_ns()
         try: 
-            self.logger.warning(text, extra = self.port_properties)
+            if stamp is None: 
+                self.logger.warning(text, extra = self.port_properties)
+            else: 
+                record = self.logger.makeRecord(self.logger.name, logging.WARNING, "SK_Logger", 0, text, None, None, extra = self.port_properties)
+                record.created = stamp[1] / 1e9
+                record.msecs = (stamp[1] // 1_000_000) % 1000
+                self.logger.handle(record)
+            WRITE_NS.record(time.perf_counter_ns() - start_t)
         except Exception as e:
             vprint(f"Error writing to logger: {e}", color = "red")
             vprint(f"Text: {text}", color = "red")
@@ -19,9 +19,21 @@ from SK_common import *
 from SK_help import *
 from SK_widgets import *
 from SK_serial_worker import *
+from SK_session import SerialSession
+from SK_tx_writer import DEFAULT_TX_QUEUE_BYTES
+from SK_capture import CaptureReader, CAPTURE_EXT, DIR_NAMES
+from SK_replay import ReplayWorker
+from SK_metrics import METRICS
+from SK_trace import TRACER
+from SK_watchdog import StallWatchdog, DEFAULT_STALL_MS
+from SK_reconnect import Reconnector, PortConfig
+from SK_profiler import PROFILER, MODE_CPROFILE, MODE_SAMPLING, PROFILE_EXTS, SAMPLE_INTERVAL_MS, profile_report
+from SK_async_engine import AsyncEngine, ENGINE_THREAD, ENGINE_ASYNCIO
+from SK_transport import is_transport_url
 from SK_logger import *
 from SK_text_popup import *
 from SK_terminal import *
+from SK_line_store import SPILL_CODECS, CR_MODES, CR_NEWLINE
 from SK_extensions import SK_Extension
 import numpy as np
 import importlib
@@ -31,24 +43,36 @@ sys.path.append(DEFAULT_EXTENSION_PATH)
 
 
 PARITIES = {"NONE": serial.PARITY_NONE, "EVEN": serial.PARITY_EVEN, "ODD": serial.PARITY_ODD, "MARK": serial.PARITY_MARK, "SPACE": serial.PARITY_SPACE}
+STATUS_BAR_INTERVAL = 500  ## ms. Status bar refresh while connected (RX queue counters)
+
+
+DRAIN_NS = METRICS.histogram("gui.drain_ns")  ## One serial_drain: terminal, extension, plot and log for the queued batches
 
 
 class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
     history = [""]
     history_index = 1
-    ports = {}
+    ports: PortRegistry = None
     current_port: SK_Port = None
     last_connected_port = None
     auto_reconnect_port = None
     settings_saved = True
     save_delay = 2000  ## Time in ms to wait before saving settings
-    current_settings = {"last_opened_script": None, "user_expressions": {}, "key_commands": {}, "aliases": {}}
+    current_settings = {"last_opened_script": None, "user_expressions": {}, "key_commands": {}, "aliases": {}, "serial_read_mode": READ_MODE_BLOCK, "rx_line_terminator": TERMINATOR_AUTO, "rx_max_line_length": DEFAULT_MAX_LINE_LENGTH, "rx_idle_flush_ms": 0, "rx_coalesce_hz": DEFAULT_COALESCE_HZ, "rx_coalesce_bytes": DEFAULT_COALESCE_BYTES, "rx_queue_bytes": DEFAULT_QUEUE_BYTES, "rx_queue_policy": QUEUE_DROP_OLDEST, "tx_queue_bytes": DEFAULT_TX_QUEUE_BYTES, "tx_byte_delay_ms": 0, "tx_line_delay_ms": 0, "gui_stall_ms": DEFAULT_STALL_MS, "terminal_frame_hz": DEFAULT_FRAME_HZ, "terminal_frame_ms": DEFAULT_FRAME_MS, "terminal_compress": True, "terminal_spill_codec": "zlib", "terminal_cr": CR_NEWLINE}
 
     script_thread: QThread = None
     script_worker: ScriptWorker = None
 
-    serial_worker: SerialWorker = None
-    serial_thread: QThread = None
+    session: SerialSession = None  ## Session shown in the terminal
+    sessions: dict[str, SerialSession] = None  ## Every open session by port Device
+    plot_session: SerialSession = None  ## Session feeding the plot, None follows self.session
+    engine: AsyncEngine = None  ## Shared reader loop when started with --engine asyncio
+    replay_worker: ReplayWorker = None
+    replay_thread: QThread = None
+    rescan_worker: RescanWorker = None
+    reconnector: Reconnector = None
+    port_configs: dict[str, PortConfig] = None  ## Last good line settings by port Device, for reconnecting
+    trace_batch = False  ## The batch going through receive_lines is sampled for tracing
 
     extension_worker: SK_Extension = None
     extension_thread: QThread = None
@@ -79,12 +103,26 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
 
     key_popup: KeyPopup = None
 
-    def __init__(self, *args, open_commands=[], **kwargs):
+    def __init__(self, *args, open_commands=[], engine=ENGINE_THREAD, **kwargs):
         super().__init__(*args, **kwargs)
         self.setupUi(self)
         setComboBox_items(self.comboBox_baud, serial.Serial.BAUDRATES)
         setComboBox_items(self.comboBox_parity, PARITIES)
         self.save_timer = QtCore.QTimer()
+        self.status_timer = QtCore.QTimer()  ## Refreshes the RX queue counters while connected
+        self.status_timer.timeout.connect(self.update_status_bar)
+        self.watchdog = StallWatchdog()
+        self.watchdog.stalled.connect(self.update_status_bar)
+        self.sessions = {}
+        self.ports = PortRegistry()
+        self.port_configs = {}
+        if engine == ENGINE_ASYNCIO:
+            try:
+                self.engine = AsyncEngine()
+                self.engine.start()
+            except Exception as e:
+                eprint(f"Could not start the asyncio engine, using one thread per port: {e}")
+                self.engine = None
         self.last_save_time = time.perf_counter()
         self.setWindowTitle("Serial Killer")
         self.determine_log_open_options()
@@ -119,6 +157,18 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
                 ],
             ),
             Command("dcon", self.serial_disconnect, []),
+            Command(
+                "session",
+                self.session_command,
+                [
+                    Option(("-b", "--baud")),
+                    Option(("-p", "--parity")),
+                    Option(("-r", "--rtscts")),
+                    Option(("-x", "--xonxoff")),
+                    Option(("-d", "--dsrdtr")),
+                    Option(("-h", "--help")),
+                ],
+            ),
             Command(
                 "settings",
                 self.settings_command,
@@ -166,6 +216,24 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
                     Option(("--time-fmt",)),
                 ],
             ),
+            Command(
+                "capture",
+                self.capture_command,
+                [
+                    Option(("-h", "--help")),
+                    Option(("-p", "--port")),
+                    Option(("--from",), type=float),
+                    Option(("-ls", "--list")),
+                ],
+            ),
+            Command(
+                "replay",
+                self.replay_command,
+                [
+                    Option(("-h", "--help")),
+                    Option(("-s", "--speed")),
+                ],
+            ),
             Command(
                 "script",
                 self.script_command,
@@ -190,6 +258,10 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             ),
             Command("sk-set", self.sk_set, []),
             Command("sk-info", self.sk_info, []),
+            Command("sk-stats", self.sk_stats, [Option(("-h", "--help")), Option(("-j", "--json"))]),
+            Command("sk-watchdog", self.sk_watchdog, [Option(("-h", "--help"))]),
+            Command("sk-profile", self.sk_profile, [Option(("-h", "--help")), Option(("-s", "--sampling"), type=float)]),
+            Command("sk-trace", self.sk_trace, [Option(("-h", "--help")), Option(("-s", "--sample"), type=int)]),
             Command("sk-open", 
                     self.sk_open, 
                     [Option(("-h", "--help")), 
@@ -238,7 +310,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         if self.current_settings["last_opened_script"]:
             self.open_script(self.current_settings["last_opened_script"])
         self.start_rescan_worker()
-        self.update_ports(get_ports())
+        self.update_ports(*self.ports.diff(get_ports(self.port_aliases)))
         self.script_highlighter = ScriptSyntaxHighlighter(self.textEdit_script)
 
         self.update_status_bar()
@@ -336,6 +408,8 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         self.lineEdit_rescan_interval.textChanged.connect(self.auto_rescan_interval_changed)
         self.lineEdit_max_lines.setValidator(QtGui.QIntValidator(0, 2147483647))
         self.lineEdit_max_lines.textChanged.connect(self.max_lines_edited)
+        self.lineEdit_spill_mb.setValidator(QtGui.QIntValidator(0, 1048576))
+        self.lineEdit_spill_mb.textChanged.connect(self.max_lines_edited)
         
 
         self.terminal.typed.connect(self.terminal_typed)
@@ -416,6 +490,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
 
     def clear_terminal(self):
         self.set_debug_text("")
+        self.terminal.discard()
         self.terminal.clear()
 
     def auto_rescan_interval_changed(self, interval: str):
@@ -564,23 +639,50 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         # self.lineEdit_send.clear()
         # self.terminal_add_text(self.lineEdit_prepend_tx.text() + text, type=TYPE_TX)
 
-    def receive_lines(self, lines: list[str]):
+    def serial_drain(self, session: SerialSession):
+        """Hand every batch a session has queued to the terminal (if shown) and the line consumers"""
+        start_t = time.perf_counter_ns()
+        shown = session is self.session
+        for raw, lines, display, raw_stamp, stamps in session.drain():
+            traced = TRACER.sampled(raw_stamp)
+            if traced:
+                TRACER.interval("rx.to_gui", raw_stamp[0], time.perf_counter_ns(), port=str(session.port))
+            if raw and shown:
+                with TRACER.span("terminal.put_chars", traced, bytes=len(raw)):
+                    self.terminal.put_chars(raw)
+            if lines:
+                self.trace_batch = traced
+                with TRACER.span("receive_lines", traced, lines=len(lines)):
+                    self.receive_lines(lines, session, plot=display, stamps=stamps)
+                self.trace_batch = False
+        DRAIN_NS.record(time.perf_counter_ns() - start_t)
+
+    def receive_lines(self, lines: list[str], session: SerialSession = None, plot: bool = True, stamps: list[Stamp] = None):
+        """stamps: read time of each line, from SerialWorker. None means now."""
         # return
         if (DEBUG_LEVEL & 0xF) >= DEBUG_LEVEL_VERBOSE:
             vprint(f"recieve_lines: {lines}", color="blue")
-        if self.extension_active:
+        session = session or self.session
+        if self.extension_active and session is self.session:
             try:
-                self.extension_worker._receive_lines(lines)
+                with TRACER.span("ext.receive_lines", self.trace_batch):
+                    self.extension_worker._receive_lines(lines, stamps)
             except Exception as e:
                 self.terminal_add_text(f"Error in extension receive_lines: {e}", type=TYPE_ERROR)
-        for line in lines:
-            self.receive_line(line)
-
-    def receive_line(self, line: str):
-        if self.plot.type is not None:
-            self.plot.update(line)
-        if self.checkBox_log_rx.isChecked():
-            self.logger.write_line(line)
+        plot = plot and session is self.plot_source()
+        logger = session.logger if session is not None and session.logger is not None else self.logger
+        if stamps is None:
+            stamps = [None] * len(lines)
+        for line, stamp in zip(lines, stamps):
+            self.receive_line(line, plot, logger, stamp)
+
+    def receive_line(self, line: str, plot: bool = True, logger: SK_Logger = None, stamp: Stamp = None):
+        if plot and self.plot.type is not None:
+            with TRACER.span("plot.update", self.trace_batch):
+                self.plot.update(line, stamp=stamp)
+        if logger is not None and self.checkBox_log_rx.isChecked():
+            with TRACER.span("log.write_line", self.trace_batch):
+                logger.write_line(line, stamp)
 
     def set_debug_text(self, *args, color: QColor = None):
         text = " ".join(args)
@@ -594,10 +696,13 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
 
     def update_status_bar(self):
         text = "Port: "
-        if ser.is_open:
-            text += ser.port
+        if self.is_connected():
+            text += self.session.ser.port
         else:
             text += "None"
+        background = len(self.sessions) - self.is_connected()
+        if background:
+            text += f" (+{background})"
 
         text += f' | Auto: {self.auto_reconnect_port} | Saved: {"Y" if self.settings_saved else "N"}'
         text += f' | Script: {"Y" if self.script_worker and self.script_worker.active else "N"}'
@@ -605,6 +710,9 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         if self.logger is not None:
             text += f' | Log: {"Y" if self.logger.active else "N"}'
         text += f' | Ext: {"Y" if self.extension_active else "N"}'
+        text += f" | {self.watchdog.summary()}"
+        if self.is_connected():
+            text += f" | {self.session.worker.queue.summary()} | {self.session.writer.summary()}"
 
         self.label_status_bar.setText(text)
         #self.statusBar().showMessage(text)
@@ -628,6 +736,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
     def incoming_fmt_changed(self, fmt: str):
         vprint(f"incoming_fmt_changed: {fmt}")
         self.incoming_fmt = fmt
+        self.terminal.flush()  ## Data already received is shown in the old format
         self.terminal.format = fmt
 
 
@@ -653,33 +762,42 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         else:
             vprint(f"set max terminal lines: {lines}")
             self.terminal.setMaximumBlockCount(lines)
+        self.spill_set()
         self.pushButton_set_max_lines.setStyleSheet(STYLESHEET_BUTTON_DEFAULT)
 
+    def spill_set(self):
+        spill_mb = int(self.lineEdit_spill_mb.text() or "0")
+        codec = self.current_settings["terminal_spill_codec"]
+        if codec not in SPILL_CODECS:
+            self.terminal_add_text(f"Unknown spill codec {codec}, use one of {', '.join(SPILL_CODECS)}", type=TYPE_ERROR)
+            codec = SPILL_CODECS[0]
+        vprint(f"set terminal spill: {spill_mb} MB {codec}" if spill_mb else "set terminal spill: off")
+        self.terminal.set_spill(spill_mb, codec)
+
     def autoreconnect_clicked(self, state):
         if state:
-            if ser.is_open:
+            if self.is_connected():
                 print(self.ports)
-                for port in self.ports:
-                    if port == ser.port:
-                        self.auto_reconnect_port = port.__dict__[self.comboBox_auto_reconnect_on.currentText()]
-                        break
+                port = find_serial_port(self.session.ser.port, self.ports)
+                if port is not None:
+                    self.auto_reconnect_port = port.__dict__[self.comboBox_auto_reconnect_on.currentText()]
         else:
             self.auto_reconnect_port = None
+            self.cancel_reconnect()
         self.update_status_bar()
 
     def connect_clicked(self):
-        vprint("connect_clicked", ser.is_open)
-        if ser.is_open:
+        vprint("connect_clicked", self.is_connected())
+        if self.is_connected():
             self.serial_disconnect()
         else:
             self.serial_connect()
 
     def terminal_evaluate_escape_sequence(self, sequence: str):
         self.terminal.evaluate_escape_sequence(sequence)
-        if self.serial_worker is not None:
-            self.serial_worker.main_busy = False
 
     def terminal_add_text(self, text: str, type: int = TYPE_RX):
+        self.terminal.flush(to_end=True)  ## Received data first
         if not self.checkBox_auto_scroll.isChecked():
             prev_bar_position = self.terminal.verticalScrollBar().value()
         self.terminal.moveCursor(QtGui.QTextCursor.MoveOperation.End)
@@ -723,9 +841,6 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         else:
             self.terminal.ensureCursorVisible()
 
-        if self.serial_worker is not None:
-            self.serial_worker.main_busy = False
-
     def terminal_add_bytes(self, bytes: bytes):
         self.terminal.put_chars(bytes)
 
@@ -739,16 +854,50 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             self.terminal_add_text(CONNECT_HELP, TYPE_INFO)
             return
 
-        if ser.is_open:
+        if self.is_connected():
             if args or kwargs:
                 self.serial_disconnect()
             else:
                 self.set_debug_text("Already Connected", color=COLOR_LIGHT_YELLOW)
                 return
-        if ser.is_open:
+        if self.is_connected():
             self.set_debug_text("Cannot Disconnect!", color=COLOR_RED)
             return
 
+        config = self.parse_connect_args(*args, **kwargs)
+        if config is None:
+            return
+        port, baud, parity, rtscts, xonxoff, dsrdtr = config
+
+        if port.Device in self.sessions:
+            self.set_debug_text(f"{port} is already open in the background, use 'session show {port}'", color=COLOR_LIGHT_YELLOW)
+            return
+        self.cancel_reconnect()
+
+        dprint(f"Connecting to {port}", color="yellow")
+
+        self.last_connected_port = port.Device
+        self.current_port = port
+        self.logger.set_serial_port(self.current_port)
+
+        session = self.serial_open_session(port, baud, parity, rtscts, xonxoff, dsrdtr, None)
+        if session is None:
+            self.set_debug_text(f"Failed to connect to {port}", color=COLOR_RED)
+            return
+
+        dprint("Connected!", color="green")
+        self.port_configs[port.Device] = PortConfig(*config)
+        self.terminal_add_text(f"Connected to {port} at {baud} baud", type=TYPE_INFO_GREEN)
+        # self.terminal.add_text(f"Connected to {port} at {baud} baud\n", color = COLOR_GREEN)
+
+        if self.checkBox_auto_reconnect.isChecked():
+            self.auto_reconnect_port = port.__dict__[self.comboBox_auto_reconnect_on.currentText()]
+
+        self.comboBox_port.setCurrentText(str(port))
+        self.session_show(session)
+
+    def parse_connect_args(self, *args, **kwargs) -> tuple | None:
+        """Port and line settings for 'con' and 'session open'. GUI values fill in anything not given."""
         port: SK_Port = None
         baud = None
         parity = None
@@ -756,11 +905,14 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         xonxoff = None
         dsrdtr = None
         for index, arg in enumerate(args):
-            if index == 0:
+            if index == 0 and is_transport_url(arg):
+                scheme, address = arg.split("://", 1)
+                port = SK_Port(Name=address or scheme, Device=arg, Descr=scheme)
+            elif index == 0:
                 port = find_serial_port(arg, self.ports)
                 if port is None:
                     self.set_debug_text(f"Port '{arg}' not found", color=COLOR_RED)
-                    return
+                    return None
 
             elif index == 1:
                 kwargs["-b"] = arg
@@ -770,12 +922,12 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             port = find_serial_port(self.comboBox_port.currentText(), self.ports)
             if port == None:
                 self.set_debug_text("Invalid Port", color=COLOR_RED)
-                return
+                return None
 
         if "-b" in kwargs:
             if kwargs["-b"] not in getComboBox_items(self.comboBox_baud):
                 self.terminal_add_text(f"Invalid Baud Rate: {kwargs['-b']}", type=TYPE_ERROR)
-                return
+                return None
             self.comboBox_baud.setCurrentText(kwargs["-b"])
             baud = int(kwargs["-b"])
         else:
@@ -784,7 +936,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         if "-p" in kwargs:
             if kwargs["-p"] not in PARITIES:
                 self.set_debug_text(f"Invalid Parity: {kwargs['-p']}", color=COLOR_RED)
-                return
+                return None
             parity = PARITIES[kwargs["-p"]]
         else:
             parity = PARITIES[self.comboBox_parity.currentText()]
@@ -807,89 +959,42 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         else:
             dsrdtr = self.checkBox_dsrdtr.isChecked()
 
-        dprint(f"Connecting to {port}", color="yellow")
-
-        ser.rtscts = rtscts
-        ser.xonxoff = xonxoff
-        ser.dsrdtr = dsrdtr
-        ser.baudrate = baud
-        ser.parity = parity
-        ser.port = port.Device
-
-        self.last_connected_port = port.Device
-        self.current_port = port
-
-        ser.close()
-        ser.open()
-        ser.set_low_latency_mode(True)
-
-        if not ser.is_open:
-            self.set_debug_text(f"Failed to connect to {port}", color=COLOR_RED)
-            return
-
-        dprint("Connected!", color="green")
-        self.set_debug_text(f"Connected to {port}", color=COLOR_GREEN)
-        self.terminal_add_text(f"Connected to {port} at {baud} baud", type=TYPE_INFO_GREEN)
-        # self.terminal.add_text(f"Connected to {port} at {baud} baud\n", color = COLOR_GREEN)
+        return port, baud, parity, rtscts, xonxoff, dsrdtr
 
-        if self.checkBox_auto_reconnect.isChecked():
-            self.auto_reconnect_port = port.__dict__[self.comboBox_auto_reconnect_on.currentText()]
-
-        ## UI CHANGES
-        self.terminal.set_background_color(COLOR_BLACK)
-        self.pushButton_connect.setStyleSheet(STYLESHEET_BUTTON_ACTIVE)
-        self.pushButton_connect.setText("Disconnect")
-        self.comboBox_baud.setEnabled(True)
-        self.comboBox_parity.setEnabled(True)
-        self.checkBox_rtscts.setEnabled(True)
-        self.checkBox_xonxoff.setEnabled(True)
-        self.checkBox_dsrdtr.setEnabled(True)
-        self.pushButton_send.setStyleSheet(STYLESHEET_BUTTON_GREEN)
-
-        self.comboBox_port.setCurrentText(str(port))
-        self.logger.set_serial_port(self.current_port)
-
-        ## START SERIAL WORKER
-        self.serial_thread = QThread()
-        self.serial_worker = SerialWorker()
-        self.serial_worker.moveToThread(self.serial_thread)
-        self.serial_thread.started.connect(self.serial_worker.run)
-        # self.serial_worker.line.connect(self.recieve_line)
-        # self.serial_worker.escape_sequence.connect(self.terminal.evaluate_escape_sequence)
-        # self.serial_worker.text.connect(self.terminal_add_text)
-        self.serial_worker.lines.connect(self.receive_lines)
-        self.serial_worker.raw.connect(self.terminal.put_chars)
-        self.serial_worker.error.connect(self.serial_error)
-        # self.serial_worker.output.connect(self.terminal_add_text)
-        # self.serial_worker.raw.connect(self.terminal.put_chars)
-        self.serial_thread.start(QThread.Priority.HighPriority)
-        self.serial_worker.main_busy = False
-
-        if self.extension_active:
-            try:
-                self.extension_worker._serial_connected(self.current_port)
-            except Exception as e:
-                self.terminal_add_text(f"Error in extension serial_connected: {e}", type=TYPE_ERROR)
-
-        self.update_status_bar()
+    def serial_open_session(self, port: SK_Port, baud: int, parity: str, rtscts: bool, xonxoff: bool, dsrdtr: bool, logger: SK_Logger, ser: serial.Serial = None, early: list = None) -> SerialSession | None:
+        """Open a port in a new session. logger=None logs to the main log (self.logger). ser and early come from a Reconnector"""
+        session = SerialSession(port, self.current_settings, logger, self.engine, ser=ser)
+        if not session.open(baud, parity, rtscts, xonxoff, dsrdtr, early=early):
+            return None
+        session.ready.connect(self.serial_drain)
+        session.error.connect(self.serial_error)
+        if getattr(session.ser, "slave_path", None):
+            self.terminal_add_text(f"{port}: simulator side is {session.ser.slave_path}", type=TYPE_INFO)
+        self.sessions[port.Device] = session
+        if not self.status_timer.isActive():
+            self.status_timer.start(STATUS_BAR_INTERVAL)
+        return session
+
+    def is_connected(self) -> bool:
+        """True if the session shown in the terminal is open"""
+        return self.session is not None and self.session.is_open
 
     def serial_send(self, text: str | bytes):
-        if not ser.is_open:
+        if not self.is_connected():
             self.set_debug_text("Warning: Not Connected", color=COLOR_LIGHT_YELLOW)
             return
         try:
-            ser.flush()
-            if isinstance(text, bytes):
-                ser.write(text)
-            else:
-                ser.write(text.encode("utf-8"))
+            if not isinstance(text, bytes):
+                text = text.encode("utf-8")
+            if not self.session.send(text):
+                self.terminal_add_text(f"Error in serial_send: TX queue full, {len(text)} bytes dropped", type=TYPE_ERROR)
         except Exception as e:
             self.terminal_add_text(f"Error in serial_send: {e} Text: {text}", type=TYPE_ERROR)
             # eprint(f"Error in serial_send: {e} Text: {text}", color = "red")
 
     def serial_disconnect(self, *args, intentional=True, **kwargs):
         dprint("serial_disconnect. intentional = ", intentional, color="yellow")
-        if not ser.is_open:
+        if not self.is_connected():
             if intentional:
                 self.set_debug_text("Already Disconnected", color=COLOR_LIGHT_YELLOW)
             return
@@ -899,51 +1004,195 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             # self.terminal_add_text("Auto Reconnect Disabled", type = TYPE_INFO)
             pass
 
-        self.serial_worker.stop()
-        time.sleep(0.02)
-        self.serial_thread.exit()
-
-        ser.cancel_read()
-        ser.cancel_write()
-        time.sleep(0.01)
-        ser.close()
+        lost_ns = time.perf_counter_ns()
+        port = self.session.port
+        self.serial_close_session(self.session)
+        if not intentional:
+            self.start_reconnect(port, lost_ns)
 
         ## UI CHANGES
-        self.terminal.set_background_color(COLOR_DARK_GREY)
         self.set_debug_text("Disconnected", color=COLOR_LIGHT_YELLOW)
         self.terminal_add_text("Disconnected", type=TYPE_INFO)
-        self.pushButton_connect.setStyleSheet(STYLESHEET_BUTTON_INACTIVE)
-        self.pushButton_connect.setText("Connect")
-        self.comboBox_baud.setEnabled(True)
-        self.comboBox_parity.setEnabled(True)
-        self.checkBox_rtscts.setEnabled(True)
-        self.checkBox_xonxoff.setEnabled(True)
-        self.checkBox_dsrdtr.setEnabled(True)
-        self.pushButton_send.setStyleSheet(STYLESHEET_BUTTON_DEFAULT)
-        if self.extension_active:
-            try:
-                self.extension_worker._serial_disconnected()
-            except Exception as e:
-                self.terminal_add_text(f"Error in extension serial_disconnected: {e}", type=TYPE_ERROR)
-
-        self.current_port = None
-
+        self.session_show(None)
         self.logger.set_serial_port(self.current_port)
 
-        self.update_status_bar()
-
-        self.serial_worker = None
-        self.serial_thread = None
+    def start_reconnect(self, port: SK_Port, lost_ns: int):
+        """Reopen a lost port in the background with its last settings, if auto reconnect is on"""
+        config = self.port_configs.get(port.Device)
+        if config is None or is_transport_url(port.Device) or not self.checkBox_auto_reconnect.isChecked() or not self.auto_reconnect_port:
+            return
+        self.cancel_reconnect()
+        self.reconnector = Reconnector(config, self.auto_reconnect_port, self.port_aliases, lost_ns)
+        self.reconnector.reopened.connect(self.reconnect_done)
+        self.reconnector.start()
+        self.terminal_add_text(f"Lost {port}, reconnecting", type=TYPE_INFO)
+
+    def cancel_reconnect(self):
+        if self.reconnector is not None:
+            self.reconnector.cancel()
+            self.reconnector = None
+
+    def reconnect_done(self):
+        reconnector = self.reconnector
+        if reconnector is None or self.sender() is not reconnector:
+            return  ## Cancelled, its thread closes the port
+        self.reconnector = None
+        ser, early = reconnector.handoff()
+        port, config = reconnector.port, reconnector.config
+        if self.is_connected() or port.Device in self.sessions:
+            ser.close()
+            return
+        session = self.serial_open_session(port, config.baud, config.parity, config.rtscts, config.xonxoff, config.dsrdtr, None, ser=ser, early=early)
+        if session is None:
+            self.set_debug_text(f"Failed to reconnect to {port}", color=COLOR_RED)
+            return
+        self.last_connected_port = port.Device
+        self.current_port = port
+        self.logger.set_serial_port(self.current_port)
+        self.port_configs[port.Device] = PortConfig(port, config.baud, config.parity, config.rtscts, config.xonxoff, config.dsrdtr)
+        outage_ms = (time.perf_counter_ns() - reconnector.lost_ns) / 1e6
+        self.terminal_add_text(f"Reconnected to {port} at {config.baud} baud after {outage_ms:.0f} ms ({reconnector.attempts} attempts, {reconnector.early_bytes} bytes read while reconnecting)", type=TYPE_INFO_GREEN)
+        self.comboBox_port.setCurrentText(str(port))
+        self.session_show(session)
+        self.serial_drain(session)
 
+    def serial_close_session(self, session: SerialSession):
         ## STOP SERIAL WORKER
+        session.close()
+        self.sessions.pop(session.port.Device, None)
+        if session.logger is not None:
+            session.logger.stop()
+        if self.plot_session is session:
+            self.plot_session = None
+        if not self.sessions:
+            self.status_timer.stop()
+        self.update_status_bar()
 
-    def serial_error(self, error: str = None):
+    def serial_error(self, session: SerialSession, error: str = None):
         if error is None:
             error = "Serial Error"
+        if session is not self.session:
+            self.terminal_add_text(f"{session}: {error}", type=TYPE_ERROR)
+            self.serial_close_session(session)
+            return
         self.set_debug_text(error, color=COLOR_RED)
         self.terminal_add_text(error, type=TYPE_ERROR)
         self.serial_disconnect(intentional=False)
 
+    ############################################################
+    ################### SESSION FUNCTIONS ######################
+    ############################################################
+
+    def session_command(self, *args, **kwargs):
+        vprint("session_command", args, kwargs)
+        if "-h" in kwargs:
+            self.terminal_add_text(SESSION_HELP, type=TYPE_INFO)
+            return
+
+        if not args or args[0] in ("ls", "-ls"):
+            if not self.sessions:
+                self.terminal_add_text("No open sessions", type=TYPE_INFO)
+                return
+            text = ""
+            for session in self.sessions.values():
+                text += "* " if session is self.session else "  "
+                text += session.summary()
+                text += " [plot]\n" if session is self.plot_source() else "\n"
+            self.terminal_add_text(text.rstrip(), type=TYPE_INFO)
+            return
+
+        command, args = args[0], args[1:]
+        if command == "open":
+            config = self.parse_connect_args(*args, **kwargs)
+            if config is None:
+                return
+            port = config[0]
+            if port.Device in self.sessions:
+                self.set_debug_text(f"{port} is already open", color=COLOR_LIGHT_YELLOW)
+                return
+            session = self.serial_open_session(*config, self.session_logger(port))
+            if session is None:
+                self.set_debug_text(f"Failed to connect to {port}", color=COLOR_RED)
+                return
+            self.terminal_add_text(f"Opened session {port} at {config[1]} baud", type=TYPE_INFO_GREEN)
+            if self.session is None:
+                self.session_show(session)
+            return
+
+        session = self.find_session(args[0]) if args else None
+        if command == "plot" and args and args[0] == "auto":
+            self.plot_session = None
+            self.terminal_add_text("Plotting the session shown in the terminal", type=TYPE_INFO)
+        elif session is None:
+            self.set_debug_text(f"No open session '{args[0] if args else ''}'", color=COLOR_RED)
+        elif command == "show":
+            self.terminal_add_text(f"Showing {session}", type=TYPE_INFO)
+            self.session_show(session)
+        elif command == "close":
+            if session is self.session:
+                self.serial_disconnect()
+            else:
+                self.serial_close_session(session)
+                self.terminal_add_text(f"Closed session {session}", type=TYPE_INFO)
+        elif command == "plot":
+            self.plot_session = session
+            self.terminal_add_text(f"Plotting {session}", type=TYPE_INFO)
+        else:
+            self.terminal_add_text(f"Unknown session command '{command}'\n{SESSION_HELP}", type=TYPE_ERROR)
+
+    def find_session(self, name: str) -> SerialSession | None:
+        port = find_serial_port(name, [session.port for session in self.sessions.values()])
+        if port is None:
+            return None
+        return self.sessions.get(port.Device)
+
+    def session_logger(self, port: SK_Port) -> SK_Logger | None:
+        """Logger for a background session: the current log file name with the port name appended"""
+        if self.logger is None or not self.logger.filepath:
+            return None
+        stem, ext = os.path.splitext(self.logger.filepath)
+        name = os.path.basename(str(port.Name))
+        logger = SK_Logger(f"{stem}-{name}{ext}", self.logger.line_fmt, self.logger.time_fmt, port, name=name)
+        logger.set_enabled(self.logger.enabled)
+        return logger
+
+    def plot_source(self) -> SerialSession | None:
+        return self.plot_session if self.plot_session is not None else self.session
+
+    def session_show(self, session: SerialSession | None):
+        """Route a session to the terminal and extensions and update the connection widgets"""
+        previous = self.session
+        self.session = session
+        if session is None:
+            self.current_port = None
+            self.terminal.set_background_color(COLOR_DARK_GREY)
+            self.pushButton_connect.setStyleSheet(STYLESHEET_BUTTON_INACTIVE)
+            self.pushButton_connect.setText("Connect")
+            self.pushButton_send.setStyleSheet(STYLESHEET_BUTTON_DEFAULT)
+        else:
+            self.current_port = session.port
+            self.set_debug_text(f"Connected to {session.port}", color=COLOR_GREEN)
+            self.terminal.set_background_color(COLOR_BLACK)
+            self.pushButton_connect.setStyleSheet(STYLESHEET_BUTTON_ACTIVE)
+            self.pushButton_connect.setText("Disconnect")
+            self.pushButton_send.setStyleSheet(STYLESHEET_BUTTON_GREEN)
+        self.comboBox_baud.setEnabled(True)
+        self.comboBox_parity.setEnabled(True)
+        self.checkBox_rtscts.setEnabled(True)
+        self.checkBox_xonxoff.setEnabled(True)
+        self.checkBox_dsrdtr.setEnabled(True)
+
+        if self.extension_active and previous is not session:
+            try:
+                if previous is not None:
+                    self.extension_worker._serial_disconnected()
+                if session is not None:
+                    self.extension_worker._serial_connected(self.current_port)
+            except Exception as e:
+                self.terminal_add_text(f"Error in extension serial_connected: {e}", type=TYPE_ERROR)
+
+        self.update_status_bar()
+
     ############################################################
     ################### LOGGER FUNCTIONS #######################
     ############################################################
@@ -1013,6 +1262,151 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             self.tabWidget.setCurrentIndex(0)
             return
 
+    def capture_command(self, *args, **kwargs):
+        vprint("capture_command", args, kwargs)
+        if "-h" in kwargs:
+            self.terminal_add_text(CAPTURE_HELP, type=TYPE_INFO)
+            return
+
+        directory = self.lineEdit_log_directory.text() or DEFAULT_LOG_PATH
+        if "-ls" in kwargs:
+            self.terminal_add_text(self.list_files(directory, extensions=CAPTURE_EXT), type=TYPE_INFO)
+            return
+
+        if not args:
+            captures = [session.capture.summary() for session in self.sessions.values() if session.capture is not None]
+            self.terminal_add_text("\n".join(captures) if captures else "No captures running", type=TYPE_INFO)
+            return
+
+        command, args = args[0], args[1:]
+        if command == "info":
+            if not args:
+                self.terminal_add_text(f"capture info needs a file\n{CAPTURE_HELP}", type=TYPE_ERROR)
+                return
+            self.capture_info(self.capture_path(args[0], directory), kwargs.get("--from"))
+            return
+
+        session = self.find_session(kwargs["-p"]) if kwargs.get("-p") else self.session
+        if session is None:
+            self.set_debug_text("Warning: Not Connected", color=COLOR_LIGHT_YELLOW)
+            return
+        if command == "start":
+            name = args[0] if args else datetime.datetime.now().strftime(f"capture-%y-%m-%d-%H%M%S-{os.path.basename(str(session.port.Name))}")
+            capture = session.start_capture(self.capture_path(name, directory))
+            self.terminal_add_text(f"Capturing {session} to {capture.path}", type=TYPE_INFO_GREEN)
+        elif command == "stop":
+            capture = session.stop_capture()
+            self.terminal_add_text(capture.summary() if capture is not None else f"{session} has no capture running", type=TYPE_INFO)
+        else:
+            self.terminal_add_text(f"Unknown capture command '{command}'\n{CAPTURE_HELP}", type=TYPE_ERROR)
+
+    def capture_path(self, name: str, directory: str) -> str:
+        if not name.endswith(CAPTURE_EXT):
+            name += CAPTURE_EXT
+        return name if os.path.dirname(name) else os.path.join(directory, name)
+
+    def capture_info(self, path: str, start_s: float = None, max_records: int = 20):
+        try:
+            reader = CaptureReader(path)
+        except (OSError, ValueError) as e:
+            self.terminal_add_text(f"Error opening capture: {e}", type=TYPE_ERROR)
+            return
+        info = reader.summary()
+        text = f"{path}\n{info['records']} records, RX {info['rx_bytes']} bytes, TX {info['tx_bytes']} bytes, {info['index_entries']} index entries"
+        if info["first_ns"] is not None:
+            first = datetime.datetime.fromtimestamp(info["first_ns"] / 1e9)
+            text += f"\n{first.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]} + {(info['last_ns'] - info['first_ns']) / 1e9:.3f}s"
+        if start_s is not None and info["first_ns"] is not None:
+            for index, (direction, t_ns, payload, offset) in enumerate(reader.read_from(info["first_ns"] + int(start_s * 1e9))):
+                if index == max_records:
+                    text += "\n..."
+                    break
+                text += f"\n{(t_ns - info['first_ns']) / 1e9:10.6f} {DIR_NAMES.get(direction, '??')} {bytes(payload)!r}"
+        reader.close()
+        self.terminal_add_text(text, type=TYPE_INFO)
+
+    def replay_command(self, *args, **kwargs):
+        vprint("replay_command", args, kwargs)
+        if "-h" in kwargs:
+            self.terminal_add_text(REPLAY_HELP, type=TYPE_INFO)
+            return
+        if not args:
+            if self.replay_worker is None:
+                self.terminal_add_text("No replay running", type=TYPE_INFO)
+            else:
+                self.terminal_add_text(f"Replaying {self.replay_worker.path}: {self.replay_worker.coalesce_summary()}", type=TYPE_INFO)
+            return
+        if args[0] == "stop":
+            if self.replay_worker is not None:
+                self.replay_worker.stop()
+            return
+        if self.replay_worker is not None:
+            self.set_debug_text("A replay is already running, use 'replay stop'", color=COLOR_LIGHT_YELLOW)
+            return
+
+        path = args[0]
+        directory = self.lineEdit_log_directory.text() or DEFAULT_LOG_PATH
+        if not os.path.isfile(path):
+            path = next((p for p in (os.path.join(directory, path), self.capture_path(path, directory)) if os.path.isfile(p)), path)
+        if not os.path.isfile(path):
+            self.terminal_add_text(f"Replay file not found: {args[0]}", type=TYPE_ERROR)
+            return
+        if self.logger is not None and self.logger.filepath and os.path.abspath(path) == os.path.abspath(self.logger.filepath):
+            self.terminal_add_text("Cannot replay the log that is being written, save a copy with 'log -s' first", type=TYPE_ERROR)
+            return
+        speed = kwargs.get("-s") or "1"
+        try:
+            speed = 0.0 if speed == "max" else float(speed.rstrip("xX"))
+        except ValueError:
+            self.terminal_add_text(f"Invalid replay speed '{speed}'\n{REPLAY_HELP}", type=TYPE_ERROR)
+            return
+
+        self.replay_worker = ReplayWorker(
+            path,
+            speed=speed,
+            line_fmt=replace_control_chars(self.lineEdit_log_line_format.text() or DEFAULT_LOG_FORMAT),
+            time_fmt=self.lineEdit_log_time_format.text() or DEFAULT_TIME_FORMAT,
+            terminator=self.current_settings["rx_line_terminator"],
+            max_line_length=self.current_settings["rx_max_line_length"],
+            coalesce_hz=self.current_settings["rx_coalesce_hz"],
+            coalesce_bytes=self.current_settings["rx_coalesce_bytes"],
+            queue_bytes=self.current_settings["rx_queue_bytes"],
+        )
+        self.replay_worker.ready.connect(self.replay_drain)
+        self.replay_worker.done.connect(self.replay_done)
+        self.replay_worker.error.connect(lambda error: self.terminal_add_text(f"Replay error: {error}", type=TYPE_ERROR))
+        self.replay_thread = QThread()
+        self.replay_worker.moveToThread(self.replay_thread)
+        self.replay_thread.started.connect(self.replay_worker.run)
+        self.replay_thread.start()
+        self.terminal_add_text(f"Replaying {path} at {f'{speed:g}x' if speed else 'max'} speed", type=TYPE_INFO_GREEN)
+
+    def replay_drain(self):
+        """Hand replayed batches to the terminal and the line consumers, timing each stage"""
+        worker = self.replay_worker
+        if worker is None:
+            return
+        for raw, lines, display, raw_stamp, stamps in worker.queue.drain():
+            start_t = time.perf_counter()
+            if raw:
+                self.terminal.put_chars(raw)
+            terminal_t = time.perf_counter()
+            if lines:
+                self.receive_lines(lines, self.session, plot=display, stamps=stamps)
+            worker.add_stage_time("terminal", terminal_t - start_t, len(raw), len(lines))
+            worker.add_stage_time("lines", time.perf_counter() - terminal_t, sum(map(len, lines)), len(lines))
+        start_t = time.perf_counter()
+        self.terminal.flush()  ## Drawn here rather than on the frame timer, so the terminal stage includes it
+        worker.add_stage_time("terminal", time.perf_counter() - start_t, 0, 0)
+
+    def replay_done(self):
+        self.replay_drain()
+        self.terminal_add_text(self.replay_worker.report(), type=TYPE_INFO)
+        self.replay_thread.quit()
+        self.replay_thread.wait(1000)
+        self.replay_worker = None
+        self.replay_thread = None
+
     def get_log_settings(self, filename: str = None):
 
         dir = self.lineEdit_log_directory.text()
@@ -1171,21 +1565,22 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             p_str += f"({index:<3}) {port.Display:<15} {port.Prod}\n"
             if args:
                 p_str += port.info()
+        if args and self.rescan_worker is not None:
+            p_str += self.rescan_worker.summary() + "\n"
         self.set_debug_text(small_str, color=COLOR_LIGHT_YELLOW)
         self.terminal_add_text(p_str.removesuffix("\n"), type=TYPE_INFO)
 
-    def update_ports(self, ports: list[SK_Port]):
-        if not self.ports and not ports:
+    def update_ports(self, added: list[SK_Port], removed: list[SK_Port]):
+        if not added and not removed:
             return
-        vprint(f"Port Changed: {ports}", color="yellow")
+        vprint(f"Port Changed: +{added} -{removed}", color="yellow")
+        for port in removed:
+            self.ports.remove(port)
+        for port in added:
+            self.ports.add(port)
 
-        prev_port_names = [str(x) for x in self.ports]
-        new_port_names = [str(x) for x in ports]
-
-        # print(prev_port_names, new_port_names)
-
-        ports_lost = set(prev_port_names).difference(set(new_port_names))
-        ports_found = set(new_port_names).difference(set(prev_port_names))
+        ports_lost = {str(x) for x in removed}.difference(str(x) for x in added)
+        ports_found = {str(x) for x in added}.difference(str(x) for x in removed)
 
         if ports_lost:
             dprint("LOST PORTS: ", ports_lost)
@@ -1193,16 +1588,14 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         if ports_found:
             dprint("FOUND PORTS: ", ports_found)
             self.set_debug_text(f"Found Ports: {str(ports_found).removeprefix('{').removesuffix('}')}", color=COLOR_GREEN)
-        self.ports = ports
-
-        setComboBox_items(self.comboBox_port, ports)
+        setComboBox_items(self.comboBox_port, self.ports)
 
         if self.last_connected_port:
-            if self.last_connected_port in ports:
+            if self.last_connected_port in self.ports:
                 self.comboBox_port.setCurrentText(self.last_connected_port)
 
-        if (not ser.is_open) and self.checkBox_auto_reconnect.isChecked() and self.auto_reconnect_port:
-            if self.auto_reconnect_port in ports:
+        if (not self.is_connected()) and self.checkBox_auto_reconnect.isChecked() and self.auto_reconnect_port and self.reconnector is None:
+            if self.auto_reconnect_port in self.ports:
                 self.serial_connect(self.auto_reconnect_port)
 
     def start_rescan_worker(self):
@@ -1211,7 +1604,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         self.rescan_worker.aliases = self.port_aliases
         self.rescan_worker.moveToThread(self.rescan_thread)
         self.rescan_thread.started.connect(self.rescan_worker.run)
-        self.rescan_worker.new_ports.connect(self.update_ports)
+        self.rescan_worker.ports_changed.connect(self.update_ports)
         self.rescan_thread.start(QThread.Priority.LowPriority)
 
     ############################################################
@@ -1403,6 +1796,14 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         if not os.path.exists(self.lineEdit_plot_export_directory.text()):
             self.lineEdit_plot_export_directory.setText(DEFAULT_PLOT_EXPORT_PATH)
 
+        self.watchdog.set_stall_ms(self.current_settings["gui_stall_ms"])
+        self.terminal.set_frame_rate(self.current_settings["terminal_frame_hz"], self.current_settings["terminal_frame_ms"])
+        self.terminal.set_compress(self.current_settings["terminal_compress"])
+        if self.current_settings["terminal_cr"] in CR_MODES:
+            self.terminal.set_cr_mode(self.current_settings["terminal_cr"])
+        else:
+            self.terminal_add_text(f"Unknown terminal_cr {self.current_settings['terminal_cr']}, use one of {', '.join(CR_MODES)}", type=TYPE_ERROR)
+        self.spill_set()
         set_table_items(self.tableWidget_keys, self.current_settings["key_commands"])
         set_table_items(self.tableWidget_expressions, self.current_settings["user_expressions"])
         if "aliases" in self.current_settings:
@@ -2257,7 +2658,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         set_table_items(self.tableWidget_port_aliases, self.port_aliases)
         self.current_port.Alias = args[0]
         self.current_port.Settings = settings
-        self.update_ports(get_ports(self.port_aliases))
+        self.update_ports(*self.ports.diff(get_ports(self.port_aliases)))
         self.aliases_edited()
     
     def aliases_edited(self):
@@ -2379,6 +2780,99 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             pstr = GREETINGS_TEXT
         self.terminal_add_text(pstr, type=TYPE_INFO)
 
+    def sk_stats(self, *args, **kwargs):
+        if "-h" in kwargs:
+            self.terminal_add_text(SK_STATS_HELP, type=TYPE_INFO)
+            return
+        if "-j" in kwargs:
+            path = kwargs["-j"] or datetime.datetime.now().strftime("sk-stats-%y-%m-%d-%H%M%S.json")
+            if not os.path.dirname(path):
+                path = os.path.join(self.lineEdit_log_directory.text() or DEFAULT_LOG_PATH, path)
+            METRICS.dump_json(path)
+            self.terminal_add_text(f"Metrics saved to {path}", type=TYPE_INFO)
+            return
+        if args and args[0] == "reset":
+            METRICS.reset()
+            self.terminal_add_text("Metrics reset", type=TYPE_INFO)
+            return
+        self.terminal_add_text(METRICS.report(args[0] if args else ""), type=TYPE_INFO)
+
+    def sk_watchdog(self, *args, **kwargs):
+        if "-h" in kwargs:
+            self.terminal_add_text(SK_WATCHDOG_HELP, type=TYPE_INFO)
+            return
+        if args and args[0] == "clear":
+            self.watchdog.stalls.clear()
+            self.terminal_add_text("Stall reports cleared", type=TYPE_INFO)
+            return
+        if args and args[0] != "stalls":
+            self.terminal_add_text(f"Unknown sk-watchdog command '{args[0]}'\n{SK_WATCHDOG_HELP}", type=TYPE_ERROR)
+            return
+        self.terminal_add_text(self.watchdog.report(stacks=bool(args)), type=TYPE_INFO)
+
+    def sk_profile(self, *args, **kwargs):
+        if "-h" in kwargs:
+            self.terminal_add_text(SK_PROFILE_HELP, type=TYPE_INFO)
+            return
+        if not args:
+            self.terminal_add_text(PROFILER.summary(), type=TYPE_INFO)
+            return
+        command = args[0]
+        path = args[1] if len(args) > 1 else None
+        if path is not None and not os.path.dirname(path):
+            path = os.path.join(self.lineEdit_log_directory.text() or DEFAULT_LOG_PATH, path)
+        if command == "start":
+            if PROFILER.active:
+                self.terminal_add_text(f"Already profiling: {PROFILER.summary()}", type=TYPE_ERROR)
+                return
+            mode = MODE_SAMPLING if "-s" in kwargs else MODE_CPROFILE
+            path = path or os.path.join(self.lineEdit_log_directory.text() or DEFAULT_LOG_PATH, datetime.datetime.now().strftime("sk-profile-%y-%m-%d-%H%M%S") + PROFILE_EXTS[mode])
+            try:
+                PROFILER.start(mode, path, kwargs.get("-s") or SAMPLE_INTERVAL_MS)
+            except RuntimeError as E:
+                self.terminal_add_text(str(E), type=TYPE_ERROR)
+                return
+            self.terminal_add_text(PROFILER.summary(), type=TYPE_INFO_GREEN)
+        elif command == "stop":
+            if not PROFILER.active:
+                self.terminal_add_text("Profiler is off", type=TYPE_INFO)
+                return
+            try:
+                path = PROFILER.stop(path)
+            except RuntimeError as E:
+                self.terminal_add_text(str(E), type=TYPE_ERROR)
+                return
+            self.terminal_add_text(f"Profile saved to {path}\n{profile_report(path)}", type=TYPE_INFO)
+        elif command == "report" and path:
+            self.terminal_add_text(profile_report(path), type=TYPE_INFO)
+        else:
+            self.terminal_add_text(f"Unknown sk-profile command '{' '.join(args)}'\n{SK_PROFILE_HELP}", type=TYPE_ERROR)
+
+    def sk_trace(self, *args, **kwargs):
+        if "-h" in kwargs:
+            self.terminal_add_text(SK_TRACE_HELP, type=TYPE_INFO)
+            return
+        if not args:
+            self.terminal_add_text(TRACER.summary(), type=TYPE_INFO)
+            return
+        command = args[0]
+        path = args[1] if len(args) > 1 else None
+        if path is not None and not os.path.dirname(path):
+            path = os.path.join(self.lineEdit_log_directory.text() or DEFAULT_LOG_PATH, path)
+        if command == "start":
+            path = path or os.path.join(self.lineEdit_log_directory.text() or DEFAULT_LOG_PATH, datetime.datetime.now().strftime("sk-trace-%y-%m-%d-%H%M%S.json"))
+            TRACER.start(path, kwargs.get("-s") or 1)
+            self.terminal_add_text(TRACER.summary(), type=TYPE_INFO_GREEN)
+        elif command == "stop":
+            if not TRACER.active:
+                self.terminal_add_text("Tracing is off", type=TYPE_INFO)
+                return
+            events = len(TRACER.events)
+            path = TRACER.stop(path)
+            self.terminal_add_text(f"Saved {events} trace events to {path}. Open it in ui.perfetto.dev or chrome://tracing", type=TYPE_INFO)
+        else:
+            self.terminal_add_text(f"Unknown sk-trace command '{command}'\n{SK_TRACE_HELP}", type=TYPE_ERROR)
+
     ## Recursively print all children of the main window
     def sk_set(self, *args):
         dprint("sk_set", args)
@@ -2452,6 +2946,18 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         if self.key_popup is not None:
             self.key_popup.reject()
             self.key_popup = None
+        for session in list(self.sessions.values()):
+            session.close()
+        if self.replay_worker is not None:
+            self.replay_worker.stop()
+        if self.engine is not None:
+            self.engine.stop()
+        self.watchdog.stop()
+        self.cancel_reconnect()
+        if self.rescan_worker is not None:
+            self.rescan_worker.stop()
+        if PROFILER.active:
+            PROFILER.stop()
         self.close()
 
     def make_quit(self, *args, **kwargs):
@@ -2526,7 +3032,7 @@ def getComboBox_items(comboBox: QtWidgets.QComboBox) -> list[str]:
     return [comboBox.itemText(i) for i in range(comboBox.count())]
 
 
-def run_app(size_x=700, size_y=700, open_commands=""):
+def run_app(size_x=700, size_y=700, open_commands="", engine=ENGINE_THREAD):
     global app
     app = QtWidgets.QApplication(sys.argv)
     app_icon = QtGui.QIcon()
@@ -2536,7 +3042,7 @@ def run_app(size_x=700, size_y=700, open_commands=""):
     app.setStyle(style)
     if DEBUG_LEVEL > 0:
         cprint(GREETINGS_TEXT, color="green")
-    window = MainWindow(open_commands=open_commands)
+    window = MainWindow(open_commands=open_commands, engine=engine)
     window.setWindowIcon(app_icon)
     window.resize(size_x, size_y)
     window.show()
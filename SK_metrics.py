@@ -0,0 +1,195 @@
+import json
+import time
+import threading
+
+SUB_BUCKET_BITS = 5  ## 32 sub-buckets per power of two, values are kept to about 3%
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HISTOGRAM_BUCKETS = 64 * SUB_BUCKETS  ## Enough for any 63 bit value
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class Counter:
+    """Monotonic count, ie. bytes read. Written by one thread, read by any."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, unit: str = ""):
+        self.name = name
+        self.unit = unit
+        self.value = 0
+
+    def inc(self, n: int = 1):
+        self.value += n
+
+    def reset(self):
+        self.value = 0
+
+    def snapshot(self, elapsed: float) -> dict:
+        return {"value": self.value, "rate": self.value / elapsed if elapsed > 0 else 0.0}
+
+    def describe(self, elapsed: float) -> str:
+        return f"{self.value}{' ' + self.unit if self.unit else ''} ({self.value / elapsed if elapsed > 0 else 0:.1f}/s)"
+
+
+class Gauge:
+    """Last value and peak of a level, ie. queue depth"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, unit: str = ""):
+        self.name = name
+        self.unit = unit
+        self.value = 0
+        self.peak = 0
+
+    def set(self, value: float):
+        self.value = value
+        if value > self.peak:
+            self.peak = value
+
+    def reset(self):
+        self.value = 0
+        self.peak = 0
+
+    def snapshot(self, elapsed: float) -> dict:
+        return {"value": self.value, "peak": self.peak}
+
+    def describe(self, elapsed: float) -> str:
+        return f"{self.value}{' ' + self.unit if self.unit else ''} (peak {self.peak})"
+
+
+class Histogram:
+    """HDR-style log-linear histogram of non-negative integers, ie. durations in ns or read sizes in bytes.
+
+    Values below 2 * SUB_BUCKETS get a bucket each. Above that every power of two is split into
+    SUB_BUCKETS buckets, so record() is a bit_length(), a shift and a list increment.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, unit: str = "ns"):
+        self.name = name
+        self.unit = unit
+        self.counts = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, value: int):
+        value = int(value)
+        if value < 0:
+            value = 0
+        if value < 2 * SUB_BUCKETS:
+            index = value
+        else:
+            shift = value.bit_length() - SUB_BUCKET_BITS - 1
+            index = shift * SUB_BUCKETS + (value >> shift)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if self.min is None or value < self.min:
+            self.min = value
+
+    @staticmethod
+    def bucket_range(index: int) -> tuple[int, int]:
+        """Lowest and highest value counted in bucket index"""
+        if index < 2 * SUB_BUCKETS:
+            return index, index
+        shift = index // SUB_BUCKETS - 1
+        top = index - shift * SUB_BUCKETS
+        return top << shift, ((top + 1) << shift) - 1
+
+    def percentile(self, percent: float) -> int:
+        if not self.count:
+            return 0
+        target = max(1, self.count * percent / 100)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                low, high = self.bucket_range(index)
+                return min((low + high) // 2, self.max)
+        return self.max
+
+    def reset(self):
+        self.counts = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def snapshot(self, elapsed: float) -> dict:
+        result = {"count": self.count, "rate": self.count / elapsed if elapsed > 0 else 0.0, "mean": self.total / self.count if self.count else 0, "min": self.min or 0, "max": self.max}
+        for percent in PERCENTILES:
+            result[f"p{percent:g}"] = self.percentile(percent)
+        return result
+
+    def describe(self, elapsed: float) -> str:
+        if not self.count:
+            return "-"
+        scale, unit = (1000, "us") if self.unit == "ns" else (1, self.unit)
+        p50, p99 = self.percentile(50) / scale, self.percentile(99) / scale
+        return f"n={self.count} ({self.count / elapsed if elapsed > 0 else 0:.1f}/s) p50={p50:.1f} p99={p99:.1f} max={self.max / scale:.1f} {unit}"
+
+
+class MetricsRegistry:
+    """Named counters, gauges and histograms shared by every module. Look metrics up once, at import."""
+
+    def __init__(self):
+        self.metrics: dict[str, Counter | Gauge | Histogram] = {}
+        self.lock = threading.Lock()
+        self.start_t = time.perf_counter()
+
+    def get(self, cls: type, name: str, unit: str):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, unit)
+            elif not isinstance(metric, cls):
+                raise TypeError(f"Metric {name} is a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, unit: str = "") -> Counter:
+        return self.get(Counter, name, unit)
+
+    def gauge(self, name: str, unit: str = "") -> Gauge:
+        return self.get(Gauge, name, unit)
+
+    def histogram(self, name: str, unit: str = "ns") -> Histogram:
+        return self.get(Histogram, name, unit)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start_t
+
+    def reset(self):
+        with self.lock:
+            for metric in self.metrics.values():
+                metric.reset()
+            self.start_t = time.perf_counter()
+
+    def snapshot(self) -> dict:
+        elapsed = self.elapsed()
+        return {
+            "time": time.time(),
+            "elapsed_s": elapsed,
+            "metrics": {name: {"kind": metric.kind, "unit": metric.unit, **metric.snapshot(elapsed)} for name, metric in sorted(self.metrics.items())},
+        }
+
+    def report(self, prefix: str = "") -> str:
+        elapsed = self.elapsed()
+        lines = [f"Metrics over the last {elapsed:.1f}s"]
+        width = max((len(name) for name in self.metrics), default=0)
+        for name, metric in sorted(self.metrics.items()):
+            if name.startswith(prefix):
+                lines.append(f"  {name:<{width}}  {metric.describe(elapsed)}")
+        return "\n".join(lines)
+
+    def dump_json(self, path: str):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.snapshot(), file, indent=2)
+
+
+METRICS = MetricsRegistry()
@@ -1,5 +1,6 @@
 import time 
 from SK_common import * 
+from SK_metrics import METRICS
 import numpy as np 
 import pyqtgraph as pg 
 import pyqtgraph.exporters
@@ -7,6 +8,8 @@ from PyQt6 import QtWidgets, QtCore
 #import pyqtgraph.opengl as gl
 import csv 
 
+UPDATE_NS = METRICS.histogram("plot.update_ns")
+
 class PlotElement:
     key:str = None 
     mult:float = None 
@@ -24,6 +27,7 @@ class PlotWidget(pg.GraphicsLayoutWidget):
     prev_color = 0
     active = False 
     start_timestamp = None 
+    stamp:tuple[int, int] = None  ## (perf_counter_ns, time_ns) of the read that delivered the line being plotted
     limits:list = [None, None]
 
     # plot_3d: gl.GLLinePlotItem = None 
@@ -145,23 +149,38 @@ class PlotWidget(pg.GraphicsLayoutWidget):
     def end(self):
         self.reset()
 
-    def update(self, line:str = "", debug:bool = False):
+    def update(self, line:str = "", debug:bool = False, stamp:tuple[int, int] = None):
         if not line or not self.type or not self.active: 
             return 
+        self.stamp = stamp 
+        start_t = time.perf_counter_ns()
         
         rstr = ""
         tokens = char_split(line, self.separators)
         if debug: 
             rstr += f"Tokens: {tokens}\n"
         if self.type == "Key-Value":
-            return rstr + self.update_key_value(tokens, debug)
-        if self.type == "Index-Value":
-            return rstr + self.update_index_value(tokens, debug)
-        if self.type == "Single-Array":
-            return rstr + self.update_single_array(tokens, debug)
-        if self.type == "Key-Array":
-            return rstr + self.update_key_array(tokens, debug)
+            rstr += self.update_key_value(tokens, debug) or ""
+        elif self.type == "Index-Value":
+            rstr += self.update_index_value(tokens, debug) or ""
+        elif self.type == "Single-Array":
+            rstr += self.update_single_array(tokens, debug) or ""
+        elif self.type == "Key-Array":
+            rstr += self.update_key_array(tokens, debug) or ""
+        UPDATE_NS.record(time.perf_counter_ns() - start_t)
+        return rstr 
         
+    def elapsed(self) -> float:
+        '''Seconds from the first sample to the current one, using the read time stamp if the line has one'''
+        if self.stamp is None: 
+            now, wall = time.perf_counter(), time.time()
+        else: 
+            now, wall = self.stamp[0] / 1e9, self.stamp[1] / 1e9
+        if self.start_time is None: 
+            self.start_time = now 
+            self.start_timestamp = wall 
+        return now - self.start_time 
+
     def export_csv(self, filename:str, rounding:float = 0, include_header:bool = True, time_format:str = "Plot-Start"):
         rounding = rounding / 1000
         dprint(f"[PLOT] Exporting CSV to {filename} with rounding: {rounding} and include_header: {include_header} and time_format: {time_format}", color = "green")
@@ -255,10 +274,7 @@ class PlotWidget(pg.GraphicsLayoutWidget):
                 valid_numbers.append(value)
         if not valid_numbers:
             return "" 
-        now = time.perf_counter()
-        if self.start_time is None: 
-            self.start_time = now 
-        time_elapsed = now - self.start_time 
+        time_elapsed = self.elapsed()
 
         for index, value in enumerate(valid_numbers):
             
@@ -294,11 +310,7 @@ class PlotWidget(pg.GraphicsLayoutWidget):
             value = str_to_float(token)
             if value is not None and prev_key is not None:
                 if time_elapsed is None:
-                    now = time.perf_counter()
-                    if self.start_time is None:
-                        self.start_time = now 
-
-                time_elapsed = now - self.start_time 
+                    time_elapsed = self.elapsed()
                 
                 if prev_key not in self.elements:
                     self.add_line_element(prev_key, prev_mult)
@@ -365,10 +377,7 @@ class PlotWidget(pg.GraphicsLayoutWidget):
                 valid_numbers.append(value)
         if not valid_numbers:
             return "" 
-        now = time.perf_counter()
-        if self.start_time is None: 
-            self.start_time = now 
-        time_elapsed = now - self.start_time 
+        time_elapsed = self.elapsed()
 
         name = len(valid_numbers)
         
@@ -388,10 +397,7 @@ class PlotWidget(pg.GraphicsLayoutWidget):
     def update_key_array(self, tokens:list[str], debug:bool = False):
         prev_key = None 
         prev_mult = 1.00
-        now = time.perf_counter()
-        if self.start_time is None:
-            self.start_time = now 
-        time_elapsed = now - self.start_time 
+        time_elapsed = self.elapsed()
         debug_str = None
         values = []
         for token in tokens: 
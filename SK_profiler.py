@@ -0,0 +1,189 @@
+import io
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+
+SAMPLE_INTERVAL_MS = 5  ## Default time between stack samples
+MODE_CPROFILE = "cprofile"
+MODE_SAMPLING = "sampling"
+PROFILE_EXTS = {MODE_CPROFILE: ".pstats", MODE_SAMPLING: ".folded"}
+TOP_FUNCTIONS = 15  ## Functions listed by summary()
+PROCESS_PROFILE = sys.version_info >= (3, 12)  ## cProfile is built on sys.monitoring: one profile per process, and it sees every thread
+
+
+class Profiler:
+    """Profiles the running application, GUI thread and worker threads.
+
+    cprofile: cProfile on every thread. From Python 3.12 one profile started by the GUI thread covers them all.
+    Before that cProfile can only be switched on from inside a thread, so worker threads call poll() in their
+    loops and join or leave the profile at their next read, script line etc.
+    The profiles are merged into one pstats file (snakeviz, gprof2dot, python -m pstats).
+
+    sampling: a helper thread reads sys._current_frames() every interval_ms and counts the stacks, which are
+    written as collapsed stacks, one "thread;outer;...;inner count" per line (flamegraph.pl, speedscope, inferno).
+    Nothing runs on the profiled threads, so the overhead is low enough to leave it on during soak tests.
+    """
+
+    def __init__(self):
+        self.mode: str = None
+        self.path: str = None
+        self.interval_ms = SAMPLE_INTERVAL_MS
+        self.profiles: dict[str, cProfile.Profile] = {}  ## Thread name -> profile, for cprofile mode
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.gui_ident = threading.get_ident()
+        self.samples = Counter()  ## Collapsed stack -> count, for sampling mode
+        self.sample_count = 0
+        self.code_names = {}  ## Code object -> "function (file:line)"
+        self.wake = threading.Event()
+        self.thread: threading.Thread = None
+        self.start_t = 0.0
+
+    @property
+    def active(self) -> bool:
+        return self.mode is not None
+
+    def start(self, mode: str = MODE_CPROFILE, path: str = None, interval_ms: float = SAMPLE_INTERVAL_MS):
+        """Call from the GUI thread"""
+        if self.active:
+            raise RuntimeError(f"Already profiling ({self.mode})")
+        self.path = path
+        self.interval_ms = max(0.5, interval_ms)
+        self.profiles = {}
+        self.samples = Counter()
+        self.sample_count = 0
+        self.start_t = time.perf_counter()
+        self.gui_ident = threading.get_ident()
+        self.mode = mode
+        if mode == MODE_SAMPLING:
+            self.wake.clear()
+            self.thread = threading.Thread(target=self.sample, name="SK profiler", daemon=True)
+            self.thread.start()
+        elif PROCESS_PROFILE:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as E:  ## Another profiler or debugger holds sys.monitoring
+                self.mode = None
+                raise RuntimeError(f"Cannot start cProfile: {E}")
+            self.profiles["all threads"] = profile
+        else:
+            self.poll()
+
+    def stop(self, path: str = None) -> str:
+        """Stop and write the profile. Call from the GUI thread. Returns the file written."""
+        mode, self.mode = self.mode, None
+        path = path or self.path
+        if mode == MODE_SAMPLING:
+            self.wake.set()
+            self.thread.join()
+            self.thread = None
+            with open(path, "w", encoding="utf-8") as file:
+                for stack, count in self.samples.most_common():
+                    file.write(f"{stack} {count}\n")
+        else:
+            if PROCESS_PROFILE:
+                self.profiles["all threads"].disable()
+            else:
+                self.poll()  ## Worker threads leave at their next poll
+            with self.lock:
+                profiles = list(self.profiles.values())
+            stats = None
+            for profile in profiles:
+                profile.create_stats()
+                if not profile.stats:
+                    continue
+                if stats is None:
+                    stats = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+            if stats is None:
+                raise RuntimeError("Nothing was profiled")
+            stats.dump_stats(path)
+        return path
+
+    def poll(self):
+        """Join or leave the cProfile profile, called by each profiled thread from its own loop. Never raises."""
+        if PROCESS_PROFILE:
+            return
+        profiling = self.mode == MODE_CPROFILE
+        if (getattr(self.local, "profile", None) is not None) == profiling:
+            return
+        if not profiling:
+            sys.setprofile(None)  ## Profile.disable() would be a no-op once stop() has collected the stats
+            self.local.profile = None
+            return
+        profile = self.local.profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  ## Another profiler is active, this thread stays out
+            return
+        name = "GUI" if threading.get_ident() == self.gui_ident else self.thread_name(threading.get_ident(), sys._getframe(1))
+        with self.lock:
+            self.profiles[f"{name} {threading.get_ident()}"] = profile
+
+    def code_name(self, code) -> str:
+        name = self.code_names.get(code)
+        if name is None:
+            name = self.code_names[code] = f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return name
+
+    def thread_name(self, ident: int, frame) -> str:
+        """Python thread name, or the outermost function for QThreads, which Python does not name"""
+        thread = threading._active.get(ident)
+        if thread is not None and not isinstance(thread, threading._DummyThread):
+            return thread.name
+        while frame.f_back is not None:
+            frame = frame.f_back
+        return frame.f_code.co_qualname
+
+    def sample(self):
+        own = threading.get_ident()
+        while not self.wake.wait(self.interval_ms / 1000):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                root = "GUI" if ident == self.gui_ident else self.thread_name(ident, frame)
+                while frame is not None:
+                    stack.append(self.code_name(frame.f_code))
+                    frame = frame.f_back
+                stack.append(root)
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def summary(self) -> str:
+        if not self.active:
+            return "Profiler is off"
+        elapsed = time.perf_counter() - self.start_t
+        if self.mode == MODE_SAMPLING:
+            return f"Sampling every {self.interval_ms:g} ms for {elapsed:.1f}s: {self.sample_count} samples, {len(self.samples)} stacks"
+        if PROCESS_PROFILE:
+            return f"cProfile for {elapsed:.1f}s on all threads"
+        return f"cProfile for {elapsed:.1f}s on {len(self.profiles)} threads: {', '.join(name.rsplit(' ', 1)[0] for name in self.profiles)}"
+
+
+def profile_report(path: str, top: int = TOP_FUNCTIONS) -> str:
+    """The functions with the most time in a profile written by Profiler.stop()"""
+    if path.endswith(PROFILE_EXTS[MODE_SAMPLING]):
+        own = Counter()
+        total = 0
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                stack, count = line.rsplit(" ", 1)
+                own[stack.rsplit(";", 1)[-1]] += int(count)
+                total += int(count)
+        lines = [f"{'samples':>8} {'%':>6}  function (innermost frame)"]
+        for name, count in own.most_common(top):
+            lines.append(f"{count:>8} {count / max(total, 1) * 100:>5.1f}%  {name}")
+        return "\n".join(lines)
+    stream = io.StringIO()
+    pstats.Stats(path, stream=stream).sort_stats("cumulative").print_stats(top)
+    return stream.getvalue().strip()
+
+
+PROFILER = Profiler()
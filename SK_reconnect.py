@@ -0,0 +1,164 @@
+import os
+import time
+import select
+import threading
+import serial
+from dataclasses import dataclass
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from SK_common import *
+from SK_metrics import METRICS
+from SK_serial_worker import SK_Port, PortRegistry, get_ports, find_serial_port
+from SK_hotplug import Inotify, DEV_DIR, BY_ID_DIR, HOTPLUG_MASK
+
+IN_ATTRIB = 0x004  ## udev sets the permissions of a new node after creating it
+BACKOFF_MIN_MS = 5  ## First retry after this, doubling up to BACKOFF_MAX_MS
+BACKOFF_MAX_MS = 500
+EARLY_READ_TIMEOUT = 0.01  ## Seconds per read while holding the reopened port for the GUI
+MAX_EARLY_BYTES = 1 << 20  ## Bytes kept from before the session takes over, the rest is dropped
+
+RECONNECT_NS = METRICS.histogram("reconnect.latency_ns")  ## Device node back -> port open
+OUTAGE_NS = METRICS.histogram("reconnect.outage_ns")  ## Port lost -> port open
+ATTEMPTS = METRICS.counter("reconnect.attempts")
+EARLY_BYTES = METRICS.counter("reconnect.early_bytes", "B")
+
+
+@dataclass
+class PortConfig:
+    """The line settings a port last connected with"""
+
+    port: SK_Port
+    baud: int
+    parity: str
+    rtscts: bool
+    xonxoff: bool
+    dsrdtr: bool
+
+    def open(self, device: str) -> serial.Serial:
+        ser = serial.Serial()
+        ser.port = device
+        ser.baudrate = self.baud
+        ser.parity = self.parity
+        ser.rtscts = self.rtscts
+        ser.xonxoff = self.xonxoff
+        ser.dsrdtr = self.dsrdtr
+        ser.open()
+        try:
+            ser.set_low_latency_mode(True)
+        except (OSError, ValueError, NotImplementedError):
+            pass
+        return ser
+
+
+class Reconnector(QObject):
+    """Reopens a lost port from a helper thread, without waiting for the rescan or the GUI.
+
+    The thread retries with capped exponential backoff and is woken early by inotify when a tty node or
+    by-id link appears or changes permissions. Once open it keeps reading, so a device that resets does not
+    lose its boot output while the GUI builds the new session. The GUI takes the port and the bytes
+    read so far with handoff() when reopened fires.
+    """
+
+    reopened = pyqtSignal()
+
+    def __init__(self, config: PortConfig, key: str, aliases: dict = None, lost_ns: int = None):
+        super().__init__()
+        self.config = config
+        self.key = key  ## Any name of the port (the auto reconnect field), in case it comes back on another node
+        self.aliases = aliases
+        self.lost_ns = lost_ns or time.perf_counter_ns()
+        self.port: SK_Port = None  ## The port as found again
+        self.ser: serial.Serial = None
+        self.early: list[tuple[tuple[int, int], bytes]] = []  ## (read stamp, data) read before handoff()
+        self.early_bytes = 0
+        self.attempts = 0
+        self.active = True
+        self.handing_off = False
+        self.error: str = None
+        self.thread = threading.Thread(target=self.run, name=f"SK reconnect {config.port}", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        inotify = None
+        try:
+            inotify = Inotify()
+            inotify.add_watch(DEV_DIR, HOTPLUG_MASK | IN_ATTRIB)
+            inotify.add_watch(BY_ID_DIR, HOTPLUG_MASK)
+        except OSError:
+            inotify = None
+        try:
+            if self.wait_open(inotify):
+                self.reopened.emit()
+                self.read_early()
+        finally:
+            if inotify is not None:
+                inotify.close()
+            if not self.active and self.ser is not None and not self.handing_off:
+                self.ser.close()  ## Cancelled after the port was reopened
+
+    def wait_open(self, inotify: Inotify) -> bool:
+        backoff = BACKOFF_MIN_MS
+        seen_ns = None  ## When the node was first seen again
+        while self.active:
+            port = self.find_port()
+            if port is not None:
+                seen_ns = seen_ns or time.perf_counter_ns()
+                self.attempts += 1
+                ATTEMPTS.inc()
+                try:
+                    self.ser = self.config.open(port.Device)
+                    self.port = port
+                    now = time.perf_counter_ns()
+                    RECONNECT_NS.record(now - seen_ns)
+                    OUTAGE_NS.record(now - self.lost_ns)
+                    return True
+                except (OSError, serial.SerialException) as e:
+                    self.error = str(e)
+            else:
+                seen_ns = None
+            if inotify is not None:
+                if select.select([inotify.fd], [], [], backoff / 1000)[0]:
+                    inotify.read()
+                    backoff = BACKOFF_MIN_MS
+                    continue
+            else:
+                time.sleep(backoff / 1000)
+            backoff = min(backoff * 2, BACKOFF_MAX_MS)
+        return False
+
+    def find_port(self) -> SK_Port | None:
+        if self.key == self.config.port.Device:
+            return self.config.port if os.path.exists(self.key) else None
+        return find_serial_port(self.key, PortRegistry(get_ports(self.aliases)))
+
+    def read_early(self):
+        self.ser.timeout = EARLY_READ_TIMEOUT
+        while self.active and not self.handing_off:
+            stamp = (time.perf_counter_ns(), time.time_ns())
+            try:
+                data = self.ser.read(max(1, self.ser.in_waiting))
+            except (OSError, serial.SerialException) as e:
+                self.error = str(e)
+                return
+            if data and self.early_bytes < MAX_EARLY_BYTES:
+                self.early.append((stamp, data))
+                self.early_bytes += len(data)
+                EARLY_BYTES.inc(len(data))
+
+    def handoff(self) -> tuple[serial.Serial, list[tuple[tuple[int, int], bytes]]]:
+        """Stop reading and give the open port and the bytes read so far to the caller"""
+        self.handing_off = True
+        self.thread.join()
+        self.ser.timeout = None
+        return self.ser, self.early
+
+    def cancel(self):
+        self.active = False
+
+    def summary(self) -> str:
+        text = f"Reconnecting to {self.key}: {self.attempts} attempts"
+        if self.error:
+            text += f", last error: {self.error}"
+        return text
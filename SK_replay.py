@@ -0,0 +1,181 @@
+import os
+import re
+import time
+import datetime
+import traceback
+from PyQt6.QtCore import pyqtSignal
+
+from SK_common import *
+from SK_serial_worker import SerialWorker, QUEUE_BLOCK, DEFAULT_COALESCE_HZ, DEFAULT_COALESCE_BYTES, DEFAULT_QUEUE_BYTES
+from SK_framing import TERMINATOR_AUTO, DEFAULT_MAX_LINE_LENGTH
+from SK_capture import CaptureReader, CAPTURE_MAGIC, DIR_RX
+from SK_profiler import PROFILER
+
+REPLAY_STAGES = ("source", "framing", "terminal", "lines")  ## lines = extension, plot and log
+
+
+def log_line_pattern(line_fmt: str) -> re.Pattern:
+    """Regex for lines written by SK_Logger with line_fmt, with asctime, msecs and message groups"""
+    pattern = ""
+    position = 0
+    seen = set()
+    for match in re.finditer(r"%\((\w+)\)[-#0 +]*\d*(?:\.\d+)?[sdfr]", line_fmt):
+        pattern += re.escape(line_fmt[position : match.start()])
+        name = match.group(1)
+        if name in seen or name not in ("asctime", "msecs", "message"):
+            pattern += ".*?"
+        elif name == "msecs":
+            pattern += r"(?P<msecs>\d+)"
+        else:
+            pattern += f"(?P<{name}>.*?)"
+        seen.add(name)
+        position = match.end()
+    return re.compile(pattern + re.escape(line_fmt[position:]))
+
+
+def log_records(path: str, line_fmt: str, time_fmt: str):
+    """Yield (time_ns, bytes) per line of an SK_Logger text log. Lines that do not match line_fmt keep the previous time."""
+    pattern = log_line_pattern(line_fmt)
+    day = datetime.datetime.fromtimestamp(os.path.getmtime(path)).date()
+    wrap = datetime.timedelta(hours=12 if "%I" in time_fmt else 24)  ## The log has no date, only a time of day
+    offset = datetime.timedelta()
+    previous = None
+    times = {}  ## asctime -> datetime, strptime is the slowest part of reading a log
+    t_ns = time.time_ns()
+    with open(path, "r", encoding="utf-8", errors="replace", newline="\n") as file:
+        for line in file:
+            line = line.rstrip("\r\n")
+            match = pattern.fullmatch(line)
+            if match is None:
+                yield t_ns, (line + "\n").encode("utf-8")
+                continue
+            try:
+                stamp = times.get(match["asctime"])
+                if stamp is None:
+                    stamp = times[match["asctime"]] = datetime.datetime.combine(day, datetime.datetime.strptime(match["asctime"], time_fmt).time())
+                if match.groupdict().get("msecs"):
+                    stamp += datetime.timedelta(milliseconds=int(match["msecs"]))
+                if previous is not None and stamp + offset < previous:
+                    offset += wrap
+                previous = stamp + offset
+                t_ns = int(previous.timestamp() * 1e9)
+            except (ValueError, TypeError, IndexError):
+                pass
+            yield t_ns, (match["message"] + "\n").encode("utf-8")
+
+
+def capture_records(path: str):
+    """Yield (time_ns, bytes) for every RX record of a capture"""
+    reader = CaptureReader(path)
+    try:
+        for direction, t_ns, payload, offset in reader.records():
+            if direction == DIR_RX:
+                yield t_ns, payload
+    finally:
+        reader.close()
+
+
+def is_capture(path: str) -> bool:
+    with open(path, "rb") as file:
+        return file.read(len(CAPTURE_MAGIC)) == CAPTURE_MAGIC
+
+
+class ReplayWorker(SerialWorker):
+    """Plays a capture or text log through the receive pipeline, as if a device sent it.
+
+    Data goes through the same ring, framer, coalescing and RX queue as SerialWorker, and the lines carry
+    their recorded times as stamps. speed is a multiplier of the recorded timing, 0 replays as fast as possible.
+    The queue always blocks when full, so a slow GUI slows the replay down instead of dropping data.
+    Stamps keep the recorded wall time and put the recorded spacing on the perf_counter_ns clock from the start
+    of the replay, so the plot and the logger line up with live data.
+    """
+
+    done = pyqtSignal()
+    traced = False  ## Stamps follow the recorded timing, not when the data was read
+
+    def __init__(self, path: str, *args, speed: float = 1.0, line_fmt: str = None, time_fmt: str = None, terminator: str = TERMINATOR_AUTO, max_line_length: int = DEFAULT_MAX_LINE_LENGTH, coalesce_hz: int = DEFAULT_COALESCE_HZ, coalesce_bytes: int = DEFAULT_COALESCE_BYTES, queue_bytes: int = DEFAULT_QUEUE_BYTES, **kwargs):
+        super().__init__(None, *args, terminator=terminator, max_line_length=max_line_length, coalesce_hz=coalesce_hz, coalesce_bytes=coalesce_bytes, queue_bytes=queue_bytes, queue_policy=QUEUE_BLOCK, **kwargs)
+        self.path = path
+        self.speed = max(0.0, speed)
+        if is_capture(path):
+            self.source = capture_records(path)
+        else:
+            self.source = log_records(path, line_fmt, time_fmt)
+        self.stages = {stage: {"s": 0.0, "bytes": 0, "lines": 0} for stage in REPLAY_STAGES}
+        self.start_t = time.perf_counter()
+
+    def run(self):
+        self.start_t = start_t = time.perf_counter()
+        start_ns = time.perf_counter_ns()
+        first_ns = None
+        try:
+            while self.active:
+                source_t = time.perf_counter()
+                record = next(self.source, None)
+                self.stages["source"]["s"] += time.perf_counter() - source_t
+                if record is None:
+                    break
+                t_ns, data = record
+                PROFILER.poll()
+                first_ns = t_ns if first_ns is None else first_ns
+                if self.speed:
+                    self.wait_until(start_t + (t_ns - first_ns) / 1e9 / self.speed)
+                self.read_stamp = (start_ns + t_ns - first_ns, t_ns)
+                self.feed(data)
+            line = self.framer.flush()
+            if line:
+                self.pending_lines.append(line)
+                self.pending_stamps.append(self.read_stamp)
+        except Exception as E:
+            eprint(f"Replay Worker Error: {traceback.format_exc()}\n", color="red")
+            self.error.emit(str(E))
+        finally:
+            if self.pending_raw or self.pending_lines:
+                self.flush_pending()
+            self.source.close()
+            self.close_wake_pipe()
+            self.active = False
+            self.done.emit()
+
+    def wait_until(self, target_t: float):
+        """Sleep until target_t, flushing merged data when a frame is due"""
+        while self.active:
+            remaining = target_t - time.perf_counter()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, self.check_timers()))
+
+    def feed(self, data: bytes):
+        """SerialWorker.feed, timed as the framing stage"""
+        frame_t = time.perf_counter()
+        blocked_s = self.queue.stats["blocked_s"]  ## Time waiting for the GUI is not framing time
+        lines = self.stats["lines"] + len(self.pending_lines)
+        super().feed(data)
+        stage = self.stages["framing"]
+        stage["s"] += time.perf_counter() - frame_t - (self.queue.stats["blocked_s"] - blocked_s)
+        stage["bytes"] += len(data)
+        stage["lines"] += self.stats["lines"] + len(self.pending_lines) - lines
+        self.stages["source"]["bytes"] += len(data)
+
+    def stop(self):
+        self.active = False
+        self.queue.close()
+
+    def add_stage_time(self, stage: str, seconds: float, bytes: int = 0, lines: int = 0):
+        """Called by the GUI thread for the stages after the RX queue"""
+        self.stages[stage]["s"] += seconds
+        self.stages[stage]["bytes"] += bytes
+        self.stages[stage]["lines"] += lines
+
+    def report(self) -> str:
+        """End to end and per stage throughput. Call once the GUI has drained the last batch."""
+        elapsed = max(time.perf_counter() - self.start_t, 1e-9)
+        total_bytes = self.stages["source"]["bytes"]
+        total_lines = self.stats["lines"]
+        text = f"Replayed {os.path.basename(self.path)}: {total_bytes} bytes, {total_lines} lines in {elapsed:.3f}s"
+        text += f" ({total_bytes / elapsed / 1e6:.2f} MB/s, {total_lines / elapsed:.0f} lines/s)"
+        for name, stage in self.stages.items():
+            seconds = max(stage["s"], 1e-9)
+            lines = stage["lines"] or total_lines
+            text += f"\n\t{name:<10}{stage['s']:8.3f}s {stage['bytes'] / seconds / 1e6:10.2f} MB/s {lines / seconds:12.0f} lines/s"
+        return text
@@ -4,6 +4,7 @@ from PyQt6.QtGui import QTextCharFormat, QTextCursor, QSyntaxHighlighter
 from PyQt6.QtWidgets import QTextEdit
 import time 
 from SK_common import * 
+from SK_profiler import PROFILER
 import shlex
 
 
@@ -269,6 +270,7 @@ class ScriptWorker(QObject):
         
 
     def next_line(self):
+        PROFILER.poll()
         if self.current_line == self.total_lines:
             self.stop() 
             return
@@ -1,13 +1,22 @@
+import os
 import time
+import select
 import traceback
+import threading
+import collections
 import serial
 import serial.tools.list_ports
-from PyQt6.QtCore import QObject, pyqtSignal, QTimer
+from PyQt6.QtCore import QObject, pyqtSignal, QTimer, Qt
 import serial.tools.list_ports_linux
 from SK_common import *
+from SK_framing import ByteRing, LineFramer, TERMINATOR_AUTO, DEFAULT_MAX_LINE_LENGTH
+from SK_capture import CaptureWriter, DIR_RX
+from SK_metrics import METRICS
+from SK_trace import TRACER
+from SK_profiler import PROFILER
+from SK_hotplug import Inotify, PORT_SCANNER, DEV_DIR, BY_ID_DIR, HOTPLUG_SETTLE, is_port_event
 from pprint import pprint
 
-ser = serial.Serial()
 from dataclasses import dataclass
 
 
@@ -34,64 +43,356 @@ def debug_bytes(data: bytes):
     print("\n---")
 
 
+READ_MODE_BLOCK = "block"  ## Sleep in select() on the port until data arrives
+READ_MODE_POLL = "poll"  ## Legacy loop: spin on in_waiting, sleep after 1s of silence
+READ_MODES = (READ_MODE_BLOCK, READ_MODE_POLL)
+
+WAKE_INTERVAL = 0.25  ## Seconds. Longest a blocked reader waits before re-checking self.active
+DEFAULT_COALESCE_HZ = 60  ## Most raw/lines signal pairs per second handed to the GUI, 0 = one per read
+DEFAULT_COALESCE_BYTES = 1 << 16  ## Pending raw bytes that force a flush before the next frame is due
+
+QUEUE_BLOCK = "block"  ## Reader stops reading until the GUI catches up. Nothing is dropped
+QUEUE_DROP_OLDEST = "drop-oldest"  ## Oldest queued terminal/plot data is dropped, lines still reach log and extensions
+QUEUE_DROP_DISPLAY = "drop-display"  ## New terminal/plot data is dropped while full, lines still reach log and extensions
+QUEUE_POLICIES = (QUEUE_BLOCK, QUEUE_DROP_OLDEST, QUEUE_DROP_DISPLAY)
+DEFAULT_QUEUE_BYTES = 8 << 20
+
+READ_NS = METRICS.histogram("rx.read_ns")  ## Wake-up to data in the ring
+READ_BYTES = METRICS.histogram("rx.read_bytes", "B")
+FRAME_NS = METRICS.histogram("rx.frame_ns")  ## Line framing per read, decode included
+RX_BYTES = METRICS.counter("rx.bytes", "B")
+RX_LINES = METRICS.counter("rx.lines")
+RX_QUEUE_BYTES = METRICS.gauge("rx.queue_bytes", "B")
+RX_DROPPED_BYTES = METRICS.counter("rx.dropped_bytes", "B")
+
+Stamp = tuple[int, int]  ## (time.perf_counter_ns(), time.time_ns()) taken when the data was read from the port
+
+
+class HandoffQueue:
+    """Bounded queue of (raw, lines, display, raw_stamp, stamps) batches from the serial reader to the GUI thread.
+
+    raw_stamp is the read time of the first byte in raw, stamps has the read time of each line.
+
+    Size is counted in raw bytes plus line characters. The drop policies only ever drop display data
+    (raw bytes for the terminal, lines for the plot). If the lines alone fill the queue, put() blocks.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_QUEUE_BYTES, policy: str = QUEUE_DROP_OLDEST):
+        if policy not in QUEUE_POLICIES:
+            eprint(f"Unknown queue policy '{policy}', using '{QUEUE_DROP_OLDEST}'")
+            policy = QUEUE_DROP_OLDEST
+        self.policy = policy
+        self.max_bytes = max(1, max_bytes)
+        self.batches = collections.deque()
+        self.size = 0
+        self.dropped_prefix = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.stats = {"batches": 0, "dropped_bytes": 0, "dropped_batches": 0, "blocked": 0, "blocked_s": 0.0, "peak_bytes": 0}
+
+    def put(self, raw: bytes, lines: list[str], raw_stamp: Stamp = None, stamps: list[Stamp] = None) -> bool:
+        """Queue a batch. Returns True if the queue was empty, i.e. the consumer needs a wake-up."""
+        line_bytes = sum(map(len, lines))
+        needed = len(raw) + line_bytes
+        display = True
+        with self.condition:
+            if self.size + needed > self.max_bytes:
+                if self.policy == QUEUE_DROP_OLDEST:
+                    self.drop_display(self.size + needed - self.max_bytes)
+                if self.policy != QUEUE_BLOCK and self.size + needed > self.max_bytes:
+                    self.count_drop(len(raw))
+                    raw, display, needed = b"", False, line_bytes
+                if self.size + needed > self.max_bytes and self.batches:
+                    self.wait_for_space(needed)
+            was_empty = not self.batches
+            self.batches.append((raw, lines, display, needed, raw_stamp, stamps))
+            self.size += needed
+            self.stats["batches"] += 1
+            self.stats["peak_bytes"] = max(self.stats["peak_bytes"], self.size)
+            RX_QUEUE_BYTES.set(self.size)
+            return was_empty
+
+    def drop_display(self, needed: int):
+        """Drop display data from the oldest batches until needed bytes are free (or nothing is left to drop)"""
+        index = self.dropped_prefix
+        while needed > 0 and index < len(self.batches):
+            raw, lines, display, size, raw_stamp, stamps = self.batches[index]
+            if display:
+                self.batches[index] = (b"", lines, False, size - len(raw), raw_stamp, stamps)
+                self.size -= len(raw)
+                needed -= len(raw)
+                self.count_drop(len(raw))
+            index += 1
+        self.dropped_prefix = index  ## Batches before this one have no display data left
+
+    def count_drop(self, dropped: int):
+        self.stats["dropped_bytes"] += dropped
+        RX_DROPPED_BYTES.inc(dropped)
+        self.stats["dropped_batches"] += 1
+
+    def wait_for_space(self, needed: int):
+        start_t = time.perf_counter()
+        self.stats["blocked"] += 1
+        while self.size + needed > self.max_bytes and self.batches and not self.closed:
+            self.condition.wait(WAKE_INTERVAL)
+        self.stats["blocked_s"] += time.perf_counter() - start_t
+
+    def drain(self) -> list[tuple[bytes, list[str], bool, Stamp, list[Stamp]]]:
+        """Take every queued batch as (raw, lines, display, raw_stamp, stamps)"""
+        with self.condition:
+            batches = [(raw, lines, display, raw_stamp, stamps) for raw, lines, display, size, raw_stamp, stamps in self.batches]
+            self.batches.clear()
+            self.size = 0
+            RX_QUEUE_BYTES.set(0)
+            self.dropped_prefix = 0
+            self.condition.notify_all()
+        return batches
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def summary(self) -> str:
+        used = 100 * self.size / self.max_bytes
+        return f"RX Q: {used:.0f}% drop: {self.stats['dropped_bytes'] / 1e6:.1f}MB blk: {self.stats['blocked']}"
+
+
 class SerialWorker(QObject):
-    raw = pyqtSignal(bytes)
     text = pyqtSignal(str)
     error = pyqtSignal(str)
-    lines = pyqtSignal(list)
-    line_buffer = ""
-    text_buffer = ""
-    bytes_buffer = bytearray(2048)
-
-    def __init__(self, *args, **kwargs):
+    ready = pyqtSignal()  ## Batches are waiting in self.queue. Only sent when the queue was empty
+    ser: serial.Serial = None
+    queue: HandoffQueue = None
+    framer: LineFramer = None
+    ring: ByteRing = None
+    capture: CaptureWriter = None  ## Set by SerialSession while a capture is running
+    traced = True  ## Sampled batches get rx.read, rx.split and rx.batch spans while TRACER is active
+    read_mode = READ_MODE_BLOCK
+
+    def __init__(self, ser: serial.Serial, *args, read_mode: str = READ_MODE_BLOCK, terminator: str = TERMINATOR_AUTO, max_line_length: int = DEFAULT_MAX_LINE_LENGTH, idle_flush_ms: int = 0, coalesce_hz: int = DEFAULT_COALESCE_HZ, coalesce_bytes: int = DEFAULT_COALESCE_BYTES, queue_bytes: int = DEFAULT_QUEUE_BYTES, queue_policy: str = QUEUE_DROP_OLDEST, **kwargs):
         super().__init__(*args, **kwargs)
+        self.ser = ser
         self.last_activity = time.perf_counter()
         self.active = True
-        self.line_buffer = ""
-        self.text_buffer = ""
+        try:
+            self.framer = LineFramer(terminator, max_line_length)
+        except ValueError as e:
+            eprint(f"{e}, splitting lines at '{TERMINATOR_AUTO}'")
+            self.framer = LineFramer(TERMINATOR_AUTO, max_line_length)
+        self.ring = self.framer.ring
         self.escape_buffer = None
+        if read_mode not in READ_MODES:
+            eprint(f"Unknown serial read mode '{read_mode}', using '{READ_MODE_BLOCK}'")
+            read_mode = READ_MODE_BLOCK
+        self.read_mode = read_mode
+        self.idle_flush = max(0, idle_flush_ms) / 1000  ## Seconds of silence before a partial line is emitted, 0 = never
+        ## Reads are merged into one raw and one lines signal per frame so the GUI sees a bounded event rate
+        self.flush_interval = 1 / coalesce_hz if coalesce_hz > 0 else 0
+        self.flush_bytes = max(1, coalesce_bytes)
+        self.pending_raw = bytearray()
+        self.pending_lines = []
+        self.pending_stamps = []
+        self.raw_stamp = None  ## Read time of the first byte in pending_raw
+        self.read_stamp = (time.perf_counter_ns(), time.time_ns())  ## Read time of the last read
+        self.read_end = self.read_stamp[0]
+        self.last_flush = 0
+        self.stats = {"reads": 0, "batches": 0, "bytes": 0, "lines": 0}
+        self.queue = HandoffQueue(queue_bytes, queue_policy)
+        ## Self-pipe used by stop() to wake a reader blocked in select()
+        self.wake_r, self.wake_w = (None, None) if os.name == "nt" else os.pipe()
+        self.wake_lock = threading.Lock()
         # ser.set_low_latency_mode(True)
-        # ser.readinto()
 
-    def wait_for_main(self):
-        start_time = time.perf_counter()
-        while self.main_busy:
-            if time.perf_counter() - start_time > 0.1:
-                eprint("Serial Worker Main Busy Timeout", color="red")
-                self.main_busy = False
-                return 0
-
-        return time.perf_counter() - start_time
+    def process(self, new_bytes: int):
+        """Hand the last new_bytes written to the ring downstream. The partial last line stays in the ring."""
+        if not new_bytes:
+            return
+        if not self.pending_raw:
+            self.raw_stamp = self.read_stamp
+        chunks = [self.ring.view[a:b] for a, b in self.ring.segments(self.ring.head - new_bytes, self.ring.head)]
+        for chunk in chunks:
+            self.pending_raw += chunk
+        if self.capture is not None:
+            self.capture.write(DIR_RX, self.read_stamp[1], *chunks)
+        frame_t = time.perf_counter_ns()
+        lines = self.framer.frame()
+        frame_end = time.perf_counter_ns()
+        FRAME_NS.record(frame_end - frame_t)
+        if self.traced and TRACER.sampled(self.raw_stamp):
+            TRACER.complete("rx.read", self.read_stamp[0], self.read_end, bytes=new_bytes)
+            TRACER.complete("rx.split", frame_t, frame_end, lines=len(lines))
+        RX_BYTES.inc(new_bytes)
+        self.pending_lines += lines
+        self.pending_stamps += [self.read_stamp] * len(lines)
+        self.stats["reads"] += 1
+        if not self.flush_interval or len(self.pending_raw) >= self.flush_bytes or time.perf_counter() - self.last_flush >= self.flush_interval:
+            self.flush_pending()
+
+    def flush_pending(self):
+        """Queue everything merged since the last flush as one batch"""
+        raw, lines, stamps = bytes(self.pending_raw), self.pending_lines, self.pending_stamps
+        self.pending_raw.clear()
+        self.pending_lines = []
+        self.pending_stamps = []
+        self.stats["bytes"] += len(raw)
+        self.stats["lines"] += len(lines)
+        self.stats["batches"] += 1
+        RX_LINES.inc(len(lines))
+        if self.traced and TRACER.sampled(self.raw_stamp):
+            TRACER.interval("rx.batch", self.raw_stamp[0], time.perf_counter_ns(), bytes=len(raw), lines=len(lines))
+        if self.queue.put(raw, lines, self.raw_stamp, stamps):
+            self.ready.emit()
+        self.last_flush = time.perf_counter()
+
+    def check_coalesce(self) -> float:
+        """Flush merged reads once the frame is due. Returns seconds until the next check is due."""
+        if not self.pending_raw and not self.pending_lines:
+            return WAKE_INTERVAL
+        remaining = self.last_flush + self.flush_interval - time.perf_counter()
+        if remaining > 0:
+            return min(remaining, WAKE_INTERVAL)
+        self.flush_pending()
+        return WAKE_INTERVAL
+
+    def check_timers(self) -> float:
+        return min(self.check_coalesce(), self.check_idle_flush())
+
+    def coalesce_summary(self) -> str:
+        reads, batches = self.stats["reads"], self.stats["batches"]
+        return f"{reads} reads merged into {batches} batches ({reads - batches} merged), {self.stats['bytes']} bytes, {self.stats['lines']} lines"
+
+    def check_idle_flush(self) -> float:
+        """Emit the partial line if the port has been idle for idle_flush. Returns seconds until the next check is due."""
+        if not self.idle_flush or not self.framer.pending():
+            return WAKE_INTERVAL
+        remaining = self.last_activity + self.idle_flush - time.perf_counter()
+        if remaining > 0:
+            return min(remaining, WAKE_INTERVAL)
+        line = self.framer.flush()
+        if line:
+            self.pending_lines.append(line)
+            self.pending_stamps.append(self.read_stamp)
+            self.flush_pending()
+        return WAKE_INTERVAL
 
     def run(self):
+        try:
+            if self.read_mode == READ_MODE_POLL:
+                self.run_poll()
+            else:
+                self.run_block()
+        except Exception as E:
+            eprint(f"Serial Worker Error: {traceback.format_exc()}\n", color="red")
+            self.error.emit(str(E))
+            self.active = False
+        finally:
+            if self.pending_raw or self.pending_lines:
+                self.flush_pending()
+            self.close_wake_pipe()
+
+    def run_poll(self):
         while self.active:
-            try:
-                in_waiting = ser.in_waiting
-                if in_waiting and ser.is_open:
-                    self.last_activity = time.perf_counter()
-                    raw = ser.read(in_waiting)
-                    self.raw.emit(raw)
-                    text = self.line_buffer + raw.decode("utf-8", errors="replace")
-                    lines = text.splitlines()
-                    if text.endswith("\n") or text.endswith("\r"):
-                        self.lines.emit(lines)
-                        self.line_buffer = ""
-                    else:
-                        self.lines.emit(lines[:-1])
-                        self.line_buffer = lines[-1]
-                    end_t = time.perf_counter()
-                    if DEBUG_LEVEL & 128:
-                        cprint(f"Serial Read Time: {(end_t - self.last_activity) * 1000000:.3f}us Size: {in_waiting}", color="blue")
-
-                elif (time.perf_counter() - self.last_activity) > 1.00:
+            in_waiting = self.ser.in_waiting
+            if in_waiting and self.ser.is_open:
+                self.stamp_read()
+                self.process(self.record_read(self.ring.fill(self.ser.readinto, in_waiting)))
+            else:
+                self.check_timers()
+                if (time.perf_counter() - self.last_activity) > 1.00:
                     time.sleep(0.02)
-            except Exception as E:
-                eprint(f"Serial Worker Error: {traceback.format_exc()}\n", color="red")
-                self.error.emit(str(E))
-                self.active = False
+
+    def run_block(self):
+        if self.wake_r is None:
+            self.run_block_timeout()
+            return
+        fd = self.ser.fileno()
+        while self.active:
+            ready, _, _ = select.select([fd, self.wake_r], [], [], self.check_timers())
+            if not self.active:
+                break
+            if fd in ready:
+                self.on_readable()
+
+    def read_fd(self, view: memoryview) -> int:
+        try:
+            n = os.readv(self.ser.fileno(), [view])
+        except BlockingIOError:
+            return 0
+        if not n:
+            raise serial.SerialException("device reports readiness to read but returned no data (device disconnected?)")
+        return n
+
+    def on_readable(self):
+        """Read everything the port has ready. Called by run_block() and by the asyncio engine."""
+        self.stamp_read()
+        in_waiting = self.ser.in_waiting
+        self.process(self.record_read(self.ring.fill(self.read_fd, in_waiting or 1)))
+
+    def stamp_read(self):
+        """Time stamp the data about to be read. Lines and raw batches carry it to the plot, logger and extensions."""
+        self.read_stamp = (time.perf_counter_ns(), time.time_ns())
+        self.last_activity = self.read_stamp[0] / 1e9
+        PROFILER.poll()
+
+    def record_read(self, n: int) -> int:
+        self.read_end = time.perf_counter_ns()
+        READ_NS.record(self.read_end - self.read_stamp[0])
+        READ_BYTES.record(n)
+        return n
+
+    def feed(self, data: bytes):
+        """Push data read elsewhere (a replay, bytes read while reconnecting) through the ring and framer in ring-sized pieces"""
+        view = memoryview(data)
+        position = [0]
+
+        def readinto(buffer: memoryview) -> int:
+            n = min(len(buffer), len(view) - position[0])
+            buffer[:n] = view[position[0] : position[0] + n]
+            position[0] += n
+            return n
+
+        while position[0] < len(view) and self.active:
+            self.last_activity = time.perf_counter()
+            n = self.ring.fill(readinto, len(view) - position[0])
+            if not n:
+                raise BufferError("Ring is full")
+            self.process(n)
+
+    def has_pending(self) -> bool:
+        """True if a timer (frame flush or idle flush) still has to fire for this worker"""
+        return bool(self.pending_raw or self.pending_lines or (self.idle_flush and self.framer.pending()))
+
+    def run_block_timeout(self):
+        """Blocking reader for ports that cannot be passed to select() (Windows)"""
+        self.ser.timeout = min(WAKE_INTERVAL, self.idle_flush or WAKE_INTERVAL, self.flush_interval or WAKE_INTERVAL)
+        while self.active:
+            n = self.ring.fill(self.ser.readinto, 1)
+            if not n or not self.active:
+                self.check_timers()
+                continue
+            self.stamp_read()
+            in_waiting = self.ser.in_waiting
+            if in_waiting:
+                n += self.ring.fill(self.ser.readinto, in_waiting)
+            self.process(self.record_read(n))
 
     def stop(self):
         self.active = False
+        self.queue.close()
+        with self.wake_lock:
+            if self.wake_w is not None:
+                os.write(self.wake_w, b"\x00")
+                return
+        if self.read_mode == READ_MODE_BLOCK and self.ser.is_open:
+            self.ser.cancel_read()
+
+    def close_wake_pipe(self):
+        with self.wake_lock:
+            for fd in (self.wake_r, self.wake_w):
+                if fd is not None:
+                    os.close(fd)
+            self.wake_r, self.wake_w = None, None
 
 
 ###############################################################
@@ -152,7 +453,93 @@ class SK_Port:
         return s
 
 
-def find_serial_port(port_name: str, ports: list[SK_Port]) -> SK_Port | None:
+def port_key(port: SK_Port) -> tuple[str, str, str]:
+    """What makes a port a different port for the port list: the node, the device on it and its alias"""
+    return port.Device, port.SN, port.Alias
+
+
+class PortRegistry:
+    """The current ports, indexed for find() by every name SK_Port.__eq__ accepts and by display name suffix.
+
+    Ports are kept in scan order and the first port to claim a name keeps it, as with a linear search.
+    Adding a port is O(name length ^ 2) for the suffixes, removing one rebuilds the indexes (ports rarely go).
+    """
+
+    def __init__(self, ports: list[SK_Port] = ()):
+        self.ports: dict[str, SK_Port] = {}  ## Device -> port
+        self.names: dict[str, SK_Port] = {}  ## Name, SN, device, PID, VID, VID:PID and alias -> port
+        self.suffixes: dict[str, SK_Port] = {}  ## Every suffix of every display name -> port
+        for port in ports:
+            self.add(port)
+
+    def __iter__(self):
+        return iter(list(self.ports.values()))
+
+    def __len__(self) -> int:
+        return len(self.ports)
+
+    def __repr__(self) -> str:
+        return repr(list(self.ports.values()))
+
+    def __contains__(self, name) -> bool:
+        if isinstance(name, SK_Port):
+            return name.Device in self.ports
+        return str(name) in self.names
+
+    def index(self, port: SK_Port):
+        names = [port.Name, port.SN, port.Device, port.PID, port.VID, port.Alias]
+        try:
+            names.append(f"{int(port.VID):04x}:{int(port.PID):04x}")
+        except (TypeError, ValueError):
+            pass
+        for name in names:
+            if name:
+                self.names.setdefault(str(name), port)
+        display = port.Display or ""
+        for start in range(len(display) + 1):
+            self.suffixes.setdefault(display[start:], port)
+
+    def add(self, port: SK_Port):
+        """Add a port, or replace the port on the same device"""
+        if port.Device in self.ports:
+            self.ports[port.Device] = port
+            self.reindex()
+        else:
+            self.ports[port.Device] = port
+            self.index(port)
+
+    def remove(self, port: SK_Port):
+        """Remove a port if the registry still has that port (same device, serial number and alias)"""
+        current = self.ports.get(port.Device)
+        if current is None or port_key(current) != port_key(port):
+            return
+        del self.ports[port.Device]
+        self.reindex()
+
+    def reindex(self):
+        self.names.clear()
+        self.suffixes.clear()
+        for port in self.ports.values():
+            self.index(port)
+
+    def find(self, port_name: str) -> SK_Port | None:
+        port_name = str(port_name)
+        if port_name:
+            port = self.names.get(port_name)
+            if port is not None:
+                return port
+        return self.suffixes.get(port_name)
+
+    def diff(self, ports: list[SK_Port]) -> tuple[list[SK_Port], list[SK_Port]]:
+        """(added, removed) to go from this registry to ports"""
+        current = {port_key(port): port for port in self.ports.values()}
+        new = {port_key(port): port for port in ports}
+        return [port for key, port in new.items() if key not in current], [port for key, port in current.items() if key not in new]
+
+
+def find_serial_port(port_name: str, ports: list[SK_Port] | PortRegistry) -> SK_Port | None:
+    if isinstance(ports, PortRegistry):
+        return ports.find(port_name)
     for port in ports:
         if port_name == port:
             return port
@@ -171,15 +558,11 @@ def find_serial_port(port_name: str, ports: list[SK_Port]) -> SK_Port | None:
 
 def get_ports(aliases: dict = None) -> dict:
     ports = []
-    for port in serial.tools.list_ports.comports():
+    for port in PORT_SCANNER.scan():
         alias = None
         settings = None
-        if aliases:
-            for key, value in aliases.items():
-                if port.serial_number == key:
-                    alias = value[0]
-                    settings = value[1]
-                    break
+        if aliases and port.serial_number in aliases:
+            alias, settings = aliases[port.serial_number][:2]
         if not port.manufacturer:
             continue
         this_port = SK_Port(str(port.name), str(port.device), str(port.description), str(port.pid), str(port.vid), str(port.manufacturer), str(port.serial_number), str(port.product), alias, settings)
@@ -190,29 +573,219 @@ def get_ports(aliases: dict = None) -> dict:
 
 
 class RescanWorker(QObject):
-    new_ports = pyqtSignal(list)
+    """Emits new_ports when serial ports come or go.
+
+    On Linux an inotify watch on /dev and /dev/serial/by-id wakes it when a node is created or removed,
+    so ports are only enumerated after a change. Without inotify it polls every update_interval ms.
+    """
+
+    ports_changed = pyqtSignal(list, list)  ## Added ports, removed ports
     active = False
     update_interval = 400
-    existing_ports = []
+    hotplug = False  ## Woken by inotify rather than polling
 
     aliases = None 
 
     def __init__(self, *args, existing_ports=[], **kwargs):
-        self.existing_ports = existing_ports
         super().__init__(*args, **kwargs)
+        self.registry = PortRegistry(existing_ports)
+        self.wake_r, self.wake_w = (None, None) if os.name == "nt" else os.pipe()
 
     def run(self):
         self.active = True
+        inotify = None
+        try:
+            inotify = Inotify()
+            if not inotify.add_watch(DEV_DIR):
+                raise OSError(f"Could not watch {DEV_DIR}")
+            inotify.add_watch(BY_ID_DIR)
+        except OSError as e:
+            dprint(f"Port hotplug events unavailable, polling every {self.update_interval} ms: {e}")
+            if inotify is not None:
+                inotify.close()
+            inotify = None
+        self.hotplug = inotify is not None and self.wake_r is not None
+        try:
+            if self.hotplug:
+                self.run_hotplug(inotify)
+            else:
+                self.run_poll()
+        finally:
+            if inotify is not None:
+                inotify.close()
+
+    def run_poll(self):
+        while self.active:
+            self.scan()
+            time.sleep(self.update_interval / 1000)
+
+    def run_hotplug(self, inotify: Inotify):
+        self.scan()
         while self.active:
-            try:
-                new_ports = get_ports(self.aliases)
-                if self.existing_ports != new_ports:
-                    self.existing_ports = new_ports
-                    self.new_ports.emit(new_ports)
-                time.sleep(self.update_interval / 1000)
-            except Exception as e:
-                print(e)
+            ready, _, _ = select.select([inotify.fd, self.wake_r], [], [])
+            if self.wake_r in ready:
+                break
+            if not any(is_port_event(*event) for event in inotify.read()):
+                continue
+            ## One plug is several events (node, by-id and by-path links), rescan once they stop
+            while self.active and select.select([inotify.fd], [], [], HOTPLUG_SETTLE)[0]:
+                inotify.read()
+            if not inotify.watching(BY_ID_DIR):
+                inotify.add_watch(BY_ID_DIR)  ## Created by udev with the first USB serial device
+            self.scan()
+
+    def scan(self):
+        try:
+            added, removed = self.registry.diff(get_ports(self.aliases))
+            for port in removed:
+                self.registry.remove(port)
+            for port in added:
+                self.registry.add(port)
+            if added or removed:
+                self.ports_changed.emit(added, removed)
+        except Exception as e:
+            print(e)
+
+    def stop(self):
+        self.active = False
+        if self.wake_w is not None:
+            os.write(self.wake_w, b"\x00")
+
+    def summary(self) -> str:
+        return f"Rescan: {'hotplug events' if self.hotplug else f'polling every {self.update_interval} ms'}, {PORT_SCANNER.summary()}"
 
     def rescan(self):
         ports = get_ports()
         # print(ports)
+
+
+###############################################################
+######################## BENCHMARKS ###########################
+###############################################################
+
+
+def benchmark_read_modes(duration: float = 3.0, interval: float = 0.02, message: bytes = b"T:12.345 V:3.300 I:0.125\r\n"):
+    """Compare CPU usage and first-byte latency of each read mode against a chatty device on a pty pair (POSIX only).
+
+    The simulated device writes `message` every `interval` seconds for `duration` seconds.
+    Returns {mode: {"cpu_s": ..., "cpu_pct": ..., "latency_us_avg": ..., "latency_us_max": ..., "reads": ...}}
+    """
+    import pty
+    import statistics
+
+    results = {}
+    for mode in READ_MODES:
+        master, slave = pty.openpty()
+        ser = serial.Serial()
+        ser.port = os.ttyname(slave)
+        ser.baudrate = 115200
+        ser.timeout = None
+        ser.open()
+        worker = SerialWorker(ser, read_mode=mode, coalesce_hz=0)
+        sent_at = []
+        latencies = []
+        received = [0]
+
+        def on_raw(data: bytes):
+            now = time.perf_counter_ns()
+            if received[0] % len(message) == 0:  ## This read starts a new message
+                index = received[0] // len(message)
+                if index < len(sent_at):
+                    latencies.append(now - sent_at[index])
+            received[0] += len(data)
+
+        def on_ready():
+            for raw, lines, display, raw_stamp, stamps in worker.queue.drain():
+                on_raw(raw)
+
+        worker.ready.connect(on_ready, Qt.ConnectionType.DirectConnection)
+        reader = threading.Thread(target=worker.run, daemon=True)
+        reader.start()
+        time.sleep(0.1)
+
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        while time.perf_counter() - wall_start < duration:
+            sent_at.append(time.perf_counter_ns())
+            os.write(master, message)
+            time.sleep(interval)
+        cpu_s = time.process_time() - cpu_start
+        wall_s = time.perf_counter() - wall_start
+
+        worker.stop()
+        reader.join(1.0)
+        ser.close()
+        os.close(master)
+        os.close(slave)
+
+        latencies_us = [x / 1000 for x in latencies] or [0]
+        results[mode] = {
+            "cpu_s": round(cpu_s, 3),
+            "cpu_pct": round(100 * cpu_s / wall_s, 1),
+            "latency_us_avg": round(statistics.mean(latencies_us), 1),
+            "latency_us_max": round(max(latencies_us), 1),
+            "reads": len(latencies),
+        }
+    return results
+
+
+def benchmark_coalescing(duration: float = 2.0, line: bytes = b"T:12.345 V:3.300 I:0.125\r\n", burst: int = 8, coalesce_rates: tuple = (0, 60)):
+    """Wake-up signals per second reaching the GUI side while a device floods a pty pair with lines (POSIX only).
+
+    The simulated device writes `burst` lines per write as fast as the pty accepts them.
+    Returns {coalesce_hz: {"signals_per_s": ..., "lines_per_s": ..., "reads": ..., "batches": ...}}
+    """
+    import pty
+
+    results = {}
+    for coalesce_hz in coalesce_rates:
+        master, slave = pty.openpty()
+        ser = serial.Serial()
+        ser.port = os.ttyname(slave)
+        ser.baudrate = 115200
+        ser.timeout = None
+        ser.open()
+        worker = SerialWorker(ser, coalesce_hz=coalesce_hz)
+        signals = [0]
+        lines = [0]
+
+        def on_ready():
+            signals[0] += 1
+            for raw, new_lines, display, raw_stamp, stamps in worker.queue.drain():
+                lines[0] += len(new_lines)
+
+        worker.ready.connect(on_ready, Qt.ConnectionType.DirectConnection)
+        reader = threading.Thread(target=worker.run, daemon=True)
+        reader.start()
+        time.sleep(0.1)
+
+        chunk = line * burst
+        wall_start = time.perf_counter()
+        while time.perf_counter() - wall_start < duration:
+            os.write(master, chunk)
+        time.sleep(0.1)
+        wall_s = time.perf_counter() - wall_start
+
+        worker.stop()
+        reader.join(1.0)
+        ser.close()
+        os.close(master)
+        os.close(slave)
+
+        results[coalesce_hz] = {
+            "signals_per_s": round(signals[0] / wall_s),
+            "lines_per_s": round(lines[0] / wall_s),
+            "reads": worker.stats["reads"],
+            "batches": worker.stats["batches"],
+        }
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--bench" in sys.argv:
+        for mode, result in benchmark_read_modes().items():
+            print(f"{mode:<8} {result}")
+        for coalesce_hz, result in benchmark_coalescing().items():
+            print(f"coalesce_hz={coalesce_hz:<4} {result}")
@@ -0,0 +1,166 @@
+import serial
+from PyQt6.QtCore import QObject, QThread, pyqtSignal
+
+from SK_common import *
+from SK_serial_worker import *
+from SK_logger import SK_Logger
+from SK_async_engine import AsyncEngine
+from SK_transport import Transport, create_transport
+from SK_tx_writer import TxWriter
+from SK_capture import CaptureWriter
+
+
+class SerialSession(QObject):
+    """One open port: its own pyserial handle, reader thread, line framer and logger.
+
+    MainWindow keeps one session per connected port. Only the session shown in the terminal
+    feeds the terminal and extensions; every session writes its lines to its own logger.
+    """
+
+    ready = pyqtSignal(object)  ## (session) the worker queued new batches
+    error = pyqtSignal(object, str)  ## (session, error)
+
+    port: SK_Port = None
+    ser: serial.Serial | Transport = None
+    worker: SerialWorker = None
+    thread: QThread = None
+    writer: TxWriter = None
+    writer_thread: QThread = None
+    logger: SK_Logger = None  ## None means the main log
+    capture: CaptureWriter = None
+    baud: int = None
+
+    def __init__(self, port: SK_Port, settings: dict, logger: SK_Logger = None, engine: AsyncEngine = None, ser: serial.Serial = None):
+        super().__init__()
+        self.port = port
+        self.engine = engine  ## None: the worker gets its own QThread
+        self.settings = settings  ## MainWindow.current_settings, the rx_* keys configure the worker
+        self.logger = logger
+        self.ser = ser if ser is not None else create_transport(port.Device)  ## An open ser comes from a Reconnector
+
+    def __repr__(self):
+        return str(self.port)
+
+    @property
+    def is_open(self) -> bool:
+        return self.ser.is_open
+
+    def open(self, baud: int, parity: str, rtscts: bool, xonxoff: bool, dsrdtr: bool, early: list[tuple[Stamp, bytes]] = None) -> bool:
+        """Open the port and start its reader and writer. early: (stamp, data) already read from an open ser, passed on first"""
+        self.baud = baud
+        if not self.ser.is_open:
+            self.ser.rtscts = rtscts
+            self.ser.xonxoff = xonxoff
+            self.ser.dsrdtr = dsrdtr
+            self.ser.baudrate = baud
+            self.ser.parity = parity
+            self.ser.port = self.port.Device
+
+            self.ser.close()
+            self.ser.open()
+            try:
+                self.ser.set_low_latency_mode(True)
+            except (OSError, ValueError, NotImplementedError) as e:
+                dprint(f"{self.port}: low latency mode not available: {e}", color="yellow")
+        if not self.ser.is_open:
+            return False
+        self.open_writer()
+
+        self.worker = SerialWorker(
+            self.ser,
+            read_mode=self.settings["serial_read_mode"],
+            terminator=self.settings["rx_line_terminator"],
+            max_line_length=self.settings["rx_max_line_length"],
+            idle_flush_ms=self.settings["rx_idle_flush_ms"],
+            coalesce_hz=self.settings["rx_coalesce_hz"],
+            coalesce_bytes=self.settings["rx_coalesce_bytes"],
+            queue_bytes=self.settings["rx_queue_bytes"],
+            queue_policy=self.settings["rx_queue_policy"],
+        )
+        self.worker.ready.connect(lambda: self.ready.emit(self))
+        self.worker.error.connect(lambda error: self.error.emit(self, error))
+        for stamp, data in early or ():
+            self.worker.read_stamp = stamp
+            self.worker.feed(data)
+        if self.worker.pending_raw or self.worker.pending_lines:
+            self.worker.flush_pending()
+        if self.engine is not None:
+            self.engine.add_worker(self.worker)
+            return True
+        self.thread = QThread()
+        self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.run)
+        self.thread.start(QThread.Priority.HighPriority)
+        return True
+
+    def open_writer(self):
+        self.writer = TxWriter(
+            self.ser,
+            max_bytes=self.settings["tx_queue_bytes"],
+            byte_delay_ms=self.settings["tx_byte_delay_ms"],
+            line_delay_ms=self.settings["tx_line_delay_ms"],
+        )
+        self.writer.error.connect(lambda error: self.error.emit(self, error))
+        self.writer_thread = QThread()
+        self.writer.moveToThread(self.writer_thread)
+        self.writer_thread.started.connect(self.writer.run)
+        self.writer_thread.start()
+
+    def send(self, data: bytes) -> bool:
+        """Queue data for the writer thread. Returns False if the TX queue is full."""
+        return self.writer is not None and self.writer.put(data)
+
+    def start_capture(self, path: str) -> CaptureWriter:
+        """Record every byte read and written from now on to a binary capture file"""
+        self.stop_capture()
+        self.capture = CaptureWriter(path)
+        for part in (self.worker, self.writer):
+            if part is not None:
+                part.capture = self.capture
+        return self.capture
+
+    def stop_capture(self) -> CaptureWriter | None:
+        capture, self.capture = self.capture, None
+        if capture is None:
+            return None
+        for part in (self.worker, self.writer):
+            if part is not None:
+                part.capture = None
+        capture.close()
+        return capture
+
+    def drain(self) -> list[tuple[bytes, list[str], bool, Stamp, list[Stamp]]]:
+        if self.worker is None:
+            return []
+        return self.worker.queue.drain()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.stop()
+            self.ser.cancel_write()  ## Unblocks a write waiting on flow control
+            self.writer_thread.quit()
+            self.writer_thread.wait(1000)
+            dprint(f"TX writer {self.port}: {self.writer.stats}", color="yellow")
+        if self.worker is not None:
+            if self.engine is not None:
+                self.engine.remove_worker(self.worker)
+            else:
+                self.worker.stop()
+                self.thread.quit()
+                self.thread.wait()  ## run() has returned, so the port is no longer read when it closes
+            dprint(f"Serial worker {self.port}: {self.worker.coalesce_summary()}", color="yellow")
+
+        self.stop_capture()
+        self.ser.cancel_read()
+        self.ser.cancel_write()
+        self.ser.close()
+
+    def summary(self) -> str:
+        s = f"{self.port} ({self.ser.port} at {self.baud} baud)"
+        if self.worker is not None:
+            s += f" {self.worker.queue.summary()}"
+        if self.writer is not None:
+            s += f" {self.writer.summary()}"
+        if self.capture is not None:
+            s += f" [capture: {self.capture.path}]"
+        return s
@@ -1,7 +1,10 @@
 from SK_common import *
 from SK_help import *
-import copy 
-import time 
+from SK_metrics import METRICS
+from SK_vt_parser import VTParser, Style, DEFAULT_STYLE, palette_rgb, EV_TEXT
+from SK_line_store import TerminalBuffer
+import time
+from collections import deque
 
 from PyQt6 import QtCore, QtGui, QtWidgets
 
@@ -17,32 +20,74 @@ KEY_MODIFIERS = {
     QtCore.Qt.Key.Key_Right: "\x1B[C",
 }
 
-class TerminalWidget(QtWidgets.QPlainTextEdit):
-    escape_buffer = None 
-    escape_sequence:bytes = None
-    display_attributes = {'4': lambda x: x}
-    auto_scroll = True 
+PUT_CHARS_NS = METRICS.histogram("terminal.put_chars_ns")
+INSERT_NS = METRICS.histogram("terminal.insert_ns")
+PARSE_NS = METRICS.histogram("terminal.parse_ns")
+PAINT_NS = METRICS.histogram("terminal.paint_ns")
+FORMAT_HITS = METRICS.counter("terminal.format_hits")
+FORMAT_MISSES = METRICS.counter("terminal.format_misses")
+TERMINAL_BYTES = METRICS.counter("terminal.bytes", "B")
+TERMINAL_LINES = METRICS.gauge("terminal.lines")
+FRAME_NS = METRICS.histogram("terminal.frame_ns")
+FRAME_BYTES = METRICS.histogram("terminal.frame_bytes", "B")
+DROPPED_BYTES = METRICS.counter("terminal.dropped_bytes", "B")
+
+DEFAULT_FRAME_HZ = 60  ## Terminal redraws per second, 0 = draw on every put_chars
+DEFAULT_FRAME_MS = 8  ## Most time one frame spends inserting, the rest waits for the next frame. 0 = no limit
+FRAME_SLICE_BYTES = 16384  ## Pending data inserted between checks of the frame time
+MAX_PENDING_BYTES = 8 << 20  ## The oldest pending data is dropped past this
+FORMAT_CACHE_SIZE = 1024  ## Formats kept, truecolour gradients can make a new style per character
+TEXT_MARGIN = 4  ## Pixels between the edge of the view and the text
+
+class TerminalWidget(QtWidgets.QAbstractScrollArea):
+    """The terminal: a view over a TerminalBuffer that only lays out and paints the lines on screen.
+
+    Received data is parsed once per frame into the buffer, the buffer keeps the scrollback as styled lines in
+    blocks, so drawing, scrolling and trimming cost the same with 100 lines or 10 million.
+    Keeps the parts of the QPlainTextEdit API the main window uses.
+    """
+    auto_scroll = True
     typed = QtCore.pyqtSignal(str)
     format = "UTF-8"
+    LineWrapMode = QtWidgets.QPlainTextEdit.LineWrapMode
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.setTextInteractionFlags(
-            QtCore.Qt.TextInteractionFlag.TextSelectableByKeyboard | QtCore.Qt.TextInteractionFlag.TextSelectableByMouse | QtCore.Qt.TextInteractionFlag.TextBrowserInteraction
-        )
-        self.fmt = self.currentCharFormat()
-        
+        self.buffer = TerminalBuffer()
+        self.text_style = DEFAULT_STYLE  ## Style of text from insertPlainText, set_text_color changes it
+        self.formats: dict[Style, tuple] = {}  ## Style -> (font, pen colour, background colour), each built once
+        self.fonts: dict[tuple, QtGui.QFont] = {}  ## (bold, faint, italic, underline, strike) -> font
+        self.parser = VTParser()
+        self.wrap = True
+        self.placeholder = ""
+        self.anchor: tuple[int, int] = None  ## (line number, column) where the mouse went down
+        self.selection: tuple[tuple[int, int], tuple[int, int]] = None  ## (line number, column) of both ends
+        self.rows: list[tuple[int, int, int, int]] = []  ## (line number, first column, last column, y) of the rows painted
+        self.pending: deque[bytes] = deque()  ## Data waiting for the next frame
+        self.pending_bytes = 0
+        self.frame_hz = DEFAULT_FRAME_HZ
+        self.frame_ms = DEFAULT_FRAME_MS
+        self.frame_timer = QtCore.QTimer(self)
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.setTimerType(QtCore.Qt.TimerType.PreciseTimer)
+        self.frame_timer.timeout.connect(self.render_frame)
+        self.setFocusPolicy(QtCore.Qt.FocusPolicy.StrongFocus)
+        self.viewport().setCursor(QtCore.Qt.CursorShape.IBeamCursor)
+        self.font_changed()
+
 
     def keyPressEvent(self, event:QtGui.QKeyEvent):
         #print(f"{event.key()} {type(event.key())}\n\t{event.text()} {type(event.text())}\n\t{event.modifiers()} {type(event.modifiers())}\n\t{event.nativeVirtualKey()} {type(event.nativeVirtualKey())}")
         k = event.key()
 
-        #print(self.textCursor().selectionStart(), self.textCursor().selectionEnd())   
-        if self.textCursor().selectionStart() != self.textCursor().selectionEnd():
-            super().keyPressEvent(event)
-            return 
+        if self.selection is not None:
+            if event.matches(QtGui.QKeySequence.StandardKey.Copy):
+                self.copy()
+            elif k == QtCore.Qt.Key.Key_Escape:
+                self.clear_selection()
+            return
         if k == QtCore.Qt.Key.Key_Escape:
             super().keyPressEvent(event)
-            return 
+            return
 
         if k in KEY_MODIFIERS:
             #char_pressed = KEY_MODIFIERS[k]
@@ -53,10 +98,10 @@ class TerminalWidget(QtWidgets.QPlainTextEdit):
         elif event.modifiers() == QtCore.Qt.KeyboardModifier.ControlModifier:
             #print("Control modifier")
             super().keyPressEvent(event)
-            return 
+            return
         else:
             super().keyPressEvent(event)
-            return 
+            return
 
         if (DEBUG_LEVEL & 0xF) > DEBUG_LEVEL_VERBOSE:
             dprint(f"[TERMINAL] Key Pressed: {char_pressed}", color = "yellow")
@@ -65,197 +110,451 @@ class TerminalWidget(QtWidgets.QPlainTextEdit):
 
 
     def set_text_color(self, color:QtGui.QColor):
-        self.fmt.setForeground(QtGui.QBrush(color))
-        self.setCurrentCharFormat(self.fmt)
+        self.text_style = Style(fg=color.getRgb())
 
     def add_text(self, text:str = "", color:QtGui.QColor = COLOR_WHITE):
-        self.fmt.setForeground(QtGui.QBrush(color))
+        self.flush(to_end=True)
         self.moveCursor(QtGui.QTextCursor.MoveOperation.End)
-        self.setCurrentCharFormat(self.fmt)
+        self.set_text_color(color)
         self.insertPlainText(text)
         vprint(text)
 
     def focusNextPrevChild(self, next):
         #print(f"focusNextPrevChild {next}")
-        return False 
-    
+        return False
+
     def set_background_color(self, color:QtGui.QColor):
         self.setStyleSheet(f"background-color: {color.name()};")
 
+    def set_compress(self, compress: bool):
+        """Compress full blocks of scrollback, from the next block on"""
+        self.buffer.store.compress = compress
+
+    def set_cr_mode(self, cr_mode: str):
+        """CR_NEWLINE: a lone CR ends the line, CR_RETURN: it goes back to the start of the line"""
+        self.buffer.cr_mode = cr_mode
+
+    def set_spill(self, capacity_mb: int, codec: str = "zlib"):
+        """Write lines dropped by the max line count to a temporary file of up to capacity_mb, 0 = forget them"""
+        self.buffer.store.set_spill(capacity_mb * 1_000_000, codec)
+        self.refresh()
+
     def evaluate_escape_sequence(self, escape_sequence:str):
+        """Apply one escape sequence, without the ESC, e.g. "[31m" """
         start_t = time.perf_counter_ns()
         if not escape_sequence:
-            return 0 
+            return 0
         if (DEBUG_LEVEL & 0xF) > DEBUG_LEVEL_VERBOSE:
             vprint(f"Evaluating escape sequence: {escape_sequence}", color = "cyan")
-        if escape_sequence.startswith("[") and escape_sequence.endswith("m"):
-            display_attributes = escape_sequence[1:-1].split(";")
-            
-            if not display_attributes[0]:
-                display_attributes = ['0']
-                #dprint("No display attributes", color = "red")
-            #dprint(f"display_attributes: {display_attributes}", color = "cyan")
-            for attribute in display_attributes:
-                if attribute == '0':
-                    #print(f"self.fmt {self.fmt.foreground().color().name()} default_fmt {self.default_fmt.foreground().color().name()}")
-                    self.clear_formatting()
-                elif attribute == '1':
-                    self.fmt.setFontWeight(QtGui.QFont.Weight.Bold)
-                elif attribute == '2':
-                    self.fmt.setFontWeight(QtGui.QFont.Weight.Light)
-                elif attribute == '4':
-                    self.fmt.setFontUnderline(True)
-                elif attribute == '5': ## Blink 
-                    pass 
-                elif attribute == '7': ## Reverse 
-                    pass 
-                    ##self.fmt.setForeground(QtGui.QBrush(COLOR_BLACK))
-                elif attribute == '8':
-                    self.fmt.setForeground(QtGui.QBrush(COLOR_BLACK))
-                elif len(attribute) == 2: 
-                    if attribute[1] in ESCAPE_COLORS:
-                        if attribute[0] == '3':
-                            self.fmt.setForeground(QtGui.QBrush(ESCAPE_COLORS[attribute[1]]))
-                        elif attribute[0] == '4':
-                            self.fmt.setBackground(QtGui.QBrush(ESCAPE_COLORS[attribute[1]]))
-            self.setCurrentCharFormat(self.fmt)
-            return time.perf_counter_ns() - start_t
-        if escape_sequence == "[J":
-            vprint("DELETE")
-            #self.moveCursor(QtGui.QTextCursor.MoveOperation.End)
-            self.textCursor().deletePreviousChar()
-            return time.perf_counter_ns() - start_t
-            #self.textCursor().deletePreviousChar()
-            #vprint(f"fmt: {self.fmt.foreground().color().name()} {self.fmt.background().color().name()}")
-                
-        
+        events = [event for event in self.parser.feed(b"\x1B" + escape_sequence.encode("utf-8")) if event[0] != EV_TEXT]
+        self.buffer.apply(events)
+        self.refresh()
+        return time.perf_counter_ns() - start_t
 
     def clear_formatting(self):
-        self.fmt.clearBackground()
-        self.fmt.clearForeground()
-        self.fmt.clearProperty(QtGui.QTextFormat.Property.FontWeight)
-        self.fmt.clearProperty(QtGui.QTextFormat.Property.FontItalic)
-        self.fmt.clearProperty(QtGui.QTextFormat.Property.FontUnderline)
-        self.fmt.clearProperty(QtGui.QTextFormat.Property.FontStrikeOut)
+        self.text_style = DEFAULT_STYLE
+
+    ###############################################################
+    ################ QPlainTextEdit compatibility #################
+    ###############################################################
+
+    def insertPlainText(self, text: str):
+        self.buffer.set_style(self.text_style)
+        self.buffer.write(text)
+        self.refresh()
+
+    def setPlainText(self, text: str):
+        self.clear()
+        if text:
+            self.insertPlainText(text)
+
+    def toPlainText(self) -> str:
+        return self.buffer.plain_text()
+
+    def clear(self):
+        self.buffer.clear()
+        self.selection = None
+        self.refresh()
+
+    def moveCursor(self, operation: QtGui.QTextCursor.MoveOperation):
+        if operation == QtGui.QTextCursor.MoveOperation.End:
+            self.buffer.to_end()
+
+    def ensureCursorVisible(self):
+        self.update_scrollbars()
+        self.verticalScrollBar().setValue(self.verticalScrollBar().maximum())
+
+    def setMaximumBlockCount(self, lines: int):
+        """Lines kept, 0 = all of them"""
+        self.buffer.store.set_max_lines(lines)
+        self.refresh()
+
+    def maximumBlockCount(self) -> int:
+        return self.buffer.store.max_lines
+
+    def setLineWrapMode(self, mode: QtWidgets.QPlainTextEdit.LineWrapMode):
+        self.wrap = mode != self.LineWrapMode.NoWrap
+        self.refresh()
+
+    def setPlaceholderText(self, text: str):
+        self.placeholder = text
+        self.viewport().update()
+
+    ###############################################################
+    ########################## FRAMES #############################
+    ###############################################################
 
     def put_chars(self, data: bytes):
-        start_t = time.perf_counter_ns() 
-
-        if not self.auto_scroll:
-            prev_bar_position = self.verticalScrollBar().value()
-        if not self.textCursor().atEnd():
-            cursor = self.textCursor()
-            now_pos = cursor.position()
-            cursor.movePosition(QtGui.QTextCursor.MoveOperation.End)
-            self.setTextCursor(cursor)
-        mct = time.perf_counter_ns() - start_t
-        insert_text_time = 0 
-        escape_seq_time = 0 
-
-        if not self.escape_sequence:
-            self.set_text_color(COLOR_WHITE)
+        """Queue data for the next frame. With frame_hz 0 it is drawn straight away."""
+        start_t = time.perf_counter_ns()
+        self.pending.append(data)
+        self.pending_bytes += len(data)
+        TERMINAL_BYTES.inc(len(data))
+        while self.pending_bytes > MAX_PENDING_BYTES and len(self.pending) > 1:  ## Drop oldest, the terminal cannot keep up
+            dropped = self.pending.popleft()
+            self.pending_bytes -= len(dropped)
+            DROPPED_BYTES.inc(len(dropped))
+        if self.frame_hz <= 0:
+            self.render_frame()
+        elif not self.frame_timer.isActive():
+            self.frame_timer.start(int(1000 / self.frame_hz))
+        PUT_CHARS_NS.record(time.perf_counter_ns() - start_t)
+
+    def set_frame_rate(self, frame_hz: float = DEFAULT_FRAME_HZ, frame_ms: float = DEFAULT_FRAME_MS):
+        """frame_hz 0 draws on every put_chars, frame_ms 0 draws all pending data in one frame"""
+        self.frame_hz = frame_hz
+        self.frame_ms = frame_ms
+        if frame_hz <= 0:
+            self.flush()
+
+    def flush(self, to_end: bool = False):
+        """Draw everything pending now. to_end before writing to the terminal some other way, which appends"""
+        self.frame_timer.stop()
+        while self.pending:
+            self.render_frame(budget=False)
+        if to_end:
+            self.buffer.to_end()
+
+    def discard(self):
+        self.frame_timer.stop()
+        self.pending.clear()
+        self.pending_bytes = 0
+        self.parser.reset()
+        self.buffer.to_end()
+
+    def take_pending(self, limit: int) -> bytes:
+        chunks = []
+        size = 0
+        while self.pending and size < limit:
+            chunk = self.pending.popleft()
+            chunks.append(chunk)
+            size += len(chunk)
+        self.pending_bytes -= size
+        return b"".join(chunks)
+
+    def render_frame(self, budget: bool = True):
+        """Parse pending data into the buffer and repaint once.
+
+        Data goes in FRAME_SLICE_BYTES at a time, after frame_ms the rest waits for the next frame.
+        Nothing is laid out here, paintEvent only looks at the lines on screen.
+        """
+        if not self.pending:
+            return
+        start_t = time.perf_counter_ns()
+        self.buffer.set_style(self.parser.style)
+        rendered = 0
+        while self.pending:
+            data = self.take_pending(FRAME_SLICE_BYTES)
+            self.insert_chars(data)
+            rendered += len(data)
+            if budget and self.frame_ms > 0 and time.perf_counter_ns() - start_t > self.frame_ms * 1_000_000:
+                break
+        if self.auto_scroll:
+            self.ensureCursorVisible()
+        self.refresh()
+        TERMINAL_LINES.set(len(self.buffer))
+        FRAME_NS.record(time.perf_counter_ns() - start_t)
+        FRAME_BYTES.record(rendered)
+        if self.pending and not self.frame_timer.isActive():
+            self.frame_timer.start(int(1000 / self.frame_hz) if self.frame_hz > 0 else 0)
 
+    def insert_chars(self, data: bytes):
+        """Add data to the buffer, through VTParser for UTF-8 or as text for the other formats"""
         if self.format != "UTF-8":
             if self.format == "Hex":
-                self.textCursor().insertText(data.hex())
-                return
+                text = data.hex()
             elif self.format == "Hex+Space":
-                self.textCursor().insertText(data.hex(" "))
-                return
+                text = data.hex(" ") + " "
             elif self.format == "Hex+Newline":
-                self.textCursor().insertText(data.hex("\n") + "\n")
-                return
+                text = data.hex("\n") + "\n"
             elif self.format == "Bin+Space":
                 ## Convert bytes to a string of 8 bit ints separated by spaces
-                self.textCursor().insertText(" ".join(f"{byte:08b}" for byte in data))
-                return
+                text = " ".join(f"{byte:08b}" for byte in data) + " "
             elif self.format == "Bin+Newline":
-                self.textCursor().insertText("\n".join(f"{byte:08b}" for byte in data) + "\n")
-                return
+                text = "\n".join(f"{byte:08b}" for byte in data) + "\n"
             elif self.format == "Int+Space":
-                self.textCursor().insertText(" ".join(f"{byte:d}" for byte in data))
-                return
+                text = " ".join(f"{byte:d}" for byte in data) + " "
             elif self.format == "Int+Newline":
-                self.textCursor().insertText("\n".join(f"{byte:d}" for byte in data) + "\n")
-                return
-
-        text_buffer = ""
-        if b"\x1B" in data or self.escape_sequence:
-            start_index = 1 
-            if self.escape_sequence:
-                data = self.escape_sequence + data
-                self.escape_sequence = None 
-                start_index = 0 
-                
-            chunks = data.split(b"\x1B")
-            if not self.escape_sequence:
-                self.insertPlainText(chunks[0].decode("utf-8", errors = "replace"))
-            
-            for chunk in chunks[start_index:]:
-                if (DEBUG_LEVEL & 0xF) > DEBUG_LEVEL_VERBOSE:
-                    vprint(f"chunk: {chunk}", color = "yellow")
-                if not chunk: continue 
-                split_index = 0
-                for i, byte in enumerate(chunk):
-                    if byte in ESCAPE_SEQUENCE_TERMINATORS:
-                        split_index = i + 1
-                        escape_seq_time += self.evaluate_escape_sequence(chunk[:split_index].decode("utf-8", errors = "replace"))
-                        break 
-                if not split_index: ## Escape sequence not terminated
-                    self.escape_sequence = chunk
-                    continue 
-
-                t = chunk[split_index:].decode("utf-8", errors = "replace")
-                text_buffer_start = time.perf_counter_ns()
-                
-                self.textCursor().insertText(t)
-                insert_text_time += time.perf_counter_ns() - text_buffer_start
-                if (DEBUG_LEVEL & 0xF) >= DEBUG_LEVEL_VERBOSE:
-                    vprint(t, end = "", flush = True)
-            # for byte in data:
-            #     c = chr(byte)
-            #     if self.escape_buffer is not None:
-            #         self.escape_buffer += c
-            #         if chr(byte) in ESCAPE_SEQUENCE_TERMINATORS:
-            #             if text_buffer:
-            #                 text_buffer_start = time.perf_counter_ns()
-            #                 self.textCursor().insertText(text_buffer)
-            #                 self.insertPlainText(text_buffer)
-            #                 insert_text_time += time.perf_counter_ns() - text_buffer_start
-
-            #                 if DEBUG_LEVEL > 1:
-            #                     vprint(text_buffer, end = "", flush = True)
-            #                 text_buffer = ""
-            #             self.evaluate_escape_sequence(self.escape_buffer)
-            #             self.escape_buffer = None
-            #         continue 
-            #     if byte == 27:
-            #         self.escape_buffer = ""
-            #         continue 
-            #     elif byte not in [7, 8]:
-            #         text_buffer += c
-        else: 
-            text_buffer = data.decode("utf-8", errors = "replace")
-            #text_buffer = text_buffer.replace("\x07", "").replace("\x08", "")
-        if text_buffer:
+                text = "\n".join(f"{byte:d}" for byte in data) + "\n"
+            else:
+                text = data.decode("utf-8", errors = "replace")
             insert_text_start = time.perf_counter_ns()
-            #self.moveCursor(QtGui.QTextCursor.MoveOperation.End)
-            self.textCursor().insertText(text_buffer)
-            insert_text_time += time.perf_counter_ns() - insert_text_start
-            if (DEBUG_LEVEL & 0xF) >= DEBUG_LEVEL_VERBOSE:
-                vprint(text_buffer, end = "", flush = True)
-            
-        if self.auto_scroll:
-            self.ensureCursorVisible()
-        else: 
-            self.verticalScrollBar().setValue(prev_bar_position)
-        
-
-        if DEBUG_LEVEL & 128:    
-            
-            
-            #vprint(f"insertPlainText {(time.perf_counter_ns() - insert_text_start) / 1000} us", color = 'green')
-            cprint(f"put_chars {(time.perf_counter_ns() - start_t) / 1000} us Insert: {insert_text_time / 1000} us Escape: {escape_seq_time / 1000} us mct {mct / 1000} us Len: {len(data)} Blocks: {self.blockCount()}", color = 'magenta')
-            
-            #vprint(f"data: {data}", color = 'yellow')
+            self.buffer.write(text)
+            INSERT_NS.record(time.perf_counter_ns() - insert_text_start)
+            return
+
+        parse_start = time.perf_counter_ns()
+        events = self.parser.feed(data)
+        PARSE_NS.record(time.perf_counter_ns() - parse_start)
+        if (DEBUG_LEVEL & 0xF) >= DEBUG_LEVEL_VERBOSE:
+            for event in events:
+                if event[0] == EV_TEXT:
+                    vprint(event[1], end = "", flush = True)
+        insert_start = time.perf_counter_ns()
+        self.buffer.apply(events)
+        INSERT_NS.record(time.perf_counter_ns() - insert_start)
+
+    ###############################################################
+    ########################## DRAWING ############################
+    ###############################################################
+
+    def refresh(self):
+        """Scroll range and repaint after the buffer changed. Stays at the bottom if it was there."""
+        bar = self.verticalScrollBar()
+        following = bar.value() >= bar.maximum()
+        self.update_scrollbars()
+        if following:
+            bar.setValue(bar.maximum())
+        self.viewport().update()
+
+    def update_scrollbars(self):
+        """One vertical step per line, the last page ends with the last line"""
+        page = self.page_rows()
+        bar = self.verticalScrollBar()
+        bar.setRange(0, max(0, len(self.buffer) - page))
+        bar.setPageStep(page)
+        hbar = self.horizontalScrollBar()
+        if self.wrap:
+            hbar.setRange(0, 0)
+        else:
+            width = max(self.buffer.width, len(self.buffer.text)) * self.char_w + 2 * TEXT_MARGIN
+            hbar.setRange(0, max(0, width - self.viewport().width()))
+            hbar.setPageStep(self.viewport().width())
+            hbar.setSingleStep(self.char_w)
+
+    def page_rows(self) -> int:
+        return max(1, self.viewport().height() // self.line_h)
+
+    def wrap_columns(self) -> int:
+        if not self.wrap:
+            return 0
+        return max(1, (self.viewport().width() - 2 * TEXT_MARGIN) // self.char_w)
+
+    def font_changed(self):
+        metrics = QtGui.QFontMetrics(self.font())
+        self.line_h = max(1, metrics.lineSpacing())
+        self.ascent = metrics.ascent()
+        self.char_w = max(1, metrics.horizontalAdvance("M"))
+        self.formats.clear()
+        self.fonts.clear()
+        self.refresh()
+
+    def changeEvent(self, event: QtCore.QEvent):
+        if event.type() == QtCore.QEvent.Type.FontChange:
+            self.font_changed()
+        super().changeEvent(event)
+
+    def resizeEvent(self, event: QtGui.QResizeEvent):
+        super().resizeEvent(event)
+        self.refresh()
+
+    def screen_rows(self) -> list[tuple[int, str, list, int, int]]:
+        """(line index, text, runs, first column, last column) of each row on screen, top down.
+        At the bottom of the scroll range the last line is at the bottom, anywhere else the line at the
+        scroll value is at the top."""
+        buffer = self.buffer
+        count = len(buffer)
+        rows_on_screen = self.page_rows() + 1
+        columns = self.wrap_columns()
+        bar = self.verticalScrollBar()
+        rows = []
+        if bar.value() >= bar.maximum():
+            index = count - 1
+            while index >= 0 and len(rows) < rows_on_screen:
+                rows[:0] = self.line_rows(index, columns)
+                index -= 1
+            return rows[-rows_on_screen:]
+        index = bar.value()
+        while index < count and len(rows) < rows_on_screen:
+            rows += self.line_rows(index, columns)
+            index += 1
+        return rows[:rows_on_screen]
+
+    def line_rows(self, index: int, columns: int) -> list[tuple[int, str, list, int, int]]:
+        text, runs = self.buffer.line(index)
+        if not columns or len(text) <= columns:
+            return [(index, text, runs, 0, len(text))]
+        return [(index, text, runs, first, min(first + columns, len(text))) for first in range(0, len(text), columns)]
+
+    def paintEvent(self, event: QtGui.QPaintEvent):
+        start_t = time.perf_counter_ns()
+        painter = QtGui.QPainter(self.viewport())
+        if len(self.buffer) == 1 and not self.buffer.text:
+            if self.placeholder:
+                painter.setPen(self.palette().color(QtGui.QPalette.ColorRole.PlaceholderText))
+                painter.drawText(self.viewport().rect().adjusted(TEXT_MARGIN, TEXT_MARGIN, 0, 0), 0, self.placeholder)
+            self.rows = []
+            return
+        rows = self.screen_rows()
+        bar = self.verticalScrollBar()
+        y = 0
+        if bar.value() >= bar.maximum() and len(rows) > self.page_rows():
+            y = self.viewport().height() - len(rows) * self.line_h  ## Bottom aligned, the top row may be cut
+        x0 = TEXT_MARGIN - self.horizontalScrollBar().value()
+        styles = self.buffer.store.styles
+        highlight = self.palette().color(QtGui.QPalette.ColorRole.Highlight)
+        first_line = self.buffer.first_line
+        self.rows = []
+        current = None  ## Format the painter has
+        for index, text, runs, first, last in rows:
+            number = first_line + index
+            self.rows.append((number, first, last, y))
+            for i, (start, style) in enumerate(runs):
+                end = runs[i + 1][0] if i + 1 < len(runs) else len(text)
+                start, end = max(start, first), min(end, last)
+                if start >= end:
+                    continue
+                fmt = self.style_format(styles[style])
+                x = x0 + (start - first) * self.char_w
+                if fmt[2] is not None:
+                    painter.fillRect(x, y, (end - start) * self.char_w, self.line_h, fmt[2])
+                if fmt is not current:
+                    painter.setFont(fmt[0])
+                    painter.setPen(fmt[1])
+                    current = fmt
+                painter.drawText(x, y + self.ascent, text[start:end])
+            selected = self.selected_columns(number, first, last)
+            if selected is not None:
+                painter.fillRect(x0 + (selected[0] - first) * self.char_w, y, (selected[1] - selected[0]) * self.char_w, self.line_h, highlight)
+                painter.setFont(self.font())
+                painter.setPen(self.palette().color(QtGui.QPalette.ColorRole.HighlightedText))
+                painter.drawText(x0 + (selected[0] - first) * self.char_w, y + self.ascent, text[selected[0] : min(selected[1], len(text))])
+                current = None
+            if self.hasFocus() and index == len(self.buffer) - 1 and first <= self.buffer.col <= last:
+                painter.fillRect(x0 + (self.buffer.col - first) * self.char_w, y, 2, self.line_h, COLOR_WHITE)
+            y += self.line_h
+        PAINT_NS.record(time.perf_counter_ns() - start_t)
+
+    def style_format(self, style: Style) -> tuple:
+        fmt = self.formats.get(style)
+        if fmt is not None:
+            FORMAT_HITS.inc()
+            return fmt
+        FORMAT_MISSES.inc()
+        if len(self.formats) >= FORMAT_CACHE_SIZE:
+            self.formats.clear()
+        fmt = self.formats[style] = self.build_format(style)
+        return fmt
+
+    def build_format(self, style: Style) -> tuple:
+        """(font, pen colour, background colour or None) to draw a style with"""
+        fg = self.style_color(style.fg) or COLOR_WHITE
+        bg = self.style_color(style.bg)
+        if style.reverse:
+            fg, bg = bg or COLOR_BLACK, fg
+        if style.hidden:
+            fg = bg or COLOR_BLACK
+        return self.style_font(style), fg, bg
+
+    def style_font(self, style: Style) -> QtGui.QFont:
+        key = (style.bold, style.faint, style.italic, style.underline, style.strike)
+        font = self.fonts.get(key)
+        if font is None:
+            font = self.fonts[key] = QtGui.QFont(self.font())
+            if style.bold:
+                font.setWeight(QtGui.QFont.Weight.Bold)
+            elif style.faint:
+                font.setWeight(QtGui.QFont.Weight.Light)
+            font.setItalic(bool(style.italic))
+            font.setUnderline(bool(style.underline))
+            font.setStrikeOut(bool(style.strike))
+        return font
+
+    def style_color(self, color: int | tuple | None) -> QtGui.QColor | None:
+        if color is None:
+            return None
+        if isinstance(color, tuple):
+            return QtGui.QColor(*color)
+        if color < 8:
+            return ESCAPE_COLORS[str(color)]
+        return QtGui.QColor(*palette_rgb(color))
+
+    ###############################################################
+    ######################### SELECTION ###########################
+    ###############################################################
+
+    def cell_at(self, pos: QtCore.QPoint) -> tuple[int, int]:
+        """(line number, column) under a point of the viewport"""
+        if not self.rows:
+            return (self.buffer.first_line, 0)
+        row = self.rows[0] if pos.y() < self.rows[0][3] else self.rows[-1]
+        for candidate in self.rows:
+            if candidate[3] <= pos.y() < candidate[3] + self.line_h:
+                row = candidate
+                break
+        number, first, last, y = row
+        x = pos.x() - TEXT_MARGIN + self.horizontalScrollBar().value()
+        return (number, first + min(max(0, round(x / self.char_w)), last - first))
+
+    def selected_columns(self, number: int, first: int, last: int) -> tuple[int, int] | None:
+        """Columns of a row that are selected, None if none are"""
+        if self.selection is None:
+            return None
+        (start_line, start_col), (end_line, end_col) = sorted(self.selection)
+        if not start_line <= number <= end_line:
+            return None
+        start = max(first, start_col if number == start_line else 0)
+        end = min(last, end_col if number == end_line else last)
+        return (start, end) if start < end else None
+
+    def selected_text(self) -> str:
+        if self.selection is None:
+            return ""
+        first, last = sorted(self.selection)
+        return self.buffer.plain_text(first, last)
+
+    def copy(self):
+        if self.selection is not None:
+            QtWidgets.QApplication.clipboard().setText(self.selected_text())
+
+    def select_all(self):
+        last = self.buffer.first_line + len(self.buffer) - 1
+        self.selection = ((self.buffer.first_line, 0), (last, len(self.buffer.text)))
+        self.viewport().update()
+
+    def clear_selection(self):
+        self.selection = None
+        self.viewport().update()
+
+    def mousePressEvent(self, event: QtGui.QMouseEvent):
+        if event.button() == QtCore.Qt.MouseButton.LeftButton:
+            self.anchor = self.cell_at(event.position().toPoint())
+            self.clear_selection()
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event: QtGui.QMouseEvent):
+        if self.anchor is not None and event.buttons() & QtCore.Qt.MouseButton.LeftButton:
+            cell = self.cell_at(event.position().toPoint())
+            self.selection = (self.anchor, cell) if cell != self.anchor else None
+            self.viewport().update()
+
+    def mouseReleaseEvent(self, event: QtGui.QMouseEvent):
+        self.anchor = None
+        super().mouseReleaseEvent(event)
 
+    def contextMenuEvent(self, event: QtGui.QContextMenuEvent):
+        menu = QtWidgets.QMenu(self)
+        copy = menu.addAction("Copy", self.copy)
+        copy.setEnabled(self.selection is not None)
+        menu.addAction("Select All", self.select_all)
+        menu.exec(event.globalPos())
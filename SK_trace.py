@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import threading
+import contextlib
+
+MAX_TRACE_EVENTS = 1_000_000  ## Events kept per trace, later ones are counted and dropped
+NULL_SPAN = contextlib.nullcontext()
+
+
+class Span:
+    def __init__(self, tracer, name: str, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.complete(self.name, self.start_ns, time.perf_counter_ns(), **self.args)
+        return False
+
+
+class Tracer:
+    """Collects spans as Chrome / Perfetto trace events (chrome://tracing, ui.perfetto.dev).
+
+    Batches are sampled by the read time of their first byte, so the reader thread and the GUI thread
+    make the same decision without passing anything along: 1 in sample_every batches is traced.
+    While stopped, callers only pay for the `TRACER.active` check.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.sample_every = 1
+        self.path: str = None
+        self.events: list[dict] = []
+        self.dropped = 0
+        self.threads: set[int] = set()
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.next_id = 0
+
+    def start(self, path: str, sample_every: int = 1):
+        with self.lock:
+            self.path = path
+            self.sample_every = max(1, int(sample_every))
+            self.events = []
+            self.dropped = 0
+            self.threads = set()
+            self.active = True
+
+    def stop(self, path: str = None) -> str:
+        """Stop tracing and write the trace file. Returns its path."""
+        with self.lock:
+            self.active = False
+            path = path or self.path
+            events, self.events = self.events, []
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"sample_every": self.sample_every, "dropped_events": self.dropped}}, file)
+        return path
+
+    def sampled(self, stamp: tuple[int, int]) -> bool:
+        return self.active and stamp is not None and (self.sample_every == 1 or (stamp[0] // 1000) % self.sample_every == 0)
+
+    def add(self, event: dict):
+        if len(self.events) >= MAX_TRACE_EVENTS:
+            self.dropped += 1
+            return
+        tid = threading.get_native_id()
+        if tid not in self.threads:
+            self.threads.add(tid)
+            self.events.append({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": threading.current_thread().name}})
+        event["pid"] = self.pid
+        event["tid"] = tid
+        self.events.append(event)
+
+    def complete(self, name: str, start_ns: int, end_ns: int, **args):
+        """A span on the calling thread from start_ns to end_ns (perf_counter_ns)"""
+        self.add({"name": name, "ph": "X", "ts": start_ns / 1000, "dur": (end_ns - start_ns) / 1000, "args": args})
+
+    def interval(self, name: str, start_ns: int, end_ns: int, **args):
+        """A span that crosses threads, ie. from the port read to the GUI. Drawn as an async slice."""
+        self.next_id += 1
+        self.add({"name": name, "cat": "latency", "ph": "b", "id": self.next_id, "ts": start_ns / 1000, "args": args})
+        self.add({"name": name, "cat": "latency", "ph": "e", "id": self.next_id, "ts": end_ns / 1000})
+
+    def span(self, name: str, traced: bool = True, **args) -> Span | contextlib.nullcontext:
+        """with TRACER.span("name", traced): ... records a span if traced"""
+        return Span(self, name, args) if traced and self.active else NULL_SPAN
+
+    def summary(self) -> str:
+        if not self.active:
+            return "Tracing is off"
+        return f"Tracing to {self.path}: {len(self.events)} events, 1 in {self.sample_every} batches, {self.dropped} dropped"
+
+
+TRACER = Tracer()
@@ -0,0 +1,300 @@
+import os
+import abc
+import time
+import select
+import struct
+import socket
+import threading
+import urllib.parse
+import serial
+
+from SK_common import *
+
+if os.name != "nt":
+    import fcntl
+    import termios
+    import pty
+    import tty
+
+TRANSPORT_SCHEMES = ("tcp", "pty", "file")
+
+
+class Transport(abc.ABC):
+    """The part of the serial.Serial interface SerialWorker and SerialSession use.
+
+    Line settings (baudrate, parity, rtscts...) are plain attributes that a backend may ignore.
+    Backends expose a file descriptor so the block reader and the asyncio engine can select() on it.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.port = url
+        self.fd = None
+        self.timeout = None
+        self.baudrate = 9600
+        self.parity = serial.PARITY_NONE
+        self.rtscts = False
+        self.xonxoff = False
+        self.dsrdtr = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.fd is not None
+
+    def fileno(self) -> int:
+        return self.fd
+
+    @property
+    def in_waiting(self) -> int:
+        return struct.unpack("I", fcntl.ioctl(self.fd, termios.FIONREAD, b"\x00\x00\x00\x00"))[0]
+
+    def readinto(self, view: memoryview) -> int:
+        """Read up to len(view) bytes, waiting at most self.timeout for the first one"""
+        if self.timeout is not None:
+            ready, _, _ = select.select([self.fd], [], [], self.timeout)
+            if not ready:
+                return 0
+        return os.readv(self.fd, [view])
+
+    def write(self, data: bytes) -> int:
+        return os.write(self.fd, data)
+
+    def flush(self):
+        pass
+
+    def cancel_read(self):
+        pass
+
+    def cancel_write(self):
+        pass
+
+    def set_low_latency_mode(self, enabled: bool):
+        pass
+
+    @abc.abstractmethod
+    def open(self):
+        """Connect to url and set fd"""
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class TcpTransport(Transport):
+    """Raw TCP stream, ie. a ser2net port or a device simulator. tcp://host:port"""
+
+    sock: socket.socket = None
+
+    def open(self):
+        if self.sock is not None:
+            return
+        address = urllib.parse.urlsplit(self.url)
+        self.sock = socket.create_connection((address.hostname, address.port), timeout=5)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.settimeout(None)
+        self.fd = self.sock.fileno()
+
+    def write(self, data: bytes) -> int:
+        self.sock.sendall(data)
+        return len(data)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = None
+        self.fd = None
+
+
+class PtyTransport(Transport):
+    """A new pty pair. SK reads the master side, a simulator opens the path printed on connect. pty://[label]"""
+
+    slave_fd: int = None
+    slave_path: str = None
+
+    def open(self):
+        if self.fd is not None:
+            return
+        self.fd, self.slave_fd = pty.openpty()
+        tty.setraw(self.slave_fd)  ## No echo or newline translation for the simulator
+        self.slave_path = os.ttyname(self.slave_fd)
+
+    def close(self):
+        super().close()
+        if self.slave_fd is not None:
+            os.close(self.slave_fd)
+        self.slave_fd = None
+
+
+class FileReplayTransport(Transport):
+    """Plays a recorded file back as if a device sent it. file://<path>[?speed=max][&loop=1]
+
+    Data is paced at baudrate / 10 bytes per second unless speed=max. A feeder thread writes it
+    into a pipe, so backpressure from a slow reader throttles the replay. Writes are discarded.
+    """
+
+    feeder: threading.Thread = None
+
+    def __init__(self, url: str):
+        super().__init__(url)
+        address = urllib.parse.urlsplit(url)
+        self.path = urllib.parse.unquote(address.netloc + address.path)
+        query = urllib.parse.parse_qs(address.query)
+        self.max_speed = query.get("speed", [""])[0] == "max"
+        self.loop = query.get("loop", ["0"])[0] not in ("0", "")
+        self.write_fd = None
+        self.active = False
+        self.bytes_replayed = 0
+
+    def open(self):
+        if self.fd is not None:
+            return
+        if not os.path.isfile(self.path):
+            raise FileNotFoundError(f"Replay file not found: {self.path}")
+        self.fd, self.write_fd = os.pipe()
+        self.active = True
+        self.feeder = threading.Thread(target=self.feed, name="SK-file-replay", daemon=True)
+        self.feeder.start()
+
+    def feed(self):
+        chunk_size = 4096 if self.max_speed else max(1, self.baudrate // 100)  ## 10 ms of data per write
+        start_t = time.perf_counter()
+        try:
+            while self.active:
+                with open(self.path, "rb") as file:
+                    while self.active and (chunk := file.read(chunk_size)):
+                        os.write(self.write_fd, chunk)
+                        self.bytes_replayed += len(chunk)
+                        if not self.max_speed:
+                            delay = start_t + self.bytes_replayed * 10 / self.baudrate - time.perf_counter()
+                            if delay > 0:
+                                time.sleep(delay)
+                if not self.loop:
+                    break
+        except OSError:
+            pass  ## Pipe closed while writing
+        dprint(f"Replay of {self.path} done: {self.bytes_replayed} bytes in {time.perf_counter() - start_t:.3f}s", color="yellow")
+
+    def write(self, data: bytes) -> int:
+        return len(data)
+
+    def close(self):
+        self.active = False
+        super().close()  ## Closing the read end first fails a blocked write in the feeder with EPIPE
+        if self.feeder is not None:
+            self.feeder.join(1.0)
+        if self.write_fd is not None:
+            os.close(self.write_fd)
+            self.write_fd = None
+
+
+def is_transport_url(device: str) -> bool:
+    return isinstance(device, str) and device.split("://")[0] in TRANSPORT_SCHEMES and "://" in device
+
+
+def create_transport(device: str) -> serial.Serial | Transport:
+    """serial.Serial for device paths, a Transport backend for tcp://, pty:// and file:// URLs"""
+    if not is_transport_url(device):
+        return serial.Serial()
+    if os.name == "nt":
+        raise serial.SerialException(f"{device}: transports other than serial ports need POSIX")
+    scheme = device.split("://")[0]
+    if scheme == "tcp":
+        return TcpTransport(device)
+    if scheme == "pty":
+        return PtyTransport(device)
+    return FileReplayTransport(device)
+
+
+###############################################################
+######################## BENCHMARKS ###########################
+###############################################################
+
+
+def benchmark_transports(total_bytes: int = 32 << 20, line: bytes = b"T:12.345 V:3.300 I:0.125\r\n"):
+    """End-to-end throughput of each backend through SerialWorker, framing and the RX queue (POSIX only).
+
+    A sender pushes total_bytes of lines as fast as the backend accepts them.
+    Returns {scheme: {"MB_per_s": ..., "lines_per_s": ..., "seconds": ...}}
+    """
+    import tempfile
+    from PyQt6.QtCore import Qt
+    from SK_serial_worker import SerialWorker
+
+    payload = line * (total_bytes // len(line))
+    results = {}
+    for scheme in TRANSPORT_SCHEMES:
+        sender = None
+        temp_path = None
+        if scheme == "tcp":
+            server = socket.create_server(("127.0.0.1", 0))
+            transport = TcpTransport(f"tcp://127.0.0.1:{server.getsockname()[1]}")
+
+            def send():
+                connection, _ = server.accept()
+                connection.sendall(payload)
+                time.sleep(1.0)  ## Keep the connection up until the reader is done
+                connection.close()
+                server.close()
+
+            sender = threading.Thread(target=send, daemon=True)
+            sender.start()
+        elif scheme == "pty":
+            transport = PtyTransport("pty://bench")
+        else:
+            with tempfile.NamedTemporaryFile(suffix=".bin", delete=False) as file:
+                file.write(payload)
+                temp_path = file.name
+            transport = FileReplayTransport(f"file://{temp_path}?speed=max")
+
+        received = [0, 0]
+        done = threading.Event()
+        worker = None
+
+        def on_ready():
+            for raw, lines, display, raw_stamp, stamps in worker.queue.drain():
+                received[0] += len(raw)
+                received[1] += len(lines)
+            if received[0] >= len(payload):
+                done.set()
+
+        start_t = time.perf_counter()
+        transport.open()
+        worker = SerialWorker(transport)
+        worker.ready.connect(on_ready, Qt.ConnectionType.DirectConnection)
+        reader = threading.Thread(target=worker.run, daemon=True)
+        reader.start()
+        if scheme == "pty":
+
+            def send():
+                fd = os.open(transport.slave_path, os.O_WRONLY)
+                view = memoryview(payload)
+                while len(view):
+                    view = view[os.write(fd, view[:4096]) :]
+                os.close(fd)
+
+            sender = threading.Thread(target=send, daemon=True)
+            sender.start()
+
+        done.wait(60)
+        elapsed = time.perf_counter() - start_t
+        worker.stop()
+        reader.join(1.0)
+        transport.close()
+        if temp_path:
+            os.remove(temp_path)
+
+        results[scheme] = {
+            "MB_per_s": round(received[0] / elapsed / 1e6, 1),
+            "lines_per_s": round(received[1] / elapsed),
+            "seconds": round(elapsed, 3),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--bench" in sys.argv:
+        for scheme, result in benchmark_transports().items():
+            print(f"{scheme:<5} {result}")
@@ -0,0 +1,139 @@
+import time
+import threading
+import traceback
+import collections
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from SK_common import *
+from SK_serial_worker import WAKE_INTERVAL
+from SK_capture import CaptureWriter, DIR_TX
+from SK_metrics import METRICS
+from SK_profiler import PROFILER
+
+DEFAULT_TX_QUEUE_BYTES = 1 << 20  ## Most unsent bytes before serial_send refuses new data
+TX_CHUNK = 4096  ## Most bytes merged into one write when pacing is off
+CTS_TIMEOUT = 5.0  ## Seconds to wait for CTS before writing anyway
+RATE_WINDOW = 1.0  ## Seconds per window of the bytes/s in summary(), it averages the last one or two
+WRITE_NS = METRICS.histogram("tx.write_ns")
+QUEUE_NS = METRICS.histogram("tx.queue_ns")  ## Time a send waits in the queue
+TX_BYTES = METRICS.counter("tx.bytes", "B")
+TX_QUEUE_BYTES = METRICS.gauge("tx.queue_bytes", "B")
+
+
+class TxWriter(QObject):
+    """Writes queued messages to the port on its own thread, so the GUI never waits on the port.
+
+    Without pacing, queued messages are merged into writes of up to TX_CHUNK bytes and nothing is flushed.
+    With pacing, each message (a send) is written on its own, optionally byte by byte, with the delays
+    in between. If rtscts is on, the writer waits for CTS before each paced write. XON/XOFF is done by the OS driver.
+    """
+
+    error = pyqtSignal(str)
+    capture: CaptureWriter = None  ## Set by SerialSession while a capture is running
+
+    def __init__(self, ser, *args, max_bytes: int = DEFAULT_TX_QUEUE_BYTES, byte_delay_ms: float = 0, line_delay_ms: float = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ser = ser
+        self.active = True
+        self.max_bytes = max(1, max_bytes)
+        self.byte_delay = max(0, byte_delay_ms) / 1000
+        self.line_delay = max(0, line_delay_ms) / 1000
+        self.messages = collections.deque()  ## (data, perf_counter when queued)
+        self.size = 0
+        self.condition = threading.Condition()
+        self.stats = {"messages": 0, "bytes": 0, "writes": 0, "rejected": 0, "latency_s": 0.0, "latency_max_s": 0.0}
+        self.rate_start = self.rate_window = (0, time.perf_counter())  ## (bytes, time) at the start of the previous / current window
+
+    def put(self, data: bytes) -> bool:
+        """Queue data for sending. Returns False (and drops it) if the queue is full."""
+        with self.condition:
+            if self.size + len(data) > self.max_bytes:
+                self.stats["rejected"] += 1
+                return False
+            self.messages.append((data, time.perf_counter()))
+            self.size += len(data)
+            TX_QUEUE_BYTES.set(self.size)
+            self.condition.notify()
+        return True
+
+    def take(self) -> list[bytes]:
+        """Pop the next write's worth of messages. Call with self.condition held."""
+        paced = self.byte_delay or self.line_delay
+        batch = []
+        total = 0
+        now = time.perf_counter()
+        while self.messages and (not batch or (not paced and total + len(self.messages[0][0]) <= TX_CHUNK)):
+            data, queued_t = self.messages.popleft()
+            batch.append(data)
+            total += len(data)
+            self.size -= len(data)
+            self.stats["messages"] += 1
+            self.stats["latency_s"] += now - queued_t
+            self.stats["latency_max_s"] = max(self.stats["latency_max_s"], now - queued_t)
+            QUEUE_NS.record((now - queued_t) * 1e9)
+        TX_QUEUE_BYTES.set(self.size)
+        return batch
+
+    def run(self):
+        try:
+            while self.active:
+                with self.condition:
+                    while self.active and not self.messages:
+                        self.condition.wait(WAKE_INTERVAL)
+                    if not self.active:
+                        break
+                    batch = self.take()
+                PROFILER.poll()
+                if self.byte_delay or self.line_delay:
+                    self.write_paced(batch[0])
+                else:
+                    self.write(b"".join(batch))
+        except Exception as E:
+            eprint(f"TX Writer Error: {traceback.format_exc()}\n", color="red")
+            self.error.emit(str(E))
+            self.active = False
+
+    def write(self, data: bytes):
+        start_t = time.perf_counter_ns()
+        self.ser.write(data)
+        WRITE_NS.record(time.perf_counter_ns() - start_t)
+        TX_BYTES.inc(len(data))
+        if self.capture is not None:
+            self.capture.write(DIR_TX, time.time_ns(), data)
+        self.stats["bytes"] += len(data)
+        self.stats["writes"] += 1
+        now = time.perf_counter()
+        if now - self.rate_window[1] >= RATE_WINDOW:
+            self.rate_start = self.rate_window
+            self.rate_window = (self.stats["bytes"], now)
+
+    def write_paced(self, data: bytes):
+        if self.byte_delay:
+            for index in range(len(data)):
+                if not self.active:
+                    return
+                self.wait_clear_to_send()
+                self.write(data[index : index + 1])
+                time.sleep(self.byte_delay)
+        else:
+            self.wait_clear_to_send()
+            self.write(data)
+        time.sleep(self.line_delay)
+
+    def wait_clear_to_send(self):
+        if not self.ser.rtscts or not hasattr(self.ser, "cts"):
+            return
+        start_t = time.perf_counter()
+        while self.active and not self.ser.cts and time.perf_counter() - start_t < CTS_TIMEOUT:
+            time.sleep(0.001)
+
+    def stop(self):
+        self.active = False
+        with self.condition:
+            self.condition.notify_all()
+
+    def summary(self) -> str:
+        start_bytes, start_t = self.rate_start
+        rate = (self.stats["bytes"] - start_bytes) / max(time.perf_counter() - start_t, 1e-6)
+        latency = self.stats["latency_s"] / max(self.stats["messages"], 1)
+        return f"TX Q: {self.size}B {rate / 1000:.1f}kB/s lat: {latency * 1000:.1f}ms (max {self.stats['latency_max_s'] * 1000:.0f}ms)"
@@ -0,0 +1,449 @@
+import re
+import time
+import codecs
+from typing import NamedTuple
+
+## States, after Paul Williams' DEC compatible parser (vt100.net/emu/dec_ansi_parser)
+GROUND = 0
+ESCAPE = 1
+ESCAPE_INTERMEDIATE = 2
+CSI_ENTRY = 3
+CSI_PARAM = 4
+CSI_INTERMEDIATE = 5
+CSI_IGNORE = 6
+DCS_ENTRY = 7
+DCS_PARAM = 8
+DCS_INTERMEDIATE = 9
+DCS_PASSTHROUGH = 10
+DCS_IGNORE = 11
+OSC_STRING = 12
+SOS_PM_APC_STRING = 13
+STATE_COUNT = 14
+
+## Actions
+IGNORE = 0
+PRINT = 1
+EXECUTE = 2
+COLLECT = 3
+PARAM = 4
+ESC_DISPATCH = 5
+CSI_DISPATCH = 6
+PUT = 7  ## DCS payloads (hook/put/unhook) are not used by the terminal and are dropped
+OSC_PUT = 8
+
+## Events returned by VTParser.feed()
+EV_TEXT = 0  ## (EV_TEXT, text). Keeps LF, TAB and CR LF, everything else from C0 is an EV_CONTROL
+EV_STYLE = 1  ## (EV_STYLE, Style) the style of the text that follows
+EV_CONTROL = 2  ## (EV_CONTROL, char) CR on its own, BS, BEL ...
+EV_CSI = 3  ## (EV_CSI, final, params, intermediates) every CSI but SGR. Empty params are 0
+EV_ESC = 4  ## (EV_ESC, final, intermediates)
+EV_OSC = 5  ## (EV_OSC, text) e.g. "0;window title"
+
+MAX_PARAMS = 32  ## Further parameters are ignored
+MAX_OSC_LENGTH = 4096
+CACHE_SIZE = 4096  ## Parsed SGR / CSI parameter strings kept, devices repeat the same few
+
+## A text run in GROUND: everything but C0 and DEL, except LF, TAB and CR LF. Bytes from 0x80 are UTF-8, not C1 controls
+TEXT_RUN = re.compile(rb"[^\x00-\x08\x0b-\x1f\x7f]*(?:\r\n[^\x00-\x08\x0b-\x1f\x7f]*)*")
+TEXT_BYTES = bytes(range(0x20, 0x7F)) + bytes(range(0x80, 0x100)) + b"\t\n"
+## Complete sequences that feed() dispatches directly, anything else goes through the table
+CSI_SEQUENCE = re.compile(rb"\x1b\[([<=>?]?)([0-9:;]*)([\x20-\x2f]*)([\x40-\x7e])")
+OSC_SEQUENCE = re.compile(rb"\x1b\]([\x20-\xff]*)(?:\x07|\x1b\\)")
+
+
+class Style(NamedTuple):
+    """SGR state. Colours are None (default), a palette index 0-255 or an (r, g, b) tuple"""
+
+    fg: int | tuple | None = None
+    bg: int | tuple | None = None
+    bold: bool = False
+    faint: bool = False
+    italic: bool = False
+    underline: bool = False
+    blink: bool = False
+    reverse: bool = False
+    hidden: bool = False
+    strike: bool = False
+
+
+DEFAULT_STYLE = Style()
+
+## SGR code -> (Style field, value), for the codes that only set one field
+SGR_FIELDS = {
+    1: ("bold", True), 2: ("faint", True), 3: ("italic", True), 4: ("underline", True), 5: ("blink", True), 6: ("blink", True),
+    7: ("reverse", True), 8: ("hidden", True), 9: ("strike", True), 21: ("underline", True), 23: ("italic", False),
+    24: ("underline", False), 25: ("blink", False), 27: ("reverse", False), 28: ("hidden", False), 29: ("strike", False),
+    39: ("fg", None), 49: ("bg", None),
+}  # fmt: skip
+STYLE_INDEX = {name: i for i, name in enumerate(Style._fields)}
+SGR_CACHE: dict[tuple[Style, bytes], Style] = {}  ## (style, SGR params) -> style after
+PARAM_CACHE: dict[bytes, tuple] = {}  ## CSI params -> EV_CSI params
+
+
+def build_table() -> list[list[tuple[int, int]]]:
+    """table[state][byte] = (action, next state or None to stay)"""
+    table = [[(IGNORE, None)] * 256 for i in range(STATE_COUNT)]
+
+    def add(state: int, first: int, last: int, action: int, next_state: int = None):
+        for byte in range(first, last + 1):
+            table[state][byte] = (action, next_state)
+
+    def add_c0(state: int, action: int):
+        add(state, 0x00, 0x17, action)
+        add(state, 0x19, 0x19, action)
+        add(state, 0x1C, 0x1F, action)
+
+    add_c0(GROUND, EXECUTE)
+    add(GROUND, 0x20, 0x7E, PRINT)
+    add(GROUND, 0x80, 0xFF, PRINT)
+
+    add_c0(ESCAPE, EXECUTE)
+    add(ESCAPE, 0x20, 0x2F, COLLECT, ESCAPE_INTERMEDIATE)
+    add(ESCAPE, 0x30, 0x7E, ESC_DISPATCH, GROUND)
+    add(ESCAPE, 0x5B, 0x5B, IGNORE, CSI_ENTRY)
+    add(ESCAPE, 0x5D, 0x5D, IGNORE, OSC_STRING)
+    add(ESCAPE, 0x50, 0x50, IGNORE, DCS_ENTRY)
+    for byte in (0x58, 0x5E, 0x5F):
+        add(ESCAPE, byte, byte, IGNORE, SOS_PM_APC_STRING)
+
+    add_c0(ESCAPE_INTERMEDIATE, EXECUTE)
+    add(ESCAPE_INTERMEDIATE, 0x20, 0x2F, COLLECT)
+    add(ESCAPE_INTERMEDIATE, 0x30, 0x7E, ESC_DISPATCH, GROUND)
+
+    ## ':' is a parameter here (38:2::r:g:b), Williams sends it to CSI_IGNORE
+    add_c0(CSI_ENTRY, EXECUTE)
+    add(CSI_ENTRY, 0x20, 0x2F, COLLECT, CSI_INTERMEDIATE)
+    add(CSI_ENTRY, 0x30, 0x3B, PARAM, CSI_PARAM)
+    add(CSI_ENTRY, 0x3C, 0x3F, COLLECT, CSI_PARAM)  ## Private marker, e.g. ? in ?25h
+    add(CSI_ENTRY, 0x40, 0x7E, CSI_DISPATCH, GROUND)
+
+    add_c0(CSI_PARAM, EXECUTE)
+    add(CSI_PARAM, 0x30, 0x3B, PARAM)
+    add(CSI_PARAM, 0x3C, 0x3F, IGNORE, CSI_IGNORE)
+    add(CSI_PARAM, 0x20, 0x2F, COLLECT, CSI_INTERMEDIATE)
+    add(CSI_PARAM, 0x40, 0x7E, CSI_DISPATCH, GROUND)
+
+    add_c0(CSI_INTERMEDIATE, EXECUTE)
+    add(CSI_INTERMEDIATE, 0x20, 0x2F, COLLECT)
+    add(CSI_INTERMEDIATE, 0x30, 0x3F, IGNORE, CSI_IGNORE)
+    add(CSI_INTERMEDIATE, 0x40, 0x7E, CSI_DISPATCH, GROUND)
+
+    add_c0(CSI_IGNORE, EXECUTE)
+    add(CSI_IGNORE, 0x40, 0x7E, IGNORE, GROUND)
+
+    add(DCS_ENTRY, 0x20, 0x2F, COLLECT, DCS_INTERMEDIATE)
+    add(DCS_ENTRY, 0x30, 0x3B, PARAM, DCS_PARAM)
+    add(DCS_ENTRY, 0x3A, 0x3A, IGNORE, DCS_IGNORE)
+    add(DCS_ENTRY, 0x3C, 0x3F, COLLECT, DCS_PARAM)
+    add(DCS_ENTRY, 0x40, 0x7E, IGNORE, DCS_PASSTHROUGH)
+
+    add(DCS_PARAM, 0x30, 0x39, PARAM)
+    add(DCS_PARAM, 0x3B, 0x3B, PARAM)
+    add(DCS_PARAM, 0x3A, 0x3A, IGNORE, DCS_IGNORE)
+    add(DCS_PARAM, 0x3C, 0x3F, IGNORE, DCS_IGNORE)
+    add(DCS_PARAM, 0x20, 0x2F, COLLECT, DCS_INTERMEDIATE)
+    add(DCS_PARAM, 0x40, 0x7E, IGNORE, DCS_PASSTHROUGH)
+
+    add(DCS_INTERMEDIATE, 0x20, 0x2F, COLLECT)
+    add(DCS_INTERMEDIATE, 0x30, 0x3F, IGNORE, DCS_IGNORE)
+    add(DCS_INTERMEDIATE, 0x40, 0x7E, IGNORE, DCS_PASSTHROUGH)
+
+    add_c0(DCS_PASSTHROUGH, PUT)
+    add(DCS_PASSTHROUGH, 0x20, 0x7E, PUT)
+
+    add(OSC_STRING, 0x20, 0x7F, OSC_PUT)
+    add(OSC_STRING, 0x80, 0xFF, OSC_PUT)  ## UTF-8 titles
+    add(OSC_STRING, 0x07, 0x07, IGNORE, GROUND)  ## BEL ends an OSC in xterm, ST (ESC \) does everywhere
+
+    ## Anywhere: CAN and SUB abort a sequence, ESC starts a new one
+    for state in range(STATE_COUNT):
+        table[state][0x18] = (EXECUTE, GROUND)
+        table[state][0x1A] = (EXECUTE, GROUND)
+        table[state][0x1B] = (IGNORE, ESCAPE)
+    return table
+
+
+TABLE = build_table()
+
+
+def palette_rgb(index: int) -> tuple[int, int, int]:
+    """xterm 256 colour palette"""
+    if index < 16:
+        base = (0, 0, 0), (205, 0, 0), (0, 205, 0), (205, 205, 0), (0, 0, 238), (205, 0, 205), (0, 205, 205), (229, 229, 229)
+        bright = (127, 127, 127), (255, 0, 0), (0, 255, 0), (255, 255, 0), (92, 92, 255), (255, 0, 255), (0, 255, 255), (255, 255, 255)
+        return (base + bright)[index]
+    if index < 232:
+        index -= 16
+        levels = (0, 95, 135, 175, 215, 255)
+        return levels[index // 36], levels[index // 6 % 6], levels[index % 6]
+    grey = 8 + (index - 232) * 10
+    return grey, grey, grey
+
+
+def palette_index(rgb: tuple) -> int:
+    """Nearest colour of the xterm 256 colour cube and grey ramp"""
+    r, g, b = rgb[:3]
+    levels = [0 if v < 48 else 1 if v < 115 else (v - 35) // 40 for v in (r, g, b)]
+    cube = 16 + 36 * levels[0] + 6 * levels[1] + levels[2]
+    grey = 232 + min(23, max(0, ((r + g + b) // 3 - 8 + 5) // 10))
+    distance = lambda index: sum((a - c) ** 2 for a, c in zip(palette_rgb(index), (r, g, b)))
+    return min(cube, grey, key=distance)
+
+
+class VTParser:
+    """Table driven VT100/ANSI (ECMA-48) parser, no Qt.
+
+    feed() takes bytes in any chunking and returns a compact event list: runs of text between escape sequences
+    as one EV_TEXT, SGR folded into the Style the next text is drawn with (EV_STYLE only when it changes), and
+    the other sequences as EV_CSI / EV_ESC / EV_OSC / EV_CONTROL. Text in GROUND is found with one regex search
+    per run, only escape sequences go through the state table byte by byte. A sequence or UTF-8 character
+    split across chunks is completed by the next feed().
+    """
+
+    def __init__(self):
+        self.state = GROUND
+        self.style = DEFAULT_STYLE
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.decoding = False  ## The decoder holds the start of a character
+        self.events: list[tuple] = []
+        self.emitted_style = DEFAULT_STYLE  ## Style of the last EV_STYLE, to drop ones that change nothing
+        self.intermediates = ""
+        self.params = bytearray()
+        self.osc = bytearray()
+
+    def reset(self):
+        self.__init__()
+
+    def feed(self, data: bytes) -> list[tuple]:
+        events = self.events = []
+        if self.state == GROUND:
+            special = data.translate(None, TEXT_BYTES)
+            if len(special) == data.count(b"\r\n") and not special.strip(b"\r"):  ## All text, the common case
+                self.text(data)
+                return events
+        table = TABLE
+        i = 0
+        end = len(data)
+        while i < end:
+            if self.state == GROUND:
+                stop = TEXT_RUN.match(data, i).end()
+                if stop > i:
+                    self.text(data[i:stop])
+                    i = stop
+                    if i == end:
+                        break
+                if data[i] == 0x1B:  ## Whole CSI and OSC sequences without the table
+                    match = CSI_SEQUENCE.match(data, i)
+                    if match is not None:
+                        self.exit_state(CSI_ENTRY)
+                        self.intermediates = (match[1] + match[3]).decode()
+                        self.csi_dispatch(chr(match[4][0]), match[2])
+                        i = match.end()
+                        continue
+                    match = OSC_SEQUENCE.match(data, i)
+                    if match is not None:
+                        self.exit_state(OSC_STRING)
+                        events.append((EV_OSC, match[1][:MAX_OSC_LENGTH].decode("utf-8", errors="replace")))
+                        i = match.end()
+                        continue
+            byte = data[i]
+            action, next_state = table[self.state][byte]
+            if next_state is not None:
+                self.exit_state(next_state)
+            if action:
+                self.act(action, byte)
+            if next_state is not None:
+                self.enter_state(next_state)
+            i += 1
+        return events
+
+    def exit_state(self, next_state: int):
+        if self.state == OSC_STRING:
+            text = self.osc.decode("utf-8", errors="replace")
+            self.osc = bytearray()
+            self.events.append((EV_OSC, text))
+        elif self.state == GROUND and next_state != GROUND and self.decoding:
+            tail = self.decoder.decode(b"", True)  ## A UTF-8 character cut off by an escape sequence
+            self.decoding = False
+            if tail:
+                self.add_text(tail)
+
+    def enter_state(self, state: int):
+        self.state = state
+        if state in (ESCAPE, CSI_ENTRY, DCS_ENTRY):
+            self.intermediates = ""
+            self.params = bytearray()
+
+    def act(self, action: int, byte: int):
+        if action == PARAM:
+            if len(self.params) < MAX_PARAMS * 4:
+                self.params.append(byte)
+        elif action == COLLECT:
+            self.intermediates += chr(byte)
+        elif action == OSC_PUT:
+            if len(self.osc) < MAX_OSC_LENGTH:
+                self.osc.append(byte)
+        elif action == EXECUTE:
+            self.events.append((EV_CONTROL, chr(byte)))
+        elif action == CSI_DISPATCH:
+            self.csi_dispatch(chr(byte), bytes(self.params))
+        elif action == ESC_DISPATCH:
+            if byte == 0x5C and not self.intermediates:
+                return  ## ST, the end of an OSC/DCS string
+            self.events.append((EV_ESC, chr(byte), self.intermediates))
+        elif action == PRINT:
+            self.text(bytes((byte,)))
+
+    def text(self, data: bytes):
+        if not self.decoding:
+            try:
+                self.add_text(data.decode())
+                return
+            except UnicodeDecodeError:  ## Invalid, or a character continued in the next chunk
+                pass
+        text = self.decoder.decode(data)
+        self.decoding = bool(self.decoder.getstate()[0])
+        if text:
+            self.add_text(text)
+
+    def add_text(self, text: str):
+        events = self.events
+        if self.style != self.emitted_style:
+            if events and events[-1][0] == EV_STYLE:
+                events.pop()
+            events.append((EV_STYLE, self.style))
+            self.emitted_style = self.style
+        if events and events[-1][0] == EV_TEXT:
+            events[-1] = (EV_TEXT, events[-1][1] + text)
+        else:
+            events.append((EV_TEXT, text))
+
+    def csi_dispatch(self, final: str, params: bytes):
+        if final == "m" and not self.intermediates:
+            key = (self.style, params)
+            style = SGR_CACHE.get(key)
+            if style is None:
+                if len(SGR_CACHE) >= CACHE_SIZE:
+                    SGR_CACHE.clear()
+                style = SGR_CACHE[key] = sgr(self.style, parse_params(params))
+            self.style = style
+            return
+        values = PARAM_CACHE.get(params)
+        if values is None:
+            if len(PARAM_CACHE) >= CACHE_SIZE:
+                PARAM_CACHE.clear()
+            values = PARAM_CACHE[params] = tuple(param[0] for param in parse_params(params))
+        self.events.append((EV_CSI, final, values, self.intermediates))
+
+
+def parse_params(params: bytes) -> list[list[int]]:
+    """b'1;38:2::255:0:0' -> [[1], [38, 2, 0, 255, 0, 0]]"""
+    if not params:
+        return [[0]]
+    return [[int(sub) if sub else 0 for sub in param.split(b":")] for param in params.split(b";")[:MAX_PARAMS]]
+
+
+def sgr(style: Style, params: list[list[int]]) -> Style:
+    """Style after SGR (CSI ... m) with params from parse_params()"""
+    fields = list(style)
+    i = 0
+    while i < len(params):
+        param = params[i]
+        code = param[0]
+        i += 1
+        if code == 0:
+            fields = list(DEFAULT_STYLE)
+        elif code in SGR_FIELDS:
+            name, value = SGR_FIELDS[code]
+            fields[STYLE_INDEX[name]] = value
+        elif code == 22:
+            fields[STYLE_INDEX["bold"]] = fields[STYLE_INDEX["faint"]] = False
+        elif 30 <= code <= 37:
+            fields[STYLE_INDEX["fg"]] = code - 30
+        elif 40 <= code <= 47:
+            fields[STYLE_INDEX["bg"]] = code - 40
+        elif 90 <= code <= 97:
+            fields[STYLE_INDEX["fg"]] = code - 90 + 8
+        elif 100 <= code <= 107:
+            fields[STYLE_INDEX["bg"]] = code - 100 + 8
+        elif code in (38, 48):
+            if len(param) > 1:  ## 38:5:n or 38:2:[colourspace]:r:g:b
+                args = param[1:]
+                if args[0] == 2 and len(args) > 4:
+                    args = [2] + args[-3:]
+            else:  ## 38;5;n or 38;2;r;g;b
+                args = [p[0] for p in params[i : i + 4]]
+                i += 2 if args[:1] == [5] else 4 if args[:1] == [2] else 0
+            colour = None
+            if args[:1] == [5] and len(args) > 1:
+                colour = min(args[1], 255)
+            elif args[:1] == [2] and len(args) > 3:
+                colour = tuple(min(c, 255) for c in args[1:4])
+            if colour is not None:
+                fields[STYLE_INDEX["fg" if code == 38 else "bg"]] = colour
+    return Style(*fields)
+
+
+###############################################################
+######################## BENCHMARKS ###########################
+###############################################################
+
+
+def legacy_split(data: bytes, chunk_size: int, terminators: bytes = b"cnRchl()HABCDfsugKJipm\r\n") -> int:
+    """What TerminalWidget.insert_chars did before VTParser, without the Qt calls. Returns the text runs"""
+    runs = 0
+    escape = None
+    for start in range(0, len(data), chunk_size):
+        chunk = data[start : start + chunk_size]
+        if escape:
+            chunk = escape + chunk
+            escape = None
+        pieces = chunk.split(b"\x1b")
+        pieces[0].decode("utf-8", errors="replace")
+        runs += 1
+        for piece in pieces[1:]:
+            for i, byte in enumerate(piece):
+                if byte in terminators:
+                    piece[:i + 1].decode("utf-8", errors="replace")
+                    piece[i + 1 :].decode("utf-8", errors="replace")
+                    runs += 1
+                    break
+            else:
+                escape = piece
+    return runs
+
+
+def parser_split(data: bytes, chunk_size: int) -> int:
+    parser = VTParser()
+    events = 0
+    for start in range(0, len(data), chunk_size):
+        events += len(parser.feed(data[start : start + chunk_size]))
+    return events
+
+
+def benchmark_parser(total_bytes: int = 8 << 20, chunk_size: int = 4096):
+    """Throughput of VTParser against the legacy split on plain log lines and on colourful ANSI output"""
+    plain = b"I (12345) wifi: connected to ap, rssi -42, channel 6 \xc2\xb0C\r\n"
+    ansi = (
+        b"\x1b[0;32mI (12345) wifi:\x1b[0m connected \x1b[1;38;5;208mrssi -42\x1b[0m\r\n"
+        b"\x1b[38;2;255;128;0mtruecolour\x1b[39m \x1b[2K\rprogress 50%\x1b[K\r\n"
+        b"\x1b]0;device title\x07\x1b[?25l\x1b[3D\x1b[1;31mE (12346) error\x1b[0m\r\n"
+    )
+    results = {}
+    for stream_name, sample in (("plain", plain), ("ansi", ansi)):
+        stream = sample * (total_bytes // len(sample))
+        for name, split in (("VTParser", parser_split), ("legacy", legacy_split)):
+            start_t = time.perf_counter()
+            count = split(stream, chunk_size)
+            elapsed = time.perf_counter() - start_t
+            results[f"{stream_name} {name}"] = (elapsed, count)
+            print(f"{name:<9} {stream_name:<6} chunk {chunk_size:>5}B: {len(stream) / elapsed / 1e6:8.1f} MB/s ({count} events)")
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--bench" in sys.argv:
+        for chunk_size in (64, 4096):
+            benchmark_parser(chunk_size=chunk_size)
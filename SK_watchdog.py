@@ -0,0 +1,115 @@
+import sys
+import time
+import datetime
+import threading
+import traceback
+from collections import deque
+from PyQt6.QtCore import QObject, QTimer, Qt, pyqtSignal
+
+from SK_common import *
+from SK_metrics import METRICS
+
+WATCHDOG_INTERVAL_MS = 50  ## How often the GUI thread checks in
+DEFAULT_STALL_MS = 250  ## Event loop delays at least this long are reported as stalls
+MAX_STALLS = 20  ## Stall reports kept for sk-watchdog stalls
+
+LOOP_LAG_NS = METRICS.histogram("gui.loop_lag_ns")
+STALL_NS = METRICS.histogram("gui.stall_ns")
+STALLS = METRICS.counter("gui.stalls")
+
+
+class StallWatchdog(QObject):
+    """Measures Qt event loop latency with a timer on the GUI thread.
+
+    Every tick records how late it fired into gui.loop_lag_ns. A helper thread watches the time of the
+    last tick, once it is stall_ms overdue the GUI thread's stack is taken with sys._current_frames(),
+    so the report shows what the GUI was busy with while it was frozen, not after.
+    """
+
+    stalled = pyqtSignal(float, str)  ## Duration in ms, GUI thread stack
+
+    def __init__(self, stall_ms: int = DEFAULT_STALL_MS, interval_ms: int = WATCHDOG_INTERVAL_MS):
+        super().__init__()
+        self.stall_ms = stall_ms
+        self.interval_ms = interval_ms
+        self.gui_ident = threading.get_ident()
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        self.last_tick_ns = time.perf_counter_ns()
+        self.lag_ns = 0
+        self.stack: str = None  ## Taken by the helper thread during the current stall
+        self.stalls = deque(maxlen=MAX_STALLS)
+        self.active = False
+        self.wake = threading.Event()
+        self.thread: threading.Thread = None
+
+    def start(self):
+        if self.active:
+            return
+        self.active = True
+        self.wake.clear()
+        self.stack = None
+        self.last_tick_ns = time.perf_counter_ns()
+        self.timer.start(self.interval_ms)
+        self.thread = threading.Thread(target=self.watch, name="SK watchdog", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if not self.active:
+            return
+        self.active = False
+        self.timer.stop()
+        self.wake.set()
+        self.thread.join(1)
+        self.thread = None
+
+    def set_stall_ms(self, stall_ms: int):
+        """0 turns the watchdog off"""
+        self.stall_ms = stall_ms
+        if stall_ms > 0:
+            self.start()
+        else:
+            self.stop()
+
+    def tick(self):
+        now = time.perf_counter_ns()
+        lag = max(0, now - self.last_tick_ns - self.interval_ms * 1_000_000)
+        self.last_tick_ns = now
+        self.lag_ns = lag
+        LOOP_LAG_NS.record(lag)
+        stack, self.stack = self.stack, None
+        if lag < self.stall_ms * 1_000_000:
+            return
+        STALLS.inc()
+        STALL_NS.record(lag)
+        stack = stack or "(no stack, the stall ended before the watchdog looked)\n"
+        self.stalls.append({"time": datetime.datetime.now(), "ms": lag / 1e6, "stack": stack})
+        eprint(f"GUI stalled for {lag / 1e6:.0f} ms in:\n{stack}", color="yellow")
+        self.stalled.emit(lag / 1e6, stack)
+
+    def watch(self):
+        """Helper thread: snapshot the GUI thread's stack once a tick is stall_ms overdue"""
+        while not self.wake.wait(max(self.stall_ms, 4) / 4000):
+            overdue_ns = time.perf_counter_ns() - self.last_tick_ns - self.interval_ms * 1_000_000
+            if overdue_ns < self.stall_ms * 1_000_000 or self.stack is not None:
+                continue
+            frame = sys._current_frames().get(self.gui_ident)
+            if frame is not None:
+                self.stack = "".join(traceback.format_stack(frame))
+
+    def summary(self) -> str:
+        if not self.active:
+            return "Loop: off"
+        return f"Loop: {LOOP_LAG_NS.percentile(99) / 1e6:.0f}ms p99 {STALLS.value} stalls"
+
+    def report(self, stacks: bool = False) -> str:
+        if not self.active:
+            return "The watchdog is off, turn it on with: settings gui_stall_ms=<millis>"
+        elapsed = METRICS.elapsed()
+        text = f"Event loop lag: {LOOP_LAG_NS.describe(elapsed)}\nStalls over {self.stall_ms} ms: {STALLS.value}"
+        for stall in self.stalls:
+            text += f"\n{stall['time'].strftime('%H:%M:%S.%f')[:-3]}  {stall['ms']:.0f} ms"
+            if stacks:
+                text += "\n" + stall["stack"]
+        return text
@@ -68,6 +68,7 @@ class Extension(SK_Extension):
         return 
 
     '''User-Defined event for when the extension recieves lines from the serial device'''
+    '''self.rx_timestamps holds the (perf_counter_ns, time_ns) read time of each line'''
     def event_receive_lines(self, lines:list[str]):
         return
 
@@ -0,0 +1,19 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SK_framing import LineFramer
+
+
+def test_overlapping_terminator_across_reads():
+    framer = LineFramer(";;")
+    assert framer.feed(b"x;;;") == ["x"]
+    assert framer.feed(b"y;;") == [";y"]
+    assert framer.pending() == 0
+
+
+def test_crlf_split_across_reads():
+    framer = LineFramer()
+    assert framer.feed(b"a\r") == ["a"]
+    assert framer.feed(b"\nb\n") == ["b"]
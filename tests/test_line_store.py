@@ -0,0 +1,74 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SK_line_store import LineStore, TerminalBuffer, MAX_STYLES, CR_RETURN
+from SK_vt_parser import Style, DEFAULT_STYLE, VTParser
+
+
+def test_truecolour_styles_are_bounded():
+    buffer = TerminalBuffer()
+    parser = VTParser()
+    for i in range(3 * MAX_STYLES):
+        r, g, b = i % 256, i // 256 % 256, 7
+        buffer.apply(parser.feed(f"\x1b[38;2;{r};{g};{b}mx".encode()))
+    buffer.apply(parser.feed(b"\x1b[0m\n"))
+    styles = buffer.store.styles
+    assert len(styles) <= 2 * MAX_STYLES
+    assert len(buffer.store.style_ids) == len(styles)
+    text, runs = buffer.line(0)
+    assert text == "x" * 3 * MAX_STYLES
+    last = styles[runs[-1][1]]
+    assert isinstance(last.fg, int)  ## Past the limit, the nearest palette colour
+
+
+def test_clear_resets_styles():
+    store = LineStore()
+    red = store.style_id(Style(fg=(255, 0, 0)))
+    store.append("red", [(0, red)])
+    store.clear()
+    assert store.styles == [DEFAULT_STYLE]
+    assert store.style_id(Style(fg=2)) == 1
+
+
+def test_write_carriage_return():
+    buffer = TerminalBuffer()
+    buffer.cr_mode = CR_RETURN
+    buffer.write("cmd\r")
+    assert buffer.plain_text() == "cmd"
+    assert buffer.col == 0
+    buffer.to_end()
+    buffer.write("\na\r\nb")
+    assert buffer.plain_text() == "cmd\na\nb"
+    buffer.write("\rB")
+    assert buffer.plain_text() == "cmd\na\nB"
+
+
+def test_lf_after_unfinished_escape():
+    buffer = TerminalBuffer()
+    parser = VTParser()
+    for chunk in (b"abc\x1b", b"\r\ndef\r\n", b"ghi\x1b[1", b"\n\tx\r\n"):
+        buffer.apply(parser.feed(chunk))
+    ## The control characters run inside the escape sequence, the byte after them still finishes it (ESC d, CSI 1 x)
+    assert buffer.plain_text() == "abc\nef\nghi\n        \n"
+
+
+def test_lone_cr_ends_the_line():
+    buffer = TerminalBuffer()
+    parser = VTParser()
+    buffer.apply(parser.feed(b"line1\rline2\rline3\r"))
+    buffer.apply(parser.feed(b"\nline4\r\nline5\r"))
+    assert buffer.plain_text() == "line1\nline2\nline3\nline4\nline5\n"
+    buffer.write("cmd\r")
+    buffer.write("\nnext")
+    assert buffer.plain_text().endswith("line5\ncmd\nnext")
+
+
+def test_cr_return_redraws_the_line():
+    buffer = TerminalBuffer()
+    buffer.cr_mode = CR_RETURN
+    parser = VTParser()
+    buffer.apply(parser.feed(b"progress 10%\rprogress 50%\r"))
+    buffer.apply(parser.feed(b"\x1b[Kdone\r\n"))
+    assert buffer.plain_text() == "done\n"